@@ -0,0 +1,47 @@
+# backend/__init__.py - UN SOLO MÓDULO POR ARCHIVO, SE IMPORTE COMO SE IMPORTE
+"""
+Los módulos de backend se importan entre sí por nombre plano
+(`from config import Config`, con backend/ en sys.path), mientras que los
+scripts de arranque y el agente usan `backend.config`. Importado de las dos
+formas, Python ejecuta el archivo dos veces: dos clases Config (un
+Config.recargar que no llega a los módulos de sincronización), dos
+escritores del mismo log, dos buses de eventos y dos registros de métricas.
+
+Aquí `backend.<módulo>` se resuelve como alias del módulo plano: ambos
+nombres apuntan al mismo objeto en sys.modules.
+"""
+
+import os
+import sys
+import importlib
+import importlib.abc
+import importlib.util
+
+_DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+if _DIRECTORIO not in sys.path:
+    sys.path.append(_DIRECTORIO)
+
+
+class _AliasModuloPlano(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """`backend.x` -> sys.modules['x'] (importándolo por nombre plano si hace falta)"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        paquete, _, nombre = fullname.rpartition('.')
+        if paquete != __name__ or not os.path.isfile(os.path.join(_DIRECTORIO, nombre + '.py')):
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def create_module(self, spec):
+        modulo = importlib.import_module(spec.name.rpartition('.')[2])
+        spec.loader_state = modulo.__spec__
+        return modulo
+
+    def exec_module(self, module):
+        # Ya ejecutado al importarlo por nombre plano; importlib le puso el
+        # spec del alias y se le devuelve el suyo (importlib.reload sigue
+        # funcionando)
+        module.__spec__ = module.__spec__.loader_state
+
+
+if not any(isinstance(buscador, _AliasModuloPlano) for buscador in sys.meta_path):
+    sys.meta_path.insert(0, _AliasModuloPlano())
@@ -15,11 +15,20 @@ try:
 except ImportError:
     PSUTIL_AVAILABLE = False
 
+try:
+    from file_readiness import FileReadinessWaiter
+    from snapshot_copy import copiar_snapshot
+except ImportError:
+    from backend.file_readiness import FileReadinessWaiter
+    from backend.snapshot_copy import copiar_snapshot
+
 class AggressiveOneDriveSync:
     """Sincronización OneDrive que REALMENTE funciona en entornos corporativos"""
     
-    def __init__(self):
+    def __init__(self, waiter=None):
         self.logger = logging.getLogger('AggressiveSync')
+        # Esperas por estado del archivo (backoff + eventos) en lugar de sleeps fijos
+        self.waiter = waiter or FileReadinessWaiter(default_deadline=12.0)
         
     def force_real_cloud_sync(self, file_path):
         """MÉTODOS QUE REALMENTE FUNCIONAN para forzar sincronización OneDrive"""
@@ -30,6 +39,8 @@ class AggressiveOneDriveSync:
             return False
         
         self.logger.info("🔥 INICIANDO FORZADO REAL A LA NUBE...")
+        self.waiter.reset_stats()
+        self.waiter.watch(file_path.parent)
         
         success_methods = 0
         total_methods = 6
@@ -75,7 +86,7 @@ class AggressiveOneDriveSync:
             self.logger.info("🔄 Método 5: Restart OneDrive inteligente...")
             self._smart_onedrive_restart()
             success_methods += 1
-            time.sleep(5)
+            self.waiter.wait_until_ready(file_path, deadline=5, technique='smart_onedrive_restart')
             self.logger.info("✅ Método 5 EXITOSO")
         except Exception as e:
             self.logger.warning(f"❌ Método 5 falló: {e}")
@@ -94,12 +105,31 @@ class AggressiveOneDriveSync:
         
         if success_methods > 0:
             self.logger.info("⏱️ Esperando sincronización real...")
-            time.sleep(12)  # Tiempo suficiente para detección
+            self.waiter.wait_until_ready(file_path, deadline=12, technique='cloud_sync_wait')
             
-            return self._verify_real_cloud_sync(file_path, success_methods)
+            result = self._verify_real_cloud_sync(file_path, success_methods)
+            self._log_wait_report()
+            return result
         
+        self._log_wait_report()
         return False
     
+    def _log_wait_report(self):
+        """Registra el tiempo de espera consumido por cada técnica"""
+        report = self.waiter.get_wait_report()
+        total = sum(entry['seconds'] for entry in report.values())
+        self.logger.info(f"⏱️ Tiempo total esperando: {total:.2f}s")
+        for technique, entry in report.items():
+            self.logger.info(f"  ⏱️ {technique}: {entry['seconds']:.2f}s en {entry['waits']} esperas "
+                             f"({entry['timeouts']} por plazo vencido)")
+    
+    def _wait_all_ready(self, paths, deadline, technique):
+        """Espera a que todos los archivos estén listos compartiendo un único plazo"""
+        limit = time.monotonic() + deadline
+        for path in paths:
+            remaining = max(0.0, limit - time.monotonic())
+            self.waiter.wait_until_ready(path, deadline=remaining, technique=technique)
+    
     def _multiple_companion_technique(self, file_path):
         """Crear múltiples archivos companion que OneDrive DEBE procesar"""
         
@@ -135,18 +165,16 @@ Safe corporate method - temporary file auto-cleanup.
                     f.write(content)
                 companions.append(companion_file)
                 self.logger.info(f"  📄 Creado: {filename}")
-                time.sleep(1)
             except Exception as e:
                 self.logger.warning(f"  ⚠️ No se pudo crear {filename}: {e}")
         
-        # Esperar detección OneDrive
+        # Esperar detección OneDrive (vuelve en cuanto los companions están liberados)
         self.logger.info("  ⏱️ Esperando detección OneDrive...")
-        time.sleep(8)
+        self._wait_all_ready(companions, deadline=8, technique='multiple_companion')
         
-        # Eliminar companions gradualmente
+        # Eliminar companions
         for companion_file in companions:
             try:
-                time.sleep(1)
                 companion_file.unlink()
                 self.logger.info(f"  🗑️ Eliminado: {companion_file.name}")
             except Exception as e:
@@ -163,17 +191,17 @@ Safe corporate method - temporary file auto-cleanup.
             # PASO 1: Crear copia temporal
             shutil.copy2(file_path, temp_name)
             self.logger.info(f"  📋 Copia temporal creada: {temp_name.name}")
-            time.sleep(2)
+            self.waiter.wait_until_ready(temp_name, deadline=2, technique='rename_dance')
             
             # PASO 2: Renombrar original a backup
             file_path.rename(backup_name)
             self.logger.info(f"  📦 Original -> Backup: {backup_name.name}")
-            time.sleep(2)
+            self.waiter.wait_until_ready(backup_name, deadline=2, technique='rename_dance')
             
             # PASO 3: Renombrar temporal a original
             temp_name.rename(file_path)
             self.logger.info(f"  ✨ Temporal -> Original: {file_path.name}")
-            time.sleep(2)
+            self.waiter.wait_until_ready(file_path, deadline=2, technique='rename_dance')
             
             # PASO 4: Eliminar backup
             backup_name.unlink()
@@ -213,7 +241,7 @@ Safe corporate method - temporary file auto-cleanup.
             try:
                 os.utime(file_path, (timestamp, timestamp))
                 self.logger.info(f"  ⏰ Timestamp {i}/{len(timestamp_sequence)} aplicado")
-                time.sleep(1.5)
+                self.waiter.wait_until_ready(file_path, deadline=1.5, technique='timestamp_bombardment')
             except Exception as e:
                 self.logger.warning(f"  ⚠️ Error aplicando timestamp {i}: {e}")
     
@@ -249,7 +277,6 @@ This creates detectable filesystem activity.
                         f.write(activity_content)
                     activities.append(activity_path)
                     self.logger.info(f"  📂 Actividad creada: {activity_file}")
-                    time.sleep(1)
                 except Exception as e:
                     self.logger.warning(f"  ⚠️ Error creando {activity_file}: {e}")
             
@@ -264,7 +291,7 @@ This creates detectable filesystem activity.
                 with open(subfile, 'w') as f:
                     f.write("Temporary activity marker for OneDrive detection")
                 
-                time.sleep(3)
+                self.waiter.wait_until_ready(subfile, deadline=3, technique='massive_directory_activity')
                 
                 # Limpiar subdirectorio
                 subfile.unlink()
@@ -276,12 +303,11 @@ This creates detectable filesystem activity.
             
             # Esperar detección
             self.logger.info("  ⏱️ Esperando detección de actividad...")
-            time.sleep(5)
+            self._wait_all_ready(activities, deadline=5, technique='massive_directory_activity')
             
             # Limpiar archivos de actividad
             for activity_path in activities:
                 try:
-                    time.sleep(1)
                     activity_path.unlink()
                     self.logger.info(f"  🧹 Actividad limpiada: {activity_path.name}")
                 except Exception as e:
@@ -339,8 +365,9 @@ This creates detectable filesystem activity.
         else:
             self.logger.info("  ℹ️ No se encontraron procesos OneDrive activos")
         
-        # Esperar terminación completa
-        time.sleep(4)
+        # Esperar terminación completa (vuelve en cuanto no quedan procesos)
+        self.waiter.wait_for(lambda: not self._onedrive_processes_alive(onedrive_processes),
+                             deadline=4, technique='smart_onedrive_restart')
         
         # Buscar y reiniciar OneDrive
         onedrive_paths = [
@@ -362,6 +389,15 @@ This creates detectable filesystem activity.
         
         raise Exception("No se pudo reiniciar OneDrive - ejecutable no encontrado")
     
+    def _onedrive_processes_alive(self, process_names):
+        """True mientras quede algún proceso OneDrive (sin psutil se asume que sí)"""
+        if not PSUTIL_AVAILABLE:
+            return True
+        for proc in psutil.process_iter(['name']):
+            if any(name in (proc.info['name'] or '') for name in process_names):
+                return True
+        return False
+    
     def _onedrive_specific_powershell(self, file_path):
         """Comandos PowerShell específicos para OneDrive"""
         
@@ -508,15 +544,15 @@ def enhanced_sync_file_aggressive(origen, destino):
     logger = logging.getLogger('EnhancedAggressiveSync')
     
     try:
-        # PASO 1: Copia local (sin cambios)
+        # PASO 1: Copia local desde un snapshot consistente del libro
         logger.info("📁 PASO 1: Realizando copia local...")
-        shutil.copy2(origen, destino)
+        copia = copiar_snapshot(origen, destino)
         
-        if not os.path.exists(destino):
-            logger.error("❌ Error: Copia local falló")
+        if not copia['publicado'] or not os.path.exists(destino):
+            logger.error(f"❌ Error: Copia local falló - {copia['motivo']}")
             return {
                 'success': False,
-                'message': 'Error en copia local'
+                'message': f"Error en copia local: {copia['motivo']}"
             }
         
         logger.info(f"✅ Archivo copiado localmente: {os.path.getsize(destino):,} bytes")
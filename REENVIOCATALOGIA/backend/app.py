@@ -4,9 +4,10 @@
 backend/app.py - FLASK INSTANCE WINDOWS COMPATIBLE
 Sin caracteres Unicode que causen problemas en Windows cp1252
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 import os
 import sys
+import json
 import threading
 import time
 from datetime import datetime
@@ -54,6 +55,10 @@ except ImportError as e:
         def forzar_sync_onedrive_agresivo():
             return True
 
+from log_buffer import tail_lines
+from event_bus import get_event_bus
+from metrics import get_registry
+
 try:
     from watcher import MonitorSincronizacion
 except ImportError as e:
@@ -98,6 +103,38 @@ estadisticas_globales = {
     'tiempo_inicio': None
 }
 
+# Intervalo de keep-alive del stream SSE (segundos)
+SSE_KEEPALIVE = 15
+
+def _publicar_contadores():
+    """Publica los contadores globales a los dashboards conectados"""
+    get_event_bus().publish('counters', {
+        'source': 'app',
+        'sincronizaciones_exitosas': estadisticas_globales['sincronizaciones_exitosas'],
+        'errores_total': estadisticas_globales['errores_total']
+    })
+
+def _publicar_logs(registros):
+    """Oyente del escritor de log: cada lote escrito se publica como evento 'log'"""
+    get_event_bus().publish('log', {
+        'lineas': [linea for _ts, _nivel, linea, _mensaje in registros],
+        'ultimo_seq': Config.log_buffer().last_seq
+    })
+
+if hasattr(Config, '_logger'):
+    Config._logger().add_listener(_publicar_logs)
+
+def _formato_sse(evento):
+    """Serializa un evento del bus al formato text/event-stream"""
+    datos = dict(evento['data'])
+    datos['ts'] = evento['ts']
+    lineas = []
+    if evento.get('id'):
+        lineas.append(f"id: {evento['id']}")
+    lineas.append(f"event: {evento['type']}")
+    lineas.append(f"data: {json.dumps(datos, default=str, ensure_ascii=False)}")
+    return '\n'.join(lineas) + '\n\n'
+
 @app.route('/')
 def index():
     """Página principal con interfaz de usuario"""
@@ -137,6 +174,7 @@ def iniciar_monitor():
         if monitor_global.iniciar():
             estadisticas_globales['tiempo_inicio'] = datetime.now()
             Config.log_event("Sistema iniciado desde interfaz web")
+            get_event_bus().publish('status', {'corriendo': True})
             return jsonify({
                 'exito': True,
                 'mensaje': 'Sistema de sincronización iniciado correctamente',
@@ -172,6 +210,7 @@ def detener_monitor():
         monitor_global.detener()
         estadisticas_globales['tiempo_inicio'] = None
         Config.log_event("Sistema detenido desde interfaz web")
+        get_event_bus().publish('status', {'corriendo': False})
         
         return jsonify({
             'exito': True,
@@ -249,6 +288,7 @@ def forzar_sincronizacion():
                 Config.log_event("Sincronización manual exitosa")
         else:
             estadisticas_globales['errores_total'] += 1
+        _publicar_contadores()
         
         return jsonify(resultado)
         
@@ -348,31 +388,98 @@ def manejar_configuracion():
                 'mensaje': f'Error: {str(e)}'
             }), 500
 
+@app.route('/api/stream')
+def stream_eventos():
+    """
+    Eventos en tiempo real (Server-Sent Events): detected, queued, copying,
+    verified, failed, counters, status y log. Con Last-Event-ID el cliente
+    recupera los eventos que se perdió durante la reconexión.
+    """
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    suscripcion = get_event_bus().subscribe(desde_id=ultimo_id)
+    
+    def generar():
+        try:
+            yield "retry: 3000\n\n"
+            # Foto inicial de contadores (sin id: no mueve el cursor del cliente)
+            yield _formato_sse({
+                'type': 'counters',
+                'ts': time.time(),
+                'data': {
+                    'source': 'app',
+                    'sincronizaciones_exitosas': estadisticas_globales['sincronizaciones_exitosas'],
+                    'errores_total': estadisticas_globales['errores_total'],
+                    'corriendo': bool(monitor_global and monitor_global.corriendo)
+                }
+            })
+            while True:
+                evento = suscripcion.get(timeout=SSE_KEEPALIVE)
+                if evento is None:
+                    yield ": ping\n\n"
+                else:
+                    yield _formato_sse(evento)
+        finally:
+            suscripcion.close()
+    
+    return Response(generar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/metrics')
+def metricas():
+    """Métricas del proceso en formato de texto de Prometheus (0.0.4)"""
+    return Response(get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/logs', methods=['GET'])
 def obtener_logs():
-    """Obtiene las últimas entradas del log"""
+    """
+    Obtiene las últimas entradas del log.
+    Con ?since=<seq> devuelve solo las entradas posteriores a ese cursor
+    (desde el buffer en memoria, sin leer el archivo).
+    """
     try:
         log_file_path = os.path.join(app_dir, Config.LOG_FILE)
         
-        if not os.path.exists(log_file_path):
-            return jsonify({
-                'logs': [],
-                'mensaje': 'No hay logs disponibles'
-            })
-        
         # Obtener parámetros de paginación
         lineas = request.args.get('lineas', 50, type=int)
         lineas = min(lineas, 200)  # Máximo 200 líneas
+        since = request.args.get('since', type=int)
         
-        with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            todas_las_lineas = f.readlines()
+        buffer = Config.log_buffer() if hasattr(Config, 'log_buffer') else None
         
-        # Obtener las últimas N líneas
-        ultimas_lineas = todas_las_lineas[-lineas:] if len(todas_las_lineas) > lineas else todas_las_lineas
+        # Incremental: solo lo nuevo desde el cursor del cliente
+        if buffer is not None and since is not None:
+            entradas, hueco = buffer.since(since, limite=lineas)
+            if not hueco:
+                return jsonify({
+                    'logs': [entrada['linea'] for entrada in entradas],
+                    # Cursor = último registro devuelto (no last_seq, que pudo avanzar)
+                    'ultimo_seq': entradas[-1]['seq'] if entradas else since,
+                    'incremental': True,
+                    'total_lineas': buffer.last_seq,
+                    'timestamp': Config.get_timestamp()
+                })
+        
+        # Carga completa: buffer en memoria o, en frío, cola del archivo
+        if buffer is not None and len(buffer) >= lineas:
+            ultimas_lineas = [entrada['linea'] for entrada in buffer.tail(lineas)]
+        else:
+            if hasattr(Config, 'flush_log'):
+                Config.flush_log()
+            if not os.path.exists(log_file_path):
+                return jsonify({
+                    'logs': [],
+                    'ultimo_seq': buffer.last_seq if buffer is not None else None,
+                    'mensaje': 'No hay logs disponibles'
+                })
+            ultimas_lineas = tail_lines(log_file_path, lineas)
         
         return jsonify({
             'logs': [linea.strip() for linea in ultimas_lineas],
-            'total_lineas': len(todas_las_lineas),
+            'ultimo_seq': buffer.last_seq if buffer is not None else None,
+            'incremental': False,
+            'total_lineas': buffer.last_seq if buffer is not None else len(ultimas_lineas),
             'timestamp': Config.get_timestamp()
         })
         
@@ -390,8 +497,13 @@ def limpiar_logs():
     try:
         log_file_path = os.path.join(app_dir, Config.LOG_FILE)
         
-        with open(log_file_path, 'w', encoding='utf-8') as f:
-            f.write(f"[{Config.get_timestamp()}] INFO: Logs limpiados desde interfaz web\n")
+        if hasattr(Config, '_logger'):
+            # El escritor asíncrono mantiene el archivo abierto: que lo vacíe él
+            Config._logger().truncate()
+            Config.log_event("Logs limpiados desde interfaz web")
+        else:
+            with open(log_file_path, 'w', encoding='utf-8') as f:
+                f.write(f"[{Config.get_timestamp()}] INFO: Logs limpiados desde interfaz web\n")
         
         return jsonify({
             'exito': True,
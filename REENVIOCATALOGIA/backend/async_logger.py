@@ -0,0 +1,262 @@
+# backend/async_logger.py - LOG ASÍNCRONO CON LOTES Y ROTACIÓN POR TAMAÑO
+"""
+Escritor de log en segundo plano para Config.log_event.
+
+Quien registra solo encola la línea (no toca disco). Un hilo escritor vacía
+la cola por lotes: un write + flush por lote sobre un archivo que mantiene
+abierto, y lleva el tamaño en memoria para rotar (log.txt -> log.txt.1) sin
+volver a leer ni a consultar el archivo en cada línea. Opcionalmente emite
+también JSON lines (una línea JSON por evento).
+
+Cada lote escrito se agrega al buffer circular `ring` (ver log_buffer) y se
+entrega a los oyentes registrados con add_listener.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+try:
+    from log_buffer import LogRingBuffer
+except ImportError:
+    from backend.log_buffer import LogRingBuffer
+
+_STOP = object()
+_ROTATE = object()
+_TRUNCATE = object()
+
+
+class AsyncLogWriter:
+    """Cola + hilo escritor para un archivo de log"""
+
+    def __init__(self, ruta, max_bytes=10 * 1024 * 1024, backups=1, ruta_json=None,
+                 consola=True, lote_max=512, capacidad_buffer=2000):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.backups = max(1, backups)
+        self.ruta_json = ruta_json
+        self.consola = consola
+        self.lote_max = lote_max
+
+        self._cola = queue.SimpleQueue()
+        self._archivo = None
+        self._archivo_json = None
+        self._tamano = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.ring = LogRingBuffer(capacidad_buffer)
+        self._listeners = []
+        self.stats = {'lines': 0, 'batches': 0, 'rotations': 0, 'errors': 0}
+
+    # ------------------------------------------------------------------
+    # API para productores (no bloquea)
+    # ------------------------------------------------------------------
+    def write(self, linea, nivel='INFO', mensaje=None):
+        self._ensure_started()
+        self._cola.put((time.time(), nivel, linea, mensaje))
+
+    def rotate(self):
+        """Pide una rotación inmediata al hilo escritor"""
+        self._ensure_started()
+        self._cola.put(_ROTATE)
+
+    def truncate(self):
+        """Vacía el archivo de log y el buffer (desde el hilo escritor)"""
+        self._ensure_started()
+        self._cola.put(_TRUNCATE)
+
+    def add_listener(self, callback):
+        """callback(registros) por cada lote; registros = [(ts, nivel, linea, mensaje)]"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def flush(self, timeout=2.0):
+        """Espera a que todo lo encolado hasta ahora esté en disco"""
+        if self._thread is None:
+            return True
+        evento = threading.Event()
+        self._cola.put(evento)
+        return evento.wait(timeout)
+
+    def close(self, timeout=2.0):
+        if self._thread is None:
+            return
+        self._cola.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < self.lote_max:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            eventos = []
+            pendientes = []
+            detener = False
+            for item in lote:
+                if item is _STOP:
+                    detener = True
+                elif item is _ROTATE or item is _TRUNCATE:
+                    self._write_batch(pendientes)
+                    pendientes = []
+                    if item is _ROTATE:
+                        self._rotate()
+                    else:
+                        self._truncate()
+                elif isinstance(item, threading.Event):
+                    eventos.append(item)
+                else:
+                    pendientes.append(item)
+
+            self._write_batch(pendientes)
+            for evento in eventos:
+                evento.set()
+            if detener:
+                self._close_files()
+                return
+
+    def _open(self):
+        directorio = os.path.dirname(self.ruta)
+        if directorio and not os.path.exists(directorio):
+            os.makedirs(directorio, exist_ok=True)
+        self._archivo = open(self.ruta, 'ab')
+        self._tamano = os.fstat(self._archivo.fileno()).st_size
+        if self.ruta_json and self._archivo_json is None:
+            self._archivo_json = open(self.ruta_json, 'a', encoding='utf-8')
+
+    def _close_files(self):
+        for archivo in (self._archivo, self._archivo_json):
+            if archivo:
+                try:
+                    archivo.close()
+                except Exception:
+                    pass
+        self._archivo = self._archivo_json = None
+
+    def _rotate(self):
+        """log.txt -> log.txt.1 (-> .2 ...) sin leer el contenido"""
+        if self._archivo:
+            self._archivo.close()
+            self._archivo = None
+        try:
+            for n in range(self.backups - 1, 0, -1):
+                anterior = f"{self.ruta}.{n}"
+                if os.path.exists(anterior):
+                    os.replace(anterior, f"{self.ruta}.{n + 1}")
+            if os.path.exists(self.ruta):
+                os.replace(self.ruta, f"{self.ruta}.1")
+        except OSError:
+            # Otro proceso tiene el log abierto (Windows): truncar en su lugar
+            open(self.ruta, 'wb').close()
+        self.stats['rotations'] += 1
+        self._open()
+
+    def _truncate(self):
+        self._close_files()
+        try:
+            open(self.ruta, 'wb').close()
+        except OSError as e:
+            sys.stderr.write(f"ERROR limpiando log: {e}\n")
+        self.ring.clear()
+        self._open()
+
+    def _write_batch(self, items):
+        if not items:
+            return
+        texto = ''.join(linea + '\n' for _ts, _nivel, linea, _msg in items)
+        datos = texto.encode('utf-8', errors='replace')
+
+        try:
+            if self._archivo is None:
+                self._open()
+            if self._tamano and self._tamano + len(datos) > self.max_bytes:
+                self._rotate()
+            self._archivo.write(datos)
+            self._archivo.flush()
+            self._tamano += len(datos)
+
+            if self._archivo_json:
+                self._archivo_json.write(''.join(
+                    json.dumps({
+                        'ts': datetime.fromtimestamp(ts).isoformat(timespec='milliseconds'),
+                        'level': nivel,
+                        'message': msg if msg is not None else linea
+                    }, ensure_ascii=False) + '\n'
+                    for ts, nivel, linea, msg in items
+                ))
+                self._archivo_json.flush()
+
+            self.stats['lines'] += len(items)
+            self.stats['batches'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            # Se reabren en el próximo lote (cerrados: sin descriptores perdidos)
+            self._close_files()
+            sys.stderr.write(f"ERROR escribiendo log: {e}\n")
+
+        self.ring.extend(items)
+        for callback in list(self._listeners):
+            try:
+                callback(items)
+            except Exception:
+                pass
+
+        if self.consola:
+            try:
+                sys.stdout.write(texto)
+                sys.stdout.flush()
+            except Exception:
+                pass
+
+
+# Un escritor por archivo (`backend.async_logger` es este mismo módulo, ver
+# backend/__init__.py): nunca dos hilos escribiendo/rotando el mismo log.
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_async_logger(ruta, **opciones):
+    """Escritor compartido para `ruta` (las opciones solo aplican al crearlo)"""
+    clave = os.path.normcase(os.path.abspath(ruta))
+    with _writers_lock:
+        writer = _writers.get(clave)
+        if writer is None:
+            writer = AsyncLogWriter(ruta, **opciones)
+            _writers[clave] = writer
+        return writer
+
+
+def flush_all(timeout=2.0):
+    for writer in list(_writers.values()):
+        writer.flush(timeout)
+
+
+def _close_all():
+    for writer in list(_writers.values()):
+        writer.close()
+
+
+atexit.register(_close_all)
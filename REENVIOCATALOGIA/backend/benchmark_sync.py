@@ -0,0 +1,630 @@
+# backend/benchmark_sync.py - BENCHMARK E INYECCIÓN DE FALLAS DE LAS ESTRATEGIAS DE SYNC
+"""
+Mide las cuatro rutas de sincronización contra una "nube" falsa local:
+
+  envio       GestorEnvio.realizar_copia
+  pragmatic   PragmaticSyncManager.sync_file_pragmatic
+  forced      OneDriveForcedSync.perform_sync_with_lock
+  aggressive  enhanced_sync_file_aggressive -> AggressiveOneDriveSync.force_real_cloud_sync
+
+Escenarios (cada corrida modifica el libro de origen antes de sincronizar):
+
+  baseline    libro chico, sin fallas
+  locked      el destino está "abierto en Excel" durante --lock-seconds
+              desde el primer intento de escribirlo (PermissionError como
+              el WinError 32 de Windows al escribir, reemplazar, renombrar
+              o borrar el destino)
+  partial     otro proceso sigue escribiendo el origen por trozos mientras
+              la estrategia copia (guardado de Excel a medio terminar)
+  slow_disk   lectura y escritura limitadas a --slow-mbps MB/s
+  large       libro de --large-mb MB
+
+Linux no tiene bloqueos obligatorios ni disco lento a pedido, así que las
+fallas se inyectan en la capa de archivos del proceso (open, os.replace,
+os.rename, os.remove) y solo para rutas dentro de la carpeta temporal del
+benchmark.
+
+Por estrategia y escenario informa: latencia p50/p95, MB leídos/escritos por
+corrida (/proc/self/io), reintentos (lecturas del origen para copiar - 1) y
+corrección: 'ok' (éxito y destino igual al origen final), 'corrupt' (informó
+éxito pero el destino no coincide) o 'failed' (informó fallo).
+
+Uso:
+    python backend/benchmark_sync.py --runs 3
+    python backend/benchmark_sync.py --strategies envio,pragmatic --scenarios locked,partial --json resultado.json
+"""
+
+import os
+import io
+import sys
+import math
+import json
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import zipfile
+import builtins
+import argparse
+import tempfile
+import threading
+import random
+
+import copia_segura
+import snapshot_copy
+from config import Config
+
+ESTRATEGIAS = ('envio', 'pragmatic', 'forced', 'aggressive')
+ESCENARIOS = ('baseline', 'locked', 'partial', 'slow_disk', 'large')
+
+_MODOS_ESCRITURA = set('wax+')
+
+
+# ----------------------------------------------------------------------
+# Libros Excel de prueba
+# ----------------------------------------------------------------------
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet2.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Catalogo" sheetId="1" r:id="rId1"/>'
+    '<sheet name="Version" sheetId="2" r:id="rId2"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet2.xml"/></Relationships>'
+)
+_SHEET_ABRE = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_CIERRA = '</sheetData></worksheet>'
+
+_hojas_cache = {}
+
+
+def _hoja_catalogo(tamano_bytes):
+    """XML de la hoja de catálogo de ~`tamano_bytes` (se genera una vez por tamaño)"""
+    if tamano_bytes not in _hojas_cache:
+        azar = random.Random(tamano_bytes)
+        partes = [_SHEET_ABRE]
+        total = len(_SHEET_ABRE) + len(_SHEET_CIERRA)
+        fila = 1
+        while total < tamano_bytes:
+            celdas = ''.join(
+                f'<c r="{col}{fila}"><v>{azar.randint(0, 10 ** 9)}</v></c>' for col in 'ABCDEFGH'
+            )
+            xml = f'<row r="{fila}">{celdas}</row>'
+            partes.append(xml)
+            total += len(xml)
+            fila += 1
+        partes.append(_SHEET_CIERRA)
+        _hojas_cache[tamano_bytes] = ''.join(partes).encode('utf-8')
+    return _hojas_cache[tamano_bytes]
+
+
+def contenido_libro(tamano_mb, version):
+    """
+    Bytes de un .xlsx válido de ~`tamano_mb` MB. La hoja grande va sin
+    comprimir (ZIP_STORED) para que el tamaño sea exacto y barato de generar;
+    `version` cambia la segunda hoja, como una edición chica del usuario.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as libro:
+        libro.writestr('[Content_Types].xml', _CONTENT_TYPES, zipfile.ZIP_DEFLATED)
+        libro.writestr('_rels/.rels', _RELS, zipfile.ZIP_DEFLATED)
+        libro.writestr('xl/workbook.xml', _WORKBOOK, zipfile.ZIP_DEFLATED)
+        libro.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS, zipfile.ZIP_DEFLATED)
+        libro.writestr('xl/worksheets/sheet1.xml', _hoja_catalogo(int(tamano_mb * 1024 * 1024)),
+                       zipfile.ZIP_STORED)
+        libro.writestr('xl/worksheets/sheet2.xml',
+                       f'{_SHEET_ABRE}<row r="1"><c r="A1"><v>{version}</v></c></row>{_SHEET_CIERRA}',
+                       zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+# ----------------------------------------------------------------------
+# Inyección de fallas
+# ----------------------------------------------------------------------
+class _ArchivoLento:
+    """Envuelve un archivo abierto y limita su ancho de banda"""
+
+    def __init__(self, archivo, bytes_por_segundo):
+        self._archivo = archivo
+        self._bps = bytes_por_segundo
+
+    def _esperar(self, n):
+        if n:
+            time.sleep(n / self._bps)
+
+    def read(self, *args):
+        datos = self._archivo.read(*args)
+        self._esperar(len(datos))
+        return datos
+
+    def readinto(self, buffer):
+        n = self._archivo.readinto(buffer)
+        self._esperar(n or 0)
+        return n
+
+    def write(self, datos):
+        n = self._archivo.write(datos)
+        self._esperar(n or 0)
+        return n
+
+    def __iter__(self):
+        return iter(self._archivo)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._archivo.__exit__(*exc)
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+
+class FaultInjector:
+    """
+    Parchea open/os.replace/os.rename/os.remove del proceso mientras está
+    activo. Solo afecta rutas bajo `raiz`; el resto del proceso no lo nota.
+    """
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        self._bloqueos = {}  # ruta -> [segundos, instante (monotonic) en que se libera o None]
+        self._bps = None
+        self._lock = threading.Lock()
+        self._originales = {}
+        self.inyectadas = 0
+
+    # -- configuración -------------------------------------------------
+    def lock(self, ruta, segundos):
+        """
+        Simula el archivo abierto en otra aplicación durante `segundos`.
+        La ventana empieza con el primer intento de escribir la ruta, no al
+        armar el bloqueo: así cubre también a las estrategias que esperan
+        antes de tocar el destino (envio duerme 3s antes de copiar).
+        """
+        with self._lock:
+            self._bloqueos[os.path.abspath(ruta)] = [segundos, None]
+
+    def throttle(self, bytes_por_segundo):
+        self._bps = bytes_por_segundo
+
+    def reset(self):
+        with self._lock:
+            self._bloqueos.clear()
+            self._bps = None
+            self.inyectadas = 0
+
+    # -- verificación --------------------------------------------------
+    def _propia(self, ruta):
+        try:
+            ruta = os.path.abspath(os.fspath(ruta))
+        except TypeError:
+            return None
+        return ruta if ruta.startswith(self.raiz + os.sep) else None
+
+    def _verificar_bloqueo(self, *rutas):
+        for ruta in rutas:
+            ruta = self._propia(ruta)
+            if ruta is None:
+                continue
+            with self._lock:
+                bloqueo = self._bloqueos.get(ruta)
+                if bloqueo is None:
+                    continue
+                if bloqueo[1] is None:
+                    bloqueo[1] = time.monotonic() + bloqueo[0]
+                elif time.monotonic() >= bloqueo[1]:
+                    del self._bloqueos[ruta]
+                    continue
+                self.inyectadas += 1
+            raise PermissionError(
+                errno.EACCES,
+                "The process cannot access the file because it is being used by another process",
+                ruta
+            )
+
+    # -- reemplazos ----------------------------------------------------
+    def _open(self, archivo, mode='r', *args, **kwargs):
+        if isinstance(archivo, int):
+            return self._originales['open'](archivo, mode, *args, **kwargs)
+        if _MODOS_ESCRITURA & set(mode):
+            self._verificar_bloqueo(archivo)
+        abierto = self._originales['open'](archivo, mode, *args, **kwargs)
+        if self._bps and self._propia(archivo) is not None:
+            return _ArchivoLento(abierto, self._bps)
+        return abierto
+
+    def _replace(self, origen, destino, *args, **kwargs):
+        self._verificar_bloqueo(origen, destino)
+        return self._originales['replace'](origen, destino, *args, **kwargs)
+
+    def _rename(self, origen, destino, *args, **kwargs):
+        self._verificar_bloqueo(origen, destino)
+        return self._originales['rename'](origen, destino, *args, **kwargs)
+
+    def _remove(self, ruta, *args, **kwargs):
+        self._verificar_bloqueo(ruta)
+        return self._originales['remove'](ruta, *args, **kwargs)
+
+    def __enter__(self):
+        self._originales = {
+            'open': builtins.open, 'replace': os.replace, 'rename': os.rename,
+            'remove': os.remove, 'unlink': os.unlink,
+            'sendfile': getattr(shutil, '_USE_CP_SENDFILE', None)
+        }
+        builtins.open = self._open
+        os.replace = self._replace
+        os.rename = self._rename
+        os.remove = self._remove
+        os.unlink = self._remove
+        # sendfile copiaría por descriptor y saltearía el archivo lento
+        if self._originales['sendfile'] is not None:
+            shutil._USE_CP_SENDFILE = False
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open = self._originales['open']
+        os.replace = self._originales['replace']
+        os.rename = self._originales['rename']
+        os.remove = self._originales['remove']
+        os.unlink = self._originales['unlink']
+        if self._originales['sendfile'] is not None:
+            shutil._USE_CP_SENDFILE = self._originales['sendfile']
+        return False
+
+
+class CopyAttemptCounter:
+    """Cuenta lecturas del origen para copiarlo envolviendo las primitivas de copia"""
+
+    def __init__(self):
+        self.origen = None
+        self.intentos = 0
+        self._parches = []
+
+    def _envolver(self, objeto, nombre, indice_origen):
+        original = getattr(objeto, nombre)
+        contador = self
+
+        def envoltura(*args, **kwargs):
+            if len(args) > indice_origen and contador.origen and \
+                    os.path.abspath(os.fspath(args[indice_origen])) == contador.origen:
+                contador.intentos += 1
+            return original(*args, **kwargs)
+
+        setattr(objeto, nombre, envoltura)
+        self._parches.append((objeto, nombre, original))
+
+    def __enter__(self):
+        self._envolver(shutil, 'copy2', 0)
+        self._envolver(copia_segura, 'copiar_con_hash', 0)
+        self._envolver(snapshot_copy, 'tomar_snapshot', 0)
+        return self
+
+    def __exit__(self, *exc):
+        for objeto, nombre, original in reversed(self._parches):
+            setattr(objeto, nombre, original)
+        self._parches = []
+        return False
+
+    def start(self, origen):
+        self.origen = os.path.abspath(origen)
+        self.intentos = 0
+
+
+# ----------------------------------------------------------------------
+# Métricas
+# ----------------------------------------------------------------------
+def _io_proceso():
+    """(bytes leídos, bytes escritos) del proceso o None si no hay /proc/self/io"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            valores = dict(linea.split(':', 1) for linea in f if ':' in linea)
+        return int(valores['rchar']), int(valores['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _hash_archivo(ruta):
+    digest = hashlib.md5()
+    try:
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(bloque)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+# ----------------------------------------------------------------------
+# Estrategias
+# ----------------------------------------------------------------------
+def _crear_estrategia(nombre):
+    """Devuelve `sincronizar(origen, destino) -> bool` para la estrategia"""
+    if nombre == 'envio':
+        from envio import GestorEnvio
+        gestor = GestorEnvio()
+
+        def sincronizar(origen, destino):
+            Config.RUTA_ORIGEN = origen
+            Config.RUTA_DESTINO = destino
+            return bool(gestor.realizar_copia())
+        return sincronizar
+
+    if nombre == 'pragmatic':
+        from fixed_sync_system import PragmaticSyncManager
+        manager = PragmaticSyncManager()
+        return lambda origen, destino: manager.sync_file_pragmatic(origen, destino)[0]
+
+    if nombre == 'forced':
+        from enhanced_sync_with_alerts import OneDriveForcedSync
+        forced = OneDriveForcedSync()
+        return lambda origen, destino: bool(forced.perform_sync_with_lock(origen, destino).get('success'))
+
+    if nombre == 'aggressive':
+        from aggressive_onedrive_sync import enhanced_sync_file_aggressive
+        return lambda origen, destino: bool(enhanced_sync_file_aggressive(origen, destino).get('success'))
+
+    raise ValueError(f"Estrategia desconocida: {nombre}")
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+class SyncBenchmark:
+    """Corre cada estrategia en cada escenario contra la nube falsa"""
+
+    def __init__(self, raiz, runs=3, size_mb=2, large_mb=25, slow_mbps=8,
+                 lock_seconds=1.5, partial_seconds=1.0):
+        self.raiz = os.path.abspath(raiz)
+        self.runs = runs
+        self.size_mb = size_mb
+        self.large_mb = large_mb
+        self.slow_mbps = slow_mbps
+        self.lock_seconds = lock_seconds
+        self.partial_seconds = partial_seconds
+        self.injector = FaultInjector(self.raiz)
+        self.counter = CopyAttemptCounter()
+        self.logger = logging.getLogger('SyncBenchmark')
+        self._version = 0
+
+    def _preparar(self, estrategia, escenario):
+        base = os.path.join(self.raiz, f"{estrategia}_{escenario}")
+        origen_dir = os.path.join(base, 'origen')
+        nube_dir = os.path.join(base, 'nube')
+        os.makedirs(origen_dir, exist_ok=True)
+        os.makedirs(nube_dir, exist_ok=True)
+        origen = os.path.join(origen_dir, 'CATALOGO_PRECIOS.xlsx')
+        destino = os.path.join(nube_dir, 'CATALOGO_PRECIOS.xlsx')
+        tamano = self.large_mb if escenario == 'large' else self.size_mb
+        # Estado inicial: destino ya sincronizado con una versión anterior
+        inicial = contenido_libro(tamano, 'inicial')
+        for ruta in (origen, destino):
+            with open(ruta, 'wb') as f:
+                f.write(inicial)
+        return origen, destino, tamano
+
+    def _escritor_parcial(self, ruta, datos, listo):
+        """Reescribe `ruta` por trozos durante `partial_seconds` (guardado en curso)"""
+        trozos = max(1, math.ceil(len(datos) / (256 * 1024)))
+        pausa = self.partial_seconds / trozos
+        with open(ruta, 'wb') as f:
+            listo.set()
+            for i in range(trozos):
+                f.write(datos[i * 256 * 1024:(i + 1) * 256 * 1024])
+                f.flush()
+                time.sleep(pausa)
+
+    def run_once(self, sincronizar, escenario, origen, destino, tamano):
+        self._version += 1
+        nuevo = contenido_libro(tamano, f"v{self._version}")
+        escritor = None
+        bytes_escritor = 0
+
+        self.injector.reset()
+        if escenario == 'partial':
+            listo = threading.Event()
+            escritor = threading.Thread(target=self._escritor_parcial, args=(origen, nuevo, listo), daemon=True)
+            escritor.start()
+            listo.wait(5)
+            time.sleep(0.05)  # el watcher dispararía con el primer evento de escritura
+            bytes_escritor = len(nuevo)
+        else:
+            with open(origen, 'wb') as f:
+                f.write(nuevo)
+            if escenario == 'locked':
+                self.injector.lock(destino, self.lock_seconds)
+            elif escenario == 'slow_disk':
+                self.injector.throttle(self.slow_mbps * 1024 * 1024)
+
+        self.counter.start(origen)
+        io_antes = _io_proceso()
+        inicio = time.perf_counter()
+        try:
+            exito = sincronizar(origen, destino)
+            error = None
+        except Exception as e:
+            exito, error = False, str(e)
+        latencia = time.perf_counter() - inicio
+        io_despues = _io_proceso()
+        self.injector.throttle(None)
+
+        if escenario == 'locked' and not self.injector.inyectadas:
+            raise RuntimeError(f"Escenario 'locked' sin fallas inyectadas: la estrategia nunca "
+                               f"intentó escribir {destino}")
+
+        if escritor is not None:
+            escritor.join()
+
+        # Bytes del proceso durante la corrida (sin el escritor simulado)
+        leidos = escritos = None
+        if io_antes and io_despues:
+            leidos = io_despues[0] - io_antes[0]
+            escritos = max(0, io_despues[1] - io_antes[1] - bytes_escritor)
+
+        correcto = _hash_archivo(destino) == hashlib.md5(nuevo).hexdigest()
+        if exito and correcto:
+            resultado = 'ok'
+        elif exito:
+            resultado = 'corrupt'
+        else:
+            resultado = 'failed'
+
+        return {
+            'latency': latencia,
+            'result': resultado,
+            'error': error,
+            'bytes_read': leidos,
+            'bytes_written': escritos,
+            'attempts': self.counter.intentos,
+            'retries': max(0, self.counter.intentos - 1),
+            'faults_injected': self.injector.inyectadas
+        }
+
+    def run(self, estrategias=ESTRATEGIAS, escenarios=ESCENARIOS):
+        resultados = []
+        with self.injector, self.counter:
+            for estrategia in estrategias:
+                sincronizar = _crear_estrategia(estrategia)
+                for escenario in escenarios:
+                    origen, destino, tamano = self._preparar(estrategia, escenario)
+                    corridas = []
+                    for i in range(self.runs):
+                        corrida = self.run_once(sincronizar, escenario, origen, destino, tamano)
+                        corridas.append(corrida)
+                        self.logger.info(f"{estrategia}/{escenario} #{i + 1}: {corrida['result']} "
+                                         f"{corrida['latency']:.2f}s")
+                    resultados.append(resumir(estrategia, escenario, tamano, corridas))
+        return resultados
+
+
+def resumir(estrategia, escenario, tamano_mb, corridas):
+    latencias = [c['latency'] for c in corridas]
+    leidos = [c['bytes_read'] for c in corridas if c['bytes_read'] is not None]
+    escritos = [c['bytes_written'] for c in corridas if c['bytes_written'] is not None]
+    mb = 1024 * 1024
+    return {
+        'strategy': estrategia,
+        'scenario': escenario,
+        'size_mb': tamano_mb,
+        'runs': len(corridas),
+        'ok': sum(c['result'] == 'ok' for c in corridas),
+        'corrupt': sum(c['result'] == 'corrupt' for c in corridas),
+        'failed': sum(c['result'] == 'failed' for c in corridas),
+        'p50_s': round(percentil(latencias, 50), 3),
+        'p95_s': round(percentil(latencias, 95), 3),
+        'read_mb': round(sum(leidos) / len(leidos) / mb, 2) if leidos else None,
+        'written_mb': round(sum(escritos) / len(escritos) / mb, 2) if escritos else None,
+        'retries': sum(c['retries'] for c in corridas),
+        'faults_injected': sum(c['faults_injected'] for c in corridas),
+        'errors': sorted({c['error'] for c in corridas if c['error']}),
+        'corridas': corridas
+    }
+
+
+def imprimir_tabla(resultados, salida=sys.stdout):
+    columnas = ('strategy', 'scenario', 'runs', 'ok', 'corrupt', 'failed', 'p50_s', 'p95_s',
+                'read_mb', 'written_mb', 'retries', 'faults_injected')
+    filas = [[('-' if r[c] is None else str(r[c])) for c in columnas] for r in resultados]
+    anchos = [max(len(c), *(len(f[i]) for f in filas)) if filas else len(c) for i, c in enumerate(columnas)]
+    print('  '.join(c.ljust(a) for c, a in zip(columnas, anchos)), file=salida)
+    print('  '.join('-' * a for a in anchos), file=salida)
+    for fila in filas:
+        print('  '.join(v.ljust(a) for v, a in zip(fila, anchos)), file=salida)
+
+
+def _aislar_entorno(raiz, verbose=False):
+    """Log, estado y consola del sistema fuera del árbol real"""
+    Config.LOG_FILE = os.path.join(raiz, 'log.txt')
+    Config.LOG_JSON_FILE = os.path.join(raiz, 'log.jsonl')
+    Config.LOG_EN_CONSOLA = False
+    Config.STATE_DB = os.path.join(raiz, 'sync_state.db')
+    # Sin estado persistente: ninguna estrategia omite la copia por el almacén
+    Config.ESTADO_PERSISTENTE = False
+    logging.basicConfig(level=logging.INFO if verbose else logging.ERROR,
+                        format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+
+
+def _lista(valor, permitidos):
+    elegidos = [v.strip() for v in valor.split(',') if v.strip()]
+    desconocidos = [v for v in elegidos if v not in permitidos]
+    if desconocidos:
+        raise argparse.ArgumentTypeError(f"valores desconocidos: {', '.join(desconocidos)}")
+    return elegidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de estrategias de sincronización OneDrive")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--strategies', type=lambda v: _lista(v, ESTRATEGIAS), default=list(ESTRATEGIAS))
+    parser.add_argument('--scenarios', type=lambda v: _lista(v, ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument('--size-mb', type=float, default=2)
+    parser.add_argument('--large-mb', type=float, default=25)
+    parser.add_argument('--slow-mbps', type=float, default=8)
+    parser.add_argument('--lock-seconds', type=float, default=1.5)
+    parser.add_argument('--partial-seconds', type=float, default=1.0)
+    parser.add_argument('--json', help="guardar resultados detallados en este archivo")
+    parser.add_argument('--keep', action='store_true', help="no borrar la carpeta temporal")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    raiz = tempfile.mkdtemp(prefix='benchmark_sync_')
+    _aislar_entorno(raiz, args.verbose)
+    try:
+        benchmark = SyncBenchmark(
+            os.path.join(raiz, 'nube_falsa'), runs=args.runs, size_mb=args.size_mb,
+            large_mb=args.large_mb, slow_mbps=args.slow_mbps,
+            lock_seconds=args.lock_seconds, partial_seconds=args.partial_seconds
+        )
+        resultados = benchmark.run(args.strategies, args.scenarios)
+        imprimir_tabla(resultados)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, indent=2, ensure_ascii=False)
+    finally:
+        if args.keep:
+            print(f"Carpeta del benchmark: {raiz}")
+        else:
+            shutil.rmtree(raiz, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# backend/change_scheduler.py - COLA DE CAMBIOS CON DEBOUNCE Y AGRUPACIÓN
+"""
+Planificador de sincronizaciones por archivo.
+
+Cada evento de watchdog se agenda con la clave de su ruta. Si ya hay una
+sincronización pendiente para esa ruta, el evento se agrupa con ella en vez
+de encolar otra copia completa: se conserva la información más reciente, la
+prioridad más urgente y el vencimiento más próximo, pero nunca antes de que
+termine la ventana de debounce (así una ráfaga de guardados de Excel produce
+una sola copia, después del último evento).
+
+Los trabajos esperan en un heap ordenado por vencimiento (respeta el
+`delay_seconds` del analizador). Al vencer pasan a un segundo heap ordenado
+por prioridad, de modo que un CRITICAL vencido sale antes que un LOW vencido.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+try:
+    from metrics import QUEUE_DEPTH, COALESCED_EVENTS
+except ImportError:
+    from backend.metrics import QUEUE_DEPTH, COALESCED_EVENTS
+
+# Rango de prioridad del analizador (menor = más urgente)
+PRIORIDADES = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3, 'NONE': 4}
+
+
+class ScheduledJob:
+    """Sincronización pendiente para una ruta"""
+
+    def __init__(self, key, payload, due_at, priority):
+        self.key = key
+        self.payload = payload
+        self.due_at = due_at
+        self.priority = priority
+        self.first_event_at = time.time()
+        self.coalesced = 0
+        self.version = 0
+
+    @property
+    def priority_rank(self):
+        return PRIORIDADES.get(self.priority, PRIORIDADES['MEDIUM'])
+
+
+class CoalescingScheduler:
+    """Heap de vencimientos + heap de prioridades con agrupación por clave"""
+
+    def __init__(self, debounce_seconds=3, name=None):
+        """`name` publica la profundidad y las agrupaciones de la cola en /metrics"""
+        self.debounce_seconds = debounce_seconds
+        self.name = name
+        self._jobs = {}        # clave -> ScheduledJob pendiente
+        self._timers = []      # (due_at, seq, clave, version)
+        self._ready = []       # (rango_prioridad, due_at, seq, clave, version)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {
+            'events': 0,
+            'scheduled': 0,
+            'coalesced': 0,
+            'dispatched': 0,
+            'cancelled': 0
+        }
+        if name:
+            QUEUE_DEPTH.set_function(self.pending_count, queue=name)
+
+    # ------------------------------------------------------------------
+    # Productores
+    # ------------------------------------------------------------------
+    def schedule(self, key, payload, delay_seconds=0, priority='MEDIUM', merge=None):
+        """
+        Agenda (o agrupa) una sincronización para `key`.
+        Devuelve True si creó un trabajo nuevo y False si se agrupó.
+        `merge(anterior, nuevo)` combina payloads al agrupar (por defecto
+        gana el nuevo).
+        """
+        now = time.monotonic()
+        due_at = now + max(delay_seconds, self.debounce_seconds)
+
+        with self._cond:
+            self.stats['events'] += 1
+            job = self._jobs.get(key)
+
+            if job is None:
+                job = ScheduledJob(key, payload, due_at, priority)
+                self._jobs[key] = job
+                self.stats['scheduled'] += 1
+                created = True
+            else:
+                # Agrupar: datos más recientes, prioridad más urgente y
+                # vencimiento más próximo, sin adelantarse al debounce
+                job.payload = merge(job.payload, payload) if merge else payload
+                job.coalesced += 1
+                if PRIORIDADES.get(priority, PRIORIDADES['MEDIUM']) < job.priority_rank:
+                    job.priority = priority
+                job.due_at = max(min(job.due_at, due_at), now + self.debounce_seconds)
+                self.stats['coalesced'] += 1
+                created = False
+                if self.name:
+                    COALESCED_EVENTS.inc(queue=self.name)
+
+            job.version += 1
+            heapq.heappush(self._timers, (job.due_at, next(self._seq), key, job.version))
+            self._cond.notify_all()
+
+        return created
+
+    def cancel(self, key):
+        """Descarta la sincronización pendiente de `key`"""
+        with self._cond:
+            if self._jobs.pop(key, None) is not None:
+                self.stats['cancelled'] += 1
+                self._cond.notify_all()
+                return True
+            return False
+
+    # ------------------------------------------------------------------
+    # Consumidor
+    # ------------------------------------------------------------------
+    def _promote_due(self, now):
+        """Mueve los vencidos al heap de prioridades (descarta entradas obsoletas)"""
+        while self._timers and self._timers[0][0] <= now:
+            due_at, seq, key, version = heapq.heappop(self._timers)
+            job = self._jobs.get(key)
+            if job is None or job.version != version:
+                continue
+            heapq.heappush(self._ready, (job.priority_rank, due_at, seq, key, version))
+
+    def _next_timer(self):
+        while self._timers:
+            due_at, _seq, key, version = self._timers[0]
+            job = self._jobs.get(key)
+            if job is not None and job.version == version:
+                return due_at
+            heapq.heappop(self._timers)
+        return None
+
+    def pop_due(self, timeout=None):
+        """
+        Devuelve el trabajo vencido más urgente, esperando como mucho
+        `timeout` segundos. None si no venció ninguno o si se cerró.
+        """
+        limit = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                self._promote_due(now)
+
+                while self._ready:
+                    _rank, _due, _seq, key, version = heapq.heappop(self._ready)
+                    job = self._jobs.get(key)
+                    if job is None or job.version != version:
+                        continue
+                    del self._jobs[key]
+                    self.stats['dispatched'] += 1
+                    return job
+
+                next_due = self._next_timer()
+                wait = None if next_due is None else next_due - now
+                if limit is not None:
+                    remaining = limit - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+        return None
+
+    def drain(self):
+        """
+        Saca todos los trabajos pendientes, vencidos o no (al detener el
+        sistema), ordenados por prioridad y vencimiento.
+        """
+        with self._cond:
+            jobs = sorted(self._jobs.values(), key=lambda job: (job.priority_rank, job.due_at))
+            self._jobs.clear()
+            self._timers.clear()
+            self._ready.clear()
+            self.stats['dispatched'] += len(jobs)
+            self._cond.notify_all()
+            return jobs
+
+    def close(self):
+        """Despierta al consumidor para que termine"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+    def pending_count(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def get_stats(self):
+        with self._cond:
+            stats = self.stats.copy()
+            stats['pending'] = len(self._jobs)
+            return stats
@@ -12,6 +12,11 @@ import subprocess
 import time
 from datetime import datetime
 
+try:
+    from async_logger import get_async_logger
+except ImportError:
+    from backend.async_logger import get_async_logger
+
 class Config:
     # Rutas de archivos - MANTENER IGUAL
     RUTA_ORIGEN = r"C:\Users\pewalqui\Unilabs Group Services\Moisés Rojas - Catalogos\Catalogo_2025_IVD.xlsx"
@@ -33,6 +38,9 @@ class Config:
     # Configuración de logs
     LOG_FILE = os.path.join(os.path.dirname(__file__), "log.txt")
     MAX_LOG_SIZE = 10 * 1024 * 1024
+    LOG_BACKUPS = 1  # log.txt.1 al rotar por tamaño
+    LOG_JSON = False  # además, eventos estructurados en JSON lines
+    LOG_JSON_FILE = os.path.join(os.path.dirname(__file__), "log.jsonl")
     LOG_DETALLADO = True
     LOG_EN_CONSOLA = True
     MOSTRAR_LOGS_AUTO = True
@@ -50,10 +58,46 @@ class Config:
     FLASK_PORT = 5000
     DEBUG_MODE = True
     
+    # /metrics de los procesos sin Flask (0 = sin listener)
+    METRICS_HOST = "127.0.0.1"
+    METRICS_PORT_ORQUESTADOR = 9101
+    METRICS_PORT_DEFINITIVO = 9102
+    
     # Reintentos
     MAX_REINTENTOS = 5
     TIEMPO_ESPERA_REINTENTO = 2
     
+    TAMANO_BUFFER_COPIA = 1024 * 1024
+    
+    # Copia por snapshot: lectura compartida, validación del libro y publicación
+    # solo si el snapshot es consistente
+    SNAPSHOT_MAX_INTENTOS = 5
+    SNAPSHOT_PLAZO = 20  # segundos máximos esperando origen quieto / destino libre
+    SNAPSHOT_QUIETUD = 1.0  # segundos sin escrituras antes de repetir un snapshot
+    
+    # Cola de cambios: ráfagas de eventos dentro de esta ventana se agrupan
+    VENTANA_DEBOUNCE = 3
+    
+    # Trabajos de sincronización (vacío = par RUTA_ORIGEN -> RUTA_DESTINO)
+    # [{'name': ..., 'source': ..., 'destinations': [...], 'rules': {...}}]
+    SYNC_JOBS = []
+    MAX_WORKERS_SYNC = 4
+    MAX_CONCURRENCIA_DESTINO = 2  # copias simultáneas por carpeta destino
+    MAX_WORKERS_FANOUT = 4  # destinos escritos a la vez desde una sola lectura del origen
+    
+    # Decisiones IA (sistema definitivo): corren aparte de la ejecución de syncs
+    MAX_WORKERS_DECISION = 4
+    TIMEOUT_DECISION_IA = 5  # segundos; al vencer se aplica la regla de respaldo
+    PLAZO_DRENADO = 60  # segundos máximos terminando decisiones y syncs pendientes al detener
+    
+    # Reglas de clasificación (sección "rules"; se recargan al cambiar el archivo)
+    RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "ia_agent", "config", "orchestrator_config.json")
+    
+    # Estado persistente (SQLite WAL): evita recopias completas tras reiniciar
+    ESTADO_PERSISTENTE = True
+    STATE_DB = os.path.join(os.path.dirname(__file__), "sync_state.db")
+    
     @staticmethod
     def validar_rutas():
         """Validación mejorada"""
@@ -86,44 +130,69 @@ class Config:
         
         return errores
     
+    @staticmethod
+    def recargar(ruta=None):
+        """
+        Relee config.py y copia sus valores en mayúsculas sobre esta misma
+        clase (los módulos que ya importaron Config ven los cambios; `config`
+        y `backend.config` son el mismo módulo, ver backend/__init__.py).
+        Devuelve {clave: (anterior, nuevo)} con lo que cambió.
+        """
+        import importlib.util
+        spec = importlib.util.spec_from_file_location('_config_recargada', ruta or __file__)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        
+        cambios = {}
+        for clave, valor in vars(modulo.Config).items():
+            if clave.isupper() and getattr(Config, clave, None) != valor:
+                cambios[clave] = (getattr(Config, clave, None), valor)
+                setattr(Config, clave, valor)
+        return cambios
+    
     @staticmethod
     def get_timestamp():
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
+    @staticmethod
+    def _logger():
+        """Escritor asíncrono del log (se crea en el primer uso)"""
+        return get_async_logger(
+            Config.LOG_FILE,
+            max_bytes=Config.MAX_LOG_SIZE,
+            backups=Config.LOG_BACKUPS,
+            ruta_json=Config.LOG_JSON_FILE if Config.LOG_JSON else None,
+            consola=Config.LOG_EN_CONSOLA
+        )
+    
     @staticmethod
     def log_event(mensaje, nivel="INFO"):
-        """Sistema de logging CON ENCODING UTF-8"""
+        """Sistema de logging CON ENCODING UTF-8 (encola; escribe un hilo en segundo plano)"""
         timestamp = Config.get_timestamp()
         nivel_texto = {'INFO': 'INFO', 'ERROR': 'ERROR', 'WARNING': 'WARNING'}.get(nivel, 'INFO')
         log_line = f"[{timestamp}] {nivel_texto}: {mensaje}"
         
-        print(log_line)
-        
         try:
-            log_dir = os.path.dirname(Config.LOG_FILE)
-            if log_dir and not os.path.exists(log_dir):
-                os.makedirs(log_dir, exist_ok=True)
-            
-            if os.path.exists(Config.LOG_FILE) and os.path.getsize(Config.LOG_FILE) > Config.MAX_LOG_SIZE:
-                Config._limpiar_log()
-            
-            with open(Config.LOG_FILE, 'a', encoding='utf-8', errors='replace') as f:
-                f.write(log_line + '\n')
-                f.flush()
-                
+            Config._logger().write(log_line, nivel_texto, mensaje)
         except Exception as e:
+            print(log_line)
             print(f"ERROR escribiendo log: {e}")
     
+    @staticmethod
+    def flush_log(timeout=2.0):
+        """Espera a que las líneas encoladas estén en disco"""
+        return Config._logger().flush(timeout)
+    
+    @staticmethod
+    def log_buffer():
+        """Buffer circular con los registros recientes (cursor por secuencia)"""
+        return Config._logger().ring
+    
     @staticmethod
     def _limpiar_log():
+        """Rota el log (log.txt -> log.txt.1) sin leerlo"""
         try:
-            if os.path.exists(Config.LOG_FILE):
-                with open(Config.LOG_FILE, 'r', encoding='utf-8', errors='replace') as f:
-                    lineas = f.readlines()
-                lineas_recientes = lineas[-100:] if len(lineas) > 100 else lineas
-                with open(Config.LOG_FILE, 'w', encoding='utf-8', errors='replace') as f:
-                    f.write(f"[{Config.get_timestamp()}] INFO: Log limpiado\n")
-                    f.writelines(lineas_recientes)
+            Config._logger().rotate()
         except Exception as e:
             print(f"Error limpiando log: {e}")
     
@@ -0,0 +1,154 @@
+# backend/copia_segura.py - COPIA EN UNA SOLA PASADA CON HASH Y PUBLICACIÓN ATÓMICA
+"""
+Primitiva de copia para el camino de sincronización.
+
+Lee el origen una única vez en buffers grandes, calcula el hash mientras
+escribe un temporal junto al destino, hace fsync y lo publica con os.replace.
+El resultado trae el hash y los metadatos del origen, así la verificación
+posterior es una comparación en memoria y no una segunda lectura completa.
+
+Nota: os.sendfile / copy_file_range copian dentro del kernel y los bytes no
+pasan por Python, por lo que no sirven cuando hay que calcular el hash al
+vuelo; readinto() sobre un buffer reutilizable evita copias intermedias.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+from config import Config
+
+
+def ruta_temporal(destino, sufijo="copia"):
+    """Temporal oculto en el mismo directorio (os.replace debe ser en el mismo volumen)"""
+    directorio = os.path.dirname(destino) or '.'
+    return os.path.join(directorio, f".{os.path.basename(destino)}.{sufijo}_{os.getpid()}.tmp")
+
+
+def staging_local(nombre, sufijo="staging"):
+    """
+    Archivo de staging único en el directorio temporal local (mkstemp): dos
+    copias simultáneas del mismo archivo, en hilos o procesos distintos,
+    nunca comparten staging.
+    """
+    fd, ruta = tempfile.mkstemp(prefix=f".{os.path.basename(nombre)}.", suffix=f".{sufijo}.tmp")
+    os.close(fd)
+    return ruta
+
+
+def publicar_atomico(temporal, destino, origen=None):
+    """Copia metadatos del origen (como shutil.copy2) y reemplaza el destino"""
+    if origen:
+        shutil.copystat(origen, temporal)
+    os.replace(temporal, destino)
+
+
+def copiar_con_hash(origen, destino, algoritmo="md5", tamano_buffer=None):
+    """
+    Copia origen -> destino en una sola lectura.
+
+    Devuelve un dict con:
+      hash            digest hex del contenido publicado
+      tamano          bytes escritos
+      cabecera        primeros 8 bytes (firma ZIP/OLE para Excel)
+      origen_estable  False si el origen cambió de tamaño/mtime durante la lectura
+    """
+    tamano_buffer = tamano_buffer or getattr(Config, 'TAMANO_BUFFER_COPIA', 1024 * 1024)
+    digest = hashlib.new(algoritmo)
+    buffer = bytearray(tamano_buffer)
+    vista = memoryview(buffer)
+    temporal = ruta_temporal(destino)
+    escritos = 0
+    cabecera = b''
+
+    try:
+        with open(origen, 'rb') as entrada, open(temporal, 'wb') as salida:
+            antes = os.fstat(entrada.fileno())
+            while True:
+                leidos = entrada.readinto(buffer)
+                if not leidos:
+                    break
+                trozo = vista[:leidos]
+                if not cabecera:
+                    cabecera = bytes(trozo[:8])
+                digest.update(trozo)
+                salida.write(trozo)
+                escritos += leidos
+            salida.flush()
+            os.fsync(salida.fileno())
+            despues = os.fstat(entrada.fileno())
+
+        publicar_atomico(temporal, destino, origen)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    origen_estable = (antes.st_size == despues.st_size == escritos
+                      and antes.st_mtime == despues.st_mtime)
+
+    return {
+        'hash': digest.hexdigest(),
+        'algoritmo': algoritmo,
+        'tamano': escritos,
+        'cabecera': cabecera,
+        'mtime_origen': antes.st_mtime,
+        'origen_estable': origen_estable
+    }
+
+
+def hash_archivo(ruta, algoritmo="md5", tamano_buffer=None):
+    """Digest hex de un archivo completo (lectura en buffers grandes)"""
+    tamano_buffer = tamano_buffer or getattr(Config, 'TAMANO_BUFFER_COPIA', 1024 * 1024)
+    digest = hashlib.new(algoritmo)
+    buffer = bytearray(tamano_buffer)
+    vista = memoryview(buffer)
+    with open(ruta, 'rb') as f:
+        while True:
+            leidos = f.readinto(buffer)
+            if not leidos:
+                break
+            digest.update(vista[:leidos])
+    return digest.hexdigest()
+
+
+def verificar_resultado(destino, resultado, esperado=None, releer=False):
+    """
+    Verificación contra el resultado de copiar_con_hash / copiar_snapshot / fan-out.
+
+    - Tamaño del destino igual a los bytes escritos (tiempo constante).
+    - `esperado` (o resultado['hash_esperado']): digest que debía tener el
+      contenido publicado, p. ej. el del snapshot del origen. Se compara con el
+      digest de lo que realmente se escribió.
+    - `releer=True` además vuelve a leer el destino y compara su digest
+      (lectura completa; para cuando el contenido no se hasheó al escribir).
+
+    Sin digest que comparar solo se verifica el tamaño, y el mensaje lo dice.
+    """
+    if not resultado.get('publicado', True):
+        return False, resultado.get('motivo') or "El snapshot no se publicó"
+    if not resultado.get('origen_estable', True):
+        return False, "El origen cambió mientras se copiaba"
+    try:
+        tamano_destino = os.path.getsize(destino)
+    except OSError:
+        return False, "Archivo destino no existe"
+    if tamano_destino != resultado['tamano']:
+        return False, f"Tamaños diferentes: {resultado['tamano']:,} vs {tamano_destino:,}"
+
+    algoritmo = resultado.get('algoritmo', 'md5')
+    esperado = esperado or resultado.get('hash_esperado')
+    if esperado and resultado.get('hash') != esperado:
+        return False, (f"Hash diferente: escrito {algoritmo} {str(resultado.get('hash'))[:12]} "
+                       f"vs esperado {esperado[:12]}")
+    if releer:
+        try:
+            leido = hash_archivo(destino, algoritmo)
+        except OSError as e:
+            return False, f"No se pudo releer el destino: {e}"
+        if leido != (esperado or resultado.get('hash')):
+            return False, f"Hash del destino diferente: {algoritmo} {leido[:12]} vs {(esperado or resultado.get('hash'))[:12]}"
+
+    if esperado or releer:
+        return True, f"Copia verificada ({tamano_destino:,} bytes, {algoritmo} {resultado['hash'][:12]})"
+    return True, f"Tamaño verificado ({tamano_destino:,} bytes; {algoritmo} escrito {str(resultado.get('hash'))[:12]})"
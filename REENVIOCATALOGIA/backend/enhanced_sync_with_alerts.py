@@ -8,11 +8,20 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
+try:
+    from file_readiness import FileReadinessWaiter
+    from snapshot_copy import copiar_snapshot
+except ImportError:
+    from backend.file_readiness import FileReadinessWaiter
+    from backend.snapshot_copy import copiar_snapshot
+
 class OneDriveForcedSync:
     """Sistema que FUERZA sincronización OneDrive + alertas TXT + manejo de archivos bloqueados"""
     
-    def __init__(self):
+    def __init__(self, waiter=None):
         self.logger = logging.getLogger('OneDriveForced')
+        # Esperas por estado del archivo (backoff + eventos) en lugar de sleeps fijos
+        self.waiter = waiter or FileReadinessWaiter(default_deadline=12.0)
         
     def perform_sync_with_lock(self, origen, destino):
         """Sincronización con archivo de alerta y forzado OneDrive"""
@@ -23,6 +32,9 @@ class OneDriveForcedSync:
         #FILENAME CHANGING : f"SINCRONIZANDO_{destino_path.stem}.txt"
         alert_file = dest_dir / f"IA_LANGCHAIN_SINCRONIZANDO_{destino_path.stem}.txt"
         
+        self.waiter.reset_stats()
+        self.waiter.watch(dest_dir)
+        
         try:
             # PASO 1: Crear archivo de alerta
             self._create_lock_alert(alert_file)
@@ -30,8 +42,8 @@ class OneDriveForcedSync:
             # PASO 2: Forzar sincronización de alerta (para que otros la vean inmediatamente)
             self._force_onedrive_sync_immediate(dest_dir)
             
-            # PASO 3: Esperar que la alerta se propague
-            time.sleep(3)
+            # PASO 3: Esperar que la alerta se propague (OneDrive la libera tras subirla)
+            self.waiter.wait_until_ready(alert_file, deadline=3, technique='alert_propagation')
             
             # PASO 4: Realizar copia del archivo principal CON MANEJO DE BLOQUEOS
             copy_success = self._perform_robust_copy(origen, destino)
@@ -54,6 +66,7 @@ class OneDriveForcedSync:
                     'copy_success': copy_success,
                     'onedrive_sync': sync_success,
                     'cloud_verified': cloud_verified,
+                    'wait_times': self.waiter.get_wait_report(),
                     'message': f'Archivo sincronizado {"y verificado en nube" if cloud_verified else "localmente"}'
                 }
             else:
@@ -61,6 +74,7 @@ class OneDriveForcedSync:
                 self._remove_lock_alert(alert_file)
                 return {
                     'success': False,
+                    'wait_times': self.waiter.get_wait_report(),
                     'message': 'Error en copia de archivo - posible bloqueo por Excel'
                 }
                 
@@ -95,7 +109,7 @@ Proceso automático - No requiere intervención manual
             
             with open(alert_file, 'w', encoding='utf-8') as f:
                 f.write(alert_content)
-            time.sleep(8)  # Por probar Por probar 04/09/2025
+            self.waiter.wait_until_ready(alert_file, deadline=8, technique='create_lock_alert')
 
             self.logger.info(f"Alerta TXT creada: {alert_file.name}")
             
@@ -107,11 +121,11 @@ Proceso automático - No requiere intervención manual
 
         try:
             if alert_file.exists():
-                time.sleep(12)  # Esperar que OneDrive termine de procesar
-                        # Eliminación mejorada con múltiples intentos
+                # Esperar que OneDrive termine de procesar (vuelve en cuanto la libera)
+                self.waiter.wait_until_ready(alert_file, deadline=12, technique='remove_lock_alert')
+                # Eliminación mejorada con múltiples intentos
                 for intento in range(3):
                     try:
-                        time.sleep(2)
                         alert_file.unlink()
                         self.logger.info(f"Alerta TXT eliminada en intento {intento + 1}: {alert_file.name}")
                         return  # Éxito
@@ -121,132 +135,48 @@ Proceso automático - No requiere intervención manual
                     except PermissionError:
                         self.logger.warning(f"Intento {intento + 1}: OneDrive tiene el archivo bloqueado")
                         if intento < 2:
-                            time.sleep(5)  # Esperar más tiempo
+                            self.waiter.wait_until_ready(alert_file, deadline=5, technique='remove_lock_alert')
                     except Exception as e:
                         self.logger.warning(f"Intento {intento + 1}: {e}")
                         if intento < 2:
-                            time.sleep(3)
+                            self.waiter.wait_until_ready(alert_file, deadline=3, technique='remove_lock_alert')
             
-            # Si llegamos aquí, todos los intentos fallaron
-            self.logger.error(f"No se pudo eliminar {alert_file.name} - quedará en OneDrive")
+                # Si llegamos aquí, todos los intentos fallaron
+                self.logger.error(f"No se pudo eliminar {alert_file.name} - quedará en OneDrive")
             
         except Exception as e:
             self.logger.error(f"Error eliminando alerta: {e}")
 
-               #  try:
-            #if alert_file.exists():
-                #time.sleep(12)  # Esperar que OneDrive termine de procesar
-                #alert_file.unlink()
-                #self.logger.info(f"Alerta TXT eliminada: {alert_file.name}")
-        #except Exception as e:
-            #self.logger.error(f"Error eliminando alerta: {e}") """
-
-          
-
     def _perform_robust_copy(self, origen, destino):
-        """Copia robusta del archivo principal CON MANEJO DE ARCHIVOS BLOQUEADOS"""
+        """Copia del archivo principal por snapshot consistente (tolera el libro abierto en Excel)"""
         try:
-            # Verificar origen (sin cambios)
             if not os.path.exists(origen):
                 self.logger.error("Archivo origen no existe")
                 return False
             
-            # Crear directorio destino si no existe (sin cambios)
             dest_dir = os.path.dirname(destino)
             if not os.path.exists(dest_dir):
                 os.makedirs(dest_dir, exist_ok=True)
             
-            # NUEVA LÓGICA: Intentos con detección de bloqueo
-            max_attempts = 3
-            wait_time = 10  # segundos entre intentos
-            
-            for attempt in range(max_attempts):
-                try:
-                    self.logger.info(f"Intento de copia {attempt + 1}/{max_attempts}")
-                    
-                    # Detectar si el archivo está bloqueado ANTES de copiar
-                    if attempt > 0 and self._is_file_locked(destino):
-                        self.logger.warning(f"Archivo destino bloqueado en intento {attempt + 1}")
-                        if attempt < max_attempts - 1:
-                            self.logger.info(f"ARCHIVO BLOQUEADO POR EXCEL - Esperando {wait_time} segundos...")
-                            time.sleep(wait_time)
-                            continue
-                        else:
-                            # Último intento fallido - crear alerta empresarial
-                            self.logger.error("ARCHIVO PERMANECE BLOQUEADO DESPUÉS DE TODOS LOS INTENTOS")
-                            self._create_business_alert(destino, origen)
-                            return False
-                    
-                    # Copia estándar (igual que antes)
-                    shutil.copy2(origen, destino)
-                    
-                    # Verificación estándar (igual que antes)
-                    if os.path.exists(destino):
-                        size_origen = os.path.getsize(origen)
-                        size_destino = os.path.getsize(destino)
-                
-                
-                        if abs(size_origen - size_destino) <= 100:
-                                self.logger.info(f"Archivo copiado correctamente: {size_destino:,} bytes")
-                                return True  # ÉXITO
-                        else:
-                            self.logger.error(f"Tamaños no coinciden: {size_origen:,} vs {size_destino:,}")
-                            if attempt < max_attempts - 1:
-                                time.sleep(wait_time)
-                                continue
-                            return False
-                    else:
-                        self.logger.error("Archivo destino no existe después de copia")
-                        if attempt < max_attempts - 1:
-                            time.sleep(wait_time)
-                            continue
-                        return False
-                
-                except PermissionError as e:
-                    if "being used by another process" in str(e).lower():
-                        self.logger.warning(f"PermissionError: Archivo bloqueado - Intento {attempt + 1}/{max_attempts}")
-                        
-                        if attempt < max_attempts - 1:
-                            self.logger.info(f"Esperando {wait_time} segundos antes de reintentar...")
-                            time.sleep(wait_time)
-                            continue
-                        else:
-                            # ÚLTIMO INTENTO FALLIDO
-                            self.logger.error("ARCHIVO PERMANECE BLOQUEADO - Error de permisos")
-                            self._create_business_alert(destino, origen)
-                            return False  # FALLO - la IA procesa normal
-                    else:
-                        # Otro tipo de error de permisos
-                        self.logger.error(f"Error de permisos no relacionado con bloqueo: {e}")
-                        return False
-                
-                except Exception as e:
-                    self.logger.error(f"Error en intento {attempt + 1}: {e}")
-                    if attempt == max_attempts - 1:
-                        return False
-                    time.sleep(wait_time)
-            
+            # Lectura compartida + validación del libro; publica solo si el
+            # snapshot es consistente y en cuanto el destino se libera
+            resultado = copiar_snapshot(origen, destino, waiter=self.waiter)
+            if resultado['publicado']:
+                self.logger.info(f"Archivo copiado correctamente: {resultado['tamano']:,} bytes "
+                                 f"({resultado['snapshots']} lecturas)")
+                return True
+            
+            self.logger.error(f"Copia no publicada: {resultado['motivo']}")
+            if resultado['consistente']:
+                # El snapshot era bueno pero el destino siguió bloqueado todo el plazo
+                self.logger.error("ARCHIVO PERMANECE BLOQUEADO - alerta empresarial")
+                self._create_business_alert(destino, origen)
             return False
             
         except Exception as e:
             self.logger.error(f"Error crítico en copia robusta: {e}")
             return False
     
-    def _is_file_locked(self, file_path):
-        """Detecta si archivo está bloqueado por Excel u otro proceso"""
-        if not os.path.exists(file_path):
-            return False
-            
-        try:
-            # Intentar abrir en modo de escritura exclusivo
-            with open(file_path, 'r+b') as f:
-                pass
-            return False  # No está bloqueado
-        except (PermissionError, IOError):
-            return True   # Está bloqueado
-        except Exception:
-            return False  # Asumir que no está bloqueado en casos raros
-    
     def _create_business_alert(self, destino, origen):
         """Crea alerta empresarial SIN AFECTAR FLUJO IA"""
         try:
@@ -314,7 +244,6 @@ Estado: Monitoreo activo continuado
                     result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
                     if result.returncode == 0:
                         success_count += 1
-                    time.sleep(1)
                 except Exception:
                     continue
             
@@ -324,7 +253,7 @@ Estado: Monitoreo activo continuado
                 with open(trigger_file, 'w') as f:
                     f.write("trigger")
                 
-                time.sleep(2)
+                self.waiter.wait_until_ready(trigger_file, deadline=2, technique='onedrive_trigger')
                 
                 if trigger_file.exists():
                     trigger_file.unlink()
@@ -386,10 +315,9 @@ Estado: Monitoreo activo continuado
             
             self.logger.info("Verificando sincronización con nube OneDrive...")
             
-            start_time = time.time()
             max_wait_seconds = max_wait_minutes * 60    #60 segundos
             
-            while time.time() - start_time < max_wait_seconds:
+            def _cloud_synced():
                 # Método 1: Verificar atributos de sincronización
                 try:
                     result = subprocess.run([
@@ -418,7 +346,11 @@ Estado: Monitoreo activo continuado
                 except Exception:
                     pass
                 
-                time.sleep(5)  # Verificar cada 5 segundos
+                return False
+            
+            # Sondeo con backoff (antes: cada 5 segundos fijos)
+            if self.waiter.wait_for(_cloud_synced, deadline=max_wait_seconds, technique='verify_cloud_sync'):
+                return True
             
             # Timeout - asumir que está sincronizado si el archivo existe
             self.logger.warning("Timeout verificando nube, pero archivo existe localmente")
@@ -1,10 +1,15 @@
 # envio.py - GESTOR DE ENVÍO CORREGIDO PARA ONEDRIVE
 import os
-import shutil
 import hashlib
 import time
 from datetime import datetime
 from config import Config
+from copia_segura import verificar_resultado
+from snapshot_copy import copiar_snapshot
+from file_readiness import FileReadinessWaiter
+from state_store import get_state_store
+from event_bus import publish as publish_event
+from metrics import SYNC_RESULTS
 
 class GestorEnvio:
     def __init__(self):
@@ -14,8 +19,53 @@ class GestorEnvio:
         self.ultima_sincronizacion_exitosa = None
         self.ultimo_error = None
         
+        # Estado persistente: retomar tracking y contadores tras un reinicio
+        self.almacen = None
+        if getattr(Config, 'ESTADO_PERSISTENTE', False):
+            try:
+                self.almacen = get_state_store()
+                self._restaurar_estado()
+            except Exception as e:
+                Config.log_event(f"Estado persistente no disponible: {e}", "WARNING")
+                self.almacen = None
+        
+        self.ultimo_resultado_copia = None
+        self.waiter = FileReadinessWaiter()
+        
         Config.log_event("GestorEnvio inicializado con sincronizador robusto")
     
+    def _restaurar_estado(self):
+        """Carga último hash, modificación y contadores guardados"""
+        estado = self.almacen.get_file(Config.RUTA_ORIGEN)
+        if estado and estado['resultado'] == 'ok':
+            self.ultimo_hash = estado['digest']
+            self.ultima_modificacion = estado['mtime']
+            self.ultima_sincronizacion_exitosa = datetime.fromisoformat(estado['ultima_sync'])
+        contadores = self.almacen.get_counters('envio.')
+        self.sincronizaciones_realizadas = contadores.get('sincronizaciones_realizadas', 0)
+        if estado:
+            Config.log_event(f"Estado restaurado: {self.sincronizaciones_realizadas} sincronizaciones previas, "
+                             f"última {estado['ultima_sync']} ({estado['resultado']})")
+    
+    def _registrar_resultado(self, exito, mensaje='', stat_origen=None):
+        """
+        Persiste el estado de origen y destino tras una sincronización.
+        `stat_origen`: stat del origen tomado antes de leerlo (snapshot); así,
+        si el origen cambió después de la lectura, no queda registrado como
+        sincronizado.
+        """
+        if not self.almacen:
+            return
+        try:
+            digest = self.ultimo_hash if exito else None
+            resultado = 'ok' if exito else 'error'
+            self.almacen.record_sync(Config.RUTA_ORIGEN, digest, resultado, mensaje, stat=stat_origen)
+            self.almacen.record_sync(Config.RUTA_DESTINO, digest, resultado, mensaje)
+            if exito:
+                self.almacen.incr('envio.sincronizaciones_realizadas')
+        except Exception as e:
+            Config.log_event(f"No se pudo guardar estado de sincronización: {e}", "WARNING")
+    
     def calcular_hash_archivo(self, ruta_archivo):
         """Calcula hash MD5 del archivo"""
         try:
@@ -50,8 +100,10 @@ class GestorEnvio:
     
     def debe_sincronizar(self, forzar=False):
         """
-        LÓGICA CORREGIDA: SIEMPRE SINCRONIZA SIN VERIFICAR CAMBIOS
-        Esto soluciona el problema de OneDrive que no baja cambios
+        Sincroniza siempre que haya origen, sin comparar hashes (soluciona el
+        problema de OneDrive que no baja cambios). Única excepción, sin
+        `forzar`: el almacén persistente registra origen y destino intactos
+        (mismo tamaño/mtime) desde la última sincronización exitosa.
         """
         Config.log_event("Verificando si debe sincronizar...")
         
@@ -60,6 +112,12 @@ class GestorEnvio:
             Config.log_event("Archivo origen no existe", "ERROR")
             return False
         
+        # Tras un reinicio: si origen y destino conservan el tamaño/mtime de la
+        # última sincronización exitosa, se omite sin leer los archivos
+        if not forzar and self.almacen and self.almacen.is_unchanged(Config.RUTA_ORIGEN, Config.RUTA_DESTINO):
+            Config.log_event("Sin cambios desde la última sincronización registrada - copia omitida")
+            return False
+        
         # SIEMPRE SINCRONIZAR - No verificar cambios por hash
         Config.log_event("MODO FORZADO: Copiando siempre desde OneDrive (sin verificar cambios)")
         return True
@@ -73,6 +131,12 @@ class GestorEnvio:
                 Config.log_event("Archivo destino no existe", "ERROR")
                 return False
             
+            # La copia ya calculó hash y tamaño: comparación sin releer el archivo
+            if self.ultimo_resultado_copia:
+                ok, mensaje = verificar_resultado(Config.RUTA_DESTINO, self.ultimo_resultado_copia)
+                Config.log_event(f"Verificación {'OK' if ok else 'FALLIDA'}: {mensaje}", "INFO" if ok else "ERROR")
+                return ok
+            
             # Comparar tamaños
             size_origen = os.path.getsize(Config.RUTA_ORIGEN)
             size_destino = os.path.getsize(Config.RUTA_DESTINO)
@@ -89,36 +153,29 @@ class GestorEnvio:
             return False
     
     def realizar_copia_con_reintentos(self):
-        """Copia con reintentos para archivos abiertos - MÉTODO MEJORADO"""
-        Config.log_event("Iniciando copia con reintentos para archivos abiertos...")
+        """
+        Copia a partir de un snapshot consistente del origen (lectura compartida,
+        tamaño/mtime estables y libro válido). Si el libro está abierto o a medio
+        guardar se espera a que quede quieto; si el destino está bloqueado se
+        publica en cuanto se libera. Sin escaleras de reintentos por mensaje.
+        """
+        Config.log_event("Iniciando copia por snapshot consistente...")
         
-        max_intentos = Config.MAX_REINTENTOS
-        for intento in range(max_intentos):
-            try:
-                Config.log_event(f"Intento {intento + 1}/{max_intentos}")
-                
-                # Copia estándar
-                shutil.copy2(Config.RUTA_ORIGEN, Config.RUTA_DESTINO)
-                Config.log_event("Copia exitosa")
-                return True
-                
-            except PermissionError as e:
-                if "being used by another process" in str(e).lower():
-                    Config.log_event(f"Archivo en uso, esperando...", "WARNING")
-                    if intento < max_intentos - 1:
-                        wait_time = 0.5 * (intento + 1)  # Backoff: 0.5s, 1s, 1.5s, etc.
-                        Config.log_event(f"Esperando {wait_time} segundos...")
-                        time.sleep(wait_time)
-                        continue
-                Config.log_event(f"Error de permisos: {e}", "ERROR")
+        try:
+            # Snapshot con hash al vuelo y publicación atómica
+            resultado = copiar_snapshot(Config.RUTA_ORIGEN, Config.RUTA_DESTINO, waiter=self.waiter)
+            if not resultado['publicado']:
+                Config.log_event(f"Copia no publicada tras {resultado['snapshots']} lecturas: "
+                                 f"{resultado['motivo']}", "ERROR")
                 return False
-            except Exception as e:
-                Config.log_event(f"Error en copia: {e}", "ERROR")
-                if intento == max_intentos - 1:
-                    return False
-                time.sleep(Config.TIEMPO_ESPERA_REINTENTO)
-        
-        return False
+            self.ultimo_resultado_copia = resultado
+            Config.log_event(f"Copia exitosa: {resultado['tamano']:,} bytes "
+                             f"({resultado['snapshots']} lecturas, {resultado['motivo']})")
+            return True
+            
+        except Exception as e:
+            Config.log_event(f"Error en copia: {e}", "ERROR")
+            return False
     
     def realizar_copia(self):
         """Realiza la copia del archivo CON SYNC ONEDRIVE SUPER AGRESIVO"""
@@ -153,11 +210,16 @@ class GestorEnvio:
             
             # 6. REALIZAR LA COPIA PRINCIPAL (CON REINTENTOS MEJORADOS)
             Config.log_event("Copiando archivo desde OneDrive sincronizado...")
+            publish_event('copying', source=Config.RUTA_ORIGEN, destination=Config.RUTA_DESTINO,
+                          size=info_origen['tamaño'])
             tiempo_inicio = time.time()
             
             # Usar el método con reintentos
             if not self.realizar_copia_con_reintentos():
                 Config.log_event("Copia falló después de todos los reintentos", "ERROR")
+                publish_event('failed', source=Config.RUTA_ORIGEN, destination=Config.RUTA_DESTINO,
+                              message="Copia falló después de todos los reintentos")
+                SYNC_RESULTS.inc(strategy='envio', result='failed')
                 return False
             
             tiempo_copia = time.time() - tiempo_inicio
@@ -165,11 +227,21 @@ class GestorEnvio:
             
             # 7. Verificar que la copia fue exitosa
             if self.verificar_copia():
-                # 8. Actualizar tracking
-                self.ultimo_hash = self.calcular_hash_archivo(Config.RUTA_ORIGEN)
+                # 8. Actualizar tracking (la copia ya trae el hash del contenido publicado)
+                if self.ultimo_resultado_copia:
+                    self.ultimo_hash = self.ultimo_resultado_copia['hash']
+                else:
+                    self.ultimo_hash = self.calcular_hash_archivo(Config.RUTA_ORIGEN)
                 self.ultima_modificacion = info_origen['modificacion']
                 self.sincronizaciones_realizadas += 1
                 self.ultima_sincronizacion_exitosa = datetime.now()
+                self._registrar_resultado(True, "Copia verificada",
+                                          (self.ultimo_resultado_copia or {}).get('stat_origen'))
+                publish_event('verified', source=Config.RUTA_ORIGEN, destination=Config.RUTA_DESTINO,
+                              hash=self.ultimo_hash, duration=round(tiempo_copia, 3))
+                publish_event('counters', source='envio',
+                              sincronizaciones_realizadas=self.sincronizaciones_realizadas)
+                SYNC_RESULTS.inc(strategy='envio', result='ok')
                 
                 # 9. SINCRONIZAR ONEDRIVE DESPUÉS DE COPIA
                 Config.log_event("Sincronizando OneDrive después de copia...")
@@ -180,6 +252,10 @@ class GestorEnvio:
                 return True
             else:
                 Config.log_event("Verificación de copia falló", "ERROR")
+                self._registrar_resultado(False, "Verificación de copia falló")
+                publish_event('failed', source=Config.RUTA_ORIGEN, destination=Config.RUTA_DESTINO,
+                              message="Verificación de copia falló")
+                SYNC_RESULTS.inc(strategy='envio', result='verify_failed')
                 return False
                 
         except Exception as e:
@@ -227,7 +303,7 @@ class GestorEnvio:
             Config.log_event("=== PROCESANDO CAMBIO CON SINCRONIZADOR PARA ONEDRIVE ===")
             Config.log_event(f"Parámetros - Forzar: {forzar}, Modo OneDrive: SUPER AGRESIVO")
             
-            # Determinar si debe sincronizar (ahora SIEMPRE retorna True)
+            # Determinar si debe sincronizar (False solo sin origen o sin cambios registrados)
             if self.debe_sincronizar(forzar):
                 
                 # Limpiar backups existentes antes de sincronizar
@@ -251,6 +327,7 @@ class GestorEnvio:
                             self.ultima_modificacion = info_origen['modificacion']
                             self.sincronizaciones_realizadas += 1
                             self.ultima_sincronizacion_exitosa = datetime.now()
+                            self._registrar_resultado(True, "Sincronización robusta")
                         
                         mensaje = f"Sincronización robusta exitosa: {resultado_robusto['estrategia_exitosa']}"
                         Config.log_event(mensaje)
@@ -0,0 +1,115 @@
+# backend/event_bus.py - BUS DE EVENTOS EN PROCESO (PUB/SUB) PARA EL DASHBOARD
+"""
+Publicación única y reparto a todos los suscriptores.
+
+El motor de sincronización publica cada evento una sola vez (detected,
+queued, copying, verified, failed, counters, log) y el bus lo copia en la
+cola de cada suscriptor (cada dashboard conectado a /api/stream). Las colas
+son acotadas: si un cliente lento se atrasa se descartan sus eventos más
+viejos, nunca se bloquea al publicador.
+
+Guarda los últimos eventos para que un cliente que se reconecta con
+Last-Event-ID recupere lo que se perdió.
+"""
+
+import time
+import queue
+import threading
+import itertools
+from collections import deque
+
+
+class Subscription:
+    """Cola acotada de un suscriptor"""
+
+    def __init__(self, bus, max_queue):
+        self._bus = bus
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def _offer(self, evento):
+        while True:
+            try:
+                self._queue.put_nowait(evento)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Siguiente evento o None si vence el timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    """Pub/sub en memoria con reparto a N suscriptores"""
+
+    def __init__(self, historial=500, max_queue=1000):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subs = []
+        self._ids = itertools.count(1)
+        self._historial = deque(maxlen=historial)
+        self.stats = {'published': 0, 'delivered': 0}
+
+    def subscribe(self, desde_id=None):
+        """
+        Nueva suscripción. Con `desde_id` (Last-Event-ID) se encolan primero
+        los eventos guardados posteriores a ese id.
+        """
+        sub = Subscription(self, self.max_queue)
+        with self._lock:
+            if desde_id is not None:
+                for evento in self._historial:
+                    if evento['id'] > desde_id:
+                        sub._offer(evento)
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def publish(self, tipo, datos=None):
+        """Publica un evento una vez y lo reparte a todos los suscriptores"""
+        with self._lock:
+            evento = {
+                'id': next(self._ids),
+                'type': tipo,
+                'ts': time.time(),
+                'data': datos or {}
+            }
+            self._historial.append(evento)
+            subs = list(self._subs)
+            self.stats['published'] += 1
+            self.stats['delivered'] += len(subs)
+        for sub in subs:
+            sub._offer(evento)
+        return evento
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subs)
+
+
+# Un bus por proceso (`backend.event_bus` es este mismo módulo)
+_bus = EventBus()
+
+
+def get_event_bus():
+    return _bus
+
+
+def publish(tipo, **datos):
+    """Atajo: publica en el bus del proceso"""
+    return _bus.publish(tipo, datos)
@@ -0,0 +1,156 @@
+# backend/fanout.py - PUBLICACIÓN A VARIOS DESTINOS CON UNA SOLA LECTURA DEL ORIGEN
+"""
+Fan-out de un catálogo a varios recursos compartidos.
+
+1. Se toma UN snapshot consistente del origen (snapshot_copy) en un staging
+   local: es la única lectura del origen en OneDrive, con la misma espera a
+   que el libro quede quieto que la copia a un destino.
+2. El staging se mapea en memoria (mmap de solo lectura) y todos los destinos
+   se escriben en paralelo desde esa vista: agregar un destino cuesta solo
+   ancho de banda de escritura.
+3. Cada destino tiene su temporal, su fsync, su publicación atómica
+   (os.replace, con espera si el destino está bloqueado) y su verificación
+   (verificar_resultado: el digest de lo escrito en cada temporal debe ser el
+   del snapshot). Un destino que falla no afecta a los demás.
+
+`guard(destino)` permite al llamador envolver cada escritura con sus propios
+locks o semáforos (ver ParallelSyncManager).
+"""
+
+import os
+import mmap
+import time
+import hashlib
+import shutil
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from config import Config
+    from copia_segura import ruta_temporal, staging_local, verificar_resultado
+    from snapshot_copy import capturar_snapshot, publicar_con_espera
+    from file_readiness import FileReadinessWaiter
+    from metrics import COPY_RETRIES
+except ImportError:
+    from backend.config import Config
+    from backend.copia_segura import ruta_temporal, staging_local, verificar_resultado
+    from backend.snapshot_copy import capturar_snapshot, publicar_con_espera
+    from backend.file_readiness import FileReadinessWaiter
+    from backend.metrics import COPY_RETRIES
+
+
+@contextlib.contextmanager
+def _vista_staging(staging):
+    """Vista de solo lectura del staging (mmap; vacío si el archivo no tiene bytes)"""
+    with open(staging, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b'')
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            vista = memoryview(mapa)
+            try:
+                yield vista
+            finally:
+                vista.release()
+
+
+def escribir_destino(vista, staging, snapshot, destino, plazo=None, waiter=None, tamano_buffer=None):
+    """
+    Escribe la vista en un temporal junto a `destino`, lo publica de forma
+    atómica y verifica. Devuelve el dict de resultado de ese destino.
+    """
+    tamano_buffer = tamano_buffer or getattr(Config, 'TAMANO_BUFFER_COPIA', 1024 * 1024)
+    inicio = time.perf_counter()
+    digest = hashlib.new(snapshot['algoritmo'])
+    resultado = {
+        'destination': destino,
+        'hash': None,
+        'hash_esperado': snapshot['hash'],
+        'algoritmo': snapshot['algoritmo'],
+        'tamano': 0,
+        'publicado': False,
+        'motivo': None
+    }
+    temporal = ruta_temporal(destino, "fanout")
+
+    try:
+        directorio = os.path.dirname(destino)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with open(temporal, 'wb') as salida:
+            for desde in range(0, len(vista), tamano_buffer):
+                trozo = vista[desde:desde + tamano_buffer]
+                digest.update(trozo)
+                resultado['tamano'] += salida.write(trozo)
+            salida.flush()
+            os.fsync(salida.fileno())
+        shutil.copystat(staging, temporal)
+        resultado['hash'] = digest.hexdigest()
+
+        if resultado['hash'] != resultado['hash_esperado']:
+            resultado['motivo'] = "El temporal no coincide con el snapshot: no se publica"
+        else:
+            _, motivo = publicar_con_espera(lambda: os.replace(temporal, destino), plazo, waiter)
+            if motivo:
+                resultado['motivo'] = motivo
+            else:
+                resultado['publicado'] = True
+    except Exception as e:
+        resultado['motivo'] = f"Error escribiendo destino: {e}"
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    resultado['success'], resultado['message'] = verificar_resultado(destino, resultado)
+    resultado['duracion'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def publicar_fanout(origen, destinos, max_workers=None, plazo=None, max_intentos=None, waiter=None,
+                    algoritmo="md5", guard=None):
+    """
+    Publica `origen` en todos los `destinos` leyendo el origen una sola vez.
+
+    Devuelve un dict con:
+      success      True si todos los destinos quedaron publicados y verificados
+      snapshot     resultado del snapshot (hash, tamano, snapshots, motivo, ...)
+      results      un dict por destino (destination, success, message, hash, ...)
+      duration     segundos totales
+    """
+    destinos = list(destinos)
+    waiter = waiter or FileReadinessWaiter()
+    max_workers = max_workers or getattr(Config, 'MAX_WORKERS_FANOUT', 4)
+    inicio = time.perf_counter()
+    staging = staging_local(origen, "fanout")
+
+    try:
+        snapshot = capturar_snapshot(origen, staging, plazo, max_intentos, waiter, algoritmo)
+        if snapshot['snapshots'] > 1:
+            COPY_RETRIES.inc(snapshot['snapshots'] - 1, reason='snapshot_inconsistente')
+        if not snapshot['consistente']:
+            mensaje = f"Snapshot inconsistente tras {snapshot['snapshots']} lecturas: {snapshot['motivo']}"
+            return {
+                'success': False,
+                'snapshot': snapshot,
+                'results': [{'destination': d, 'success': False, 'message': mensaje} for d in destinos],
+                'duration': round(time.perf_counter() - inicio, 3)
+            }
+
+        with _vista_staging(staging) as vista:
+            def _un_destino(destino):
+                with (guard(destino) if guard else contextlib.nullcontext()):
+                    return escribir_destino(vista, staging, snapshot, destino, plazo, waiter)
+
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(destinos))),
+                                    thread_name_prefix='fanout') as pool:
+                results = list(pool.map(_un_destino, destinos))
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+    return {
+        'success': all(r['success'] for r in results),
+        'snapshot': snapshot,
+        'results': results,
+        'duration': round(time.perf_counter() - inicio, 3)
+    }
@@ -0,0 +1,173 @@
+# backend/file_readiness.py - ESPERA POR EVENTOS EN LUGAR DE SLEEPS FIJOS
+"""
+Esperador de "archivo listo" para las técnicas de sincronización OneDrive.
+
+En vez de dormir un número fijo de segundos entre pasos, sondea el estado
+del archivo con backoff exponencial + jitter y vuelve en cuanto el archivo
+está estable (mismo tamaño y mtime en dos lecturas seguidas) y sin bloqueo.
+Si hay un observer de watchdog, cada evento del directorio despierta a los
+que esperan antes de que venza el backoff. Cada espera tiene un plazo
+máximo y el tiempo consumido se acumula por técnica.
+"""
+
+import os
+import time
+import random
+import threading
+import logging
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+
+def is_file_locked(file_path):
+    """True si otro proceso (Excel, OneDrive) tiene el archivo bloqueado"""
+    try:
+        with open(file_path, 'r+b'):
+            pass
+        return False
+    except FileNotFoundError:
+        return False
+    except (PermissionError, IOError):
+        return True
+
+
+class FileReadinessWaiter:
+    """Espera con backoff exponencial + jitter hasta que un archivo está listo"""
+
+    def __init__(self, initial_delay=0.05, max_delay=2.0, factor=2.0, jitter=0.25,
+                 stable_checks=2, default_deadline=12.0):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.stable_checks = stable_checks
+        self.default_deadline = default_deadline
+
+        self._wakeup = threading.Condition()
+        self._generation = 0
+        self._observer = None
+        self._stats_lock = threading.Lock()
+        self.stats = {}
+        self.logger = logging.getLogger('FileReadiness')
+
+    # ------------------------------------------------------------------
+    # Notificaciones (watchdog o cualquier productor en proceso)
+    # ------------------------------------------------------------------
+    def notify(self, path=None):
+        """Despierta a todos los que esperan para que re-evalúen su condición"""
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def watch(self, directory):
+        """Suscribe el esperador a los eventos de watchdog del directorio"""
+        if not WATCHDOG_AVAILABLE or self._observer is not None:
+            return False
+        try:
+            waiter = self
+
+            class _WakeHandler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    waiter.notify(getattr(event, 'src_path', None))
+
+            self._observer = Observer()
+            self._observer.schedule(_WakeHandler(), str(directory), recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+            return True
+        except Exception as e:
+            self.logger.warning(f"No se pudo suscribir a eventos de {directory}: {e}")
+            self._observer = None
+            return False
+
+    def stop(self):
+        if self._observer:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+            self._observer = None
+
+    # ------------------------------------------------------------------
+    # Esperas
+    # ------------------------------------------------------------------
+    def _pause(self, delay, deadline_at):
+        """Duerme `delay` con jitter, o menos si llega una notificación o vence el plazo"""
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        delay = max(0.0, min(delay, deadline_at - time.monotonic()))
+        with self._wakeup:
+            generation = self._generation
+            self._wakeup.wait_for(lambda: self._generation != generation, timeout=delay)
+
+    def wait_for(self, predicate, deadline=None, technique='default'):
+        """Evalúa `predicate` con backoff hasta que sea True o venza el plazo"""
+        deadline = self.default_deadline if deadline is None else deadline
+        start = time.monotonic()
+        deadline_at = start + deadline
+        delay = self.initial_delay
+        ready = False
+
+        while True:
+            try:
+                ready = bool(predicate())
+            except Exception:
+                ready = False
+            if ready or time.monotonic() >= deadline_at:
+                break
+            self._pause(delay, deadline_at)
+            delay = min(delay * self.factor, self.max_delay)
+
+        self._record(technique, time.monotonic() - start, timed_out=not ready)
+        return ready
+
+    def wait_until_ready(self, file_path, deadline=None, technique='default', require_unlocked=True):
+        """Vuelve en cuanto el archivo existe, está estable y (opcionalmente) desbloqueado"""
+        state = {'last': None, 'stable': 0}
+
+        def _ready():
+            st = os.stat(file_path)
+            signature = (st.st_size, st.st_mtime_ns)
+            if signature == state['last']:
+                state['stable'] += 1
+            else:
+                state['last'] = signature
+                state['stable'] = 1
+            if state['stable'] < self.stable_checks:
+                return False
+            return not (require_unlocked and is_file_locked(file_path))
+
+        return self.wait_for(_ready, deadline, technique)
+
+    def wait_until_gone(self, file_path, deadline=None, technique='default'):
+        """Vuelve en cuanto el archivo ya no existe"""
+        return self.wait_for(lambda: not os.path.exists(file_path), deadline, technique)
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    def _record(self, technique, seconds, timed_out=False):
+        with self._stats_lock:
+            entry = self.stats.setdefault(technique, {'waits': 0, 'seconds': 0.0, 'timeouts': 0})
+            entry['waits'] += 1
+            entry['seconds'] += seconds
+            if timed_out:
+                entry['timeouts'] += 1
+
+    def get_wait_report(self):
+        """Tiempo de espera acumulado por técnica"""
+        with self._stats_lock:
+            return {
+                technique: {
+                    'waits': entry['waits'],
+                    'seconds': round(entry['seconds'], 3),
+                    'timeouts': entry['timeouts']
+                }
+                for technique, entry in self.stats.items()
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {}
@@ -6,7 +6,6 @@ import threading
 import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
-from queue import Queue, Empty
 import hashlib
 import logging
 
@@ -19,14 +18,34 @@ except ImportError:
     WATCHDOG_AVAILABLE = False
 
 from config import Config
+from copia_segura import verificar_resultado
+from snapshot_copy import copiar_snapshot
+from fanout import publicar_fanout
+from file_readiness import FileReadinessWaiter
+from change_scheduler import CoalescingScheduler
+from sync_jobs import SyncJobRegistry, ParallelSyncManager
+from state_store import get_state_store
+from event_bus import publish as publish_event
+from rule_engine import get_rule_engine
+from xlsx_diff import medir_cambio, resumen_cambio
+from metrics import DETECTION_TO_SYNC, SYNC_RESULTS
 
 class SmartVerificationMixin:
     """Verificación inteligente que no falla por diferencias de metadatos"""
     
     @staticmethod
-    def verify_file_copy_smart(origen, destino):
+    def verify_file_copy_smart(origen, destino, resultado_copia=None):
         """Verificación inteligente que considera las peculiaridades de OneDrive/Excel"""
         try:
+            # Copia con hash al vuelo: verificar contra el resultado sin releer archivos
+            if resultado_copia is not None:
+                success, message = verificar_resultado(destino, resultado_copia)
+                if success and destino.lower().endswith(('.xlsx', '.xls')):
+                    if resultado_copia['cabecera'][:2] not in [b'PK', b'\xd0\xcf']:
+                        return False, "Archivo destino corrupto o inaccesible"
+                    return True, "Archivo Excel válido copiado correctamente"
+                return success, message
+            
             if not os.path.exists(origen) or not os.path.exists(destino):
                 return False, "Uno de los archivos no existe"
             
@@ -69,8 +88,10 @@ class SmartVerificationMixin:
 class PragmaticSyncManager(SmartVerificationMixin):
     """Gestor de sincronización pragmático - funciona con OneDrive real"""
     
-    def __init__(self):
+    def __init__(self, almacen=None):
         self.logger = logging.getLogger('PragmaticSync')
+        self.almacen = almacen  # SyncStateStore opcional
+        self.waiter = FileReadinessWaiter()
         
     def sync_file_pragmatic(self, origen, destino):
         """Sincronización pragmática sin verificaciones excesivas"""
@@ -81,152 +102,96 @@ class PragmaticSyncManager(SmartVerificationMixin):
             if not os.path.exists(origen):
                 return False, "Archivo origen no existe"
             
+            # Sin cambios desde la última sincronización registrada (solo stat)
+            if self.almacen and self.almacen.is_unchanged(origen, destino):
+                Config.log_event("Sin cambios desde la última sincronización - copia omitida")
+                return True, "Sin cambios desde la última sincronización"
+            
             # 2. Crear directorio destino si no existe
             dest_dir = os.path.dirname(destino)
             if not os.path.exists(dest_dir):
                 os.makedirs(dest_dir, exist_ok=True)
                 Config.log_event(f"Directorio creado: {dest_dir}")
             
-            # 3. Copia pragmática con reintentos simples
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    Config.log_event(f"Intento de copia {attempt + 1}/{max_attempts}")
-                    
-                    # Esperar un poco si el archivo está siendo usado
-                    if attempt > 0:
-                        time.sleep(2)
-                    
-                    # Copia directa sin complicaciones
-                    shutil.copy2(origen, destino)
-                    
-                    # Verificación inteligente (no estricta)
-                    success, message = self.verify_file_copy_smart(origen, destino)
-                    
-                    if success:
-                        Config.log_event(f"Copia exitosa: {message}")
-                        return True, message
-                    else:
-                        Config.log_event(f"Verificación falló: {message}", "WARNING")
-                        if attempt < max_attempts - 1:
-                            Config.log_event("Reintentando copia...")
-                            continue
-                        
-                except PermissionError as e:
-                    if "being used by another process" in str(e).lower():
-                        Config.log_event("Archivo en uso, esperando...", "WARNING")
-                        time.sleep(3)
-                        continue
-                    else:
-                        return False, f"Error de permisos: {str(e)}"
-                        
-                except Exception as e:
-                    Config.log_event(f"Error en copia intento {attempt + 1}: {e}", "WARNING")
-                    if attempt == max_attempts - 1:
-                        return False, f"Error final: {str(e)}"
+            # 3. Copia por snapshot consistente: espera a que el libro quede
+            # quieto o el destino se libere, sin escalera de reintentos
+            resultado_copia = copiar_snapshot(origen, destino, waiter=self.waiter)
+            
+            # Verificación inteligente (no estricta) sin segunda lectura
+            success, message = self.verify_file_copy_smart(origen, destino, resultado_copia)
+            if success:
+                Config.log_event(f"Copia exitosa: {message} ({resultado_copia['snapshots']} lecturas)")
+                self._record(origen, destino, resultado_copia['hash'], 'ok', message,
+                             resultado_copia.get('stat_origen'))
+                return True, message
             
-            return False, "Todos los intentos de copia fallaron"
+            Config.log_event(f"Copia no publicada: {message}", "WARNING")
+            self._record(origen, destino, None, 'error', message)
+            return False, message
             
         except Exception as e:
             return False, f"Error crítico: {str(e)}"
+    
+    def sync_file_fanout(self, origen, destinos, guard=None):
+        """
+        Varios destinos con una sola lectura del origen: los destinos sin
+        cambios (según el almacén) se omiten y el resto se escribe en paralelo
+        desde el mismo snapshot.
+        """
+        if not os.path.exists(origen):
+            return [{'destination': d, 'success': False, 'message': "Archivo origen no existe"} for d in destinos]
+        
+        omitidos = [d for d in destinos if self.almacen and self.almacen.is_unchanged(origen, d)]
+        pendientes = [d for d in destinos if d not in omitidos]
+        resultados = [{'destination': d, 'success': True, 'message': "Sin cambios desde la última sincronización"}
+                      for d in omitidos]
+        if not pendientes:
+            Config.log_event("Sin cambios desde la última sincronización - copias omitidas")
+            return resultados
+        
+        Config.log_event(f"Sincronizando: {os.path.basename(origen)} -> {len(pendientes)} destinos (una lectura)")
+        fanout = publicar_fanout(origen, pendientes, waiter=self.waiter, guard=guard)
+        for r in fanout['results']:
+            if r['success']:
+                self._record(origen, r['destination'], r['hash'], 'ok', r['message'],
+                             fanout['snapshot'].get('stat_origen'))
+            else:
+                self._record(origen, r['destination'], None, 'error', r['message'])
+        ok = sum(1 for r in fanout['results'] if r['success'])
+        Config.log_event(f"Fan-out: {ok}/{len(pendientes)} destinos publicados en {fanout['duration']:.2f}s "
+                         f"({fanout['snapshot']['snapshots']} lecturas del origen)",
+                         "INFO" if fanout['success'] else "WARNING")
+        return resultados + fanout['results']
+    
+    def _record(self, origen, destino, digest, resultado, mensaje, stat_origen=None):
+        """
+        Persiste el estado de origen y destino en el almacén. `stat_origen` es
+        el stat previo a la lectura del snapshot: un cambio posterior del
+        origen no queda registrado como sincronizado.
+        """
+        if not self.almacen:
+            return
+        try:
+            self.almacen.record_sync(origen, digest, resultado, mensaje, stat=stat_origen)
+            self.almacen.record_sync(destino, digest, resultado, mensaje)
+        except Exception as e:
+            Config.log_event(f"No se pudo guardar estado de sincronización: {e}", "WARNING")
 
 class IntelligentRuleAnalyzer:
     """Analizador inteligente basado en reglas - SIN API, SIN COSTO"""
     
-    def __init__(self):
-        # Reglas de negocio inteligentes
-        self.rules = {
-            'critical_keywords': [
-                'precio', 'price', 'stock', 'inventario', 'inventory',
-                'descuento', 'discount', 'promocion', 'promotion', 'oferta',
-                'catalogo', 'catalog', 'producto', 'product'
-            ],
-            'urgent_size_mb': 0.1,  # Cambios > 100KB son importantes
-            'ignore_patterns': [
-                'temp', 'tmp', 'backup', 'bak', '~$', '.crdownload'
-            ],
-            'excel_extensions': ['.xlsx', '.xls', '.xlsm'],
-            'business_hours': (8, 18),  # 8 AM - 6 PM
-            'weekend_delay_multiplier': 2
-        }
+    def __init__(self, engine=None):
+        # Reglas de negocio declarativas (orchestrator_config.json, sección
+        # "rules"), compiladas una vez y recargadas si cambia el archivo
+        self.engine = engine or get_rule_engine()
+    
+    @property
+    def rules(self):
+        return self.engine.rules
     
     def analyze_file_change(self, file_path, file_size=0, change_size=0):
         """Análisis inteligente sin IA externa"""
-        
-        filename = os.path.basename(file_path).lower()
-        now = datetime.now()
-        
-        # Verificar si debe ignorarse
-        if any(pattern in filename for pattern in self.rules['ignore_patterns']):
-            return {
-                'action': 'IGNORE',
-                'priority': 'NONE',
-                'reason': 'Archivo temporal o backup detectado',
-                'delay_seconds': 0,
-                'sync_immediately': False
-            }
-        
-        # Análisis de contexto temporal
-        is_business_hours = (
-            now.weekday() < 5 and  # Lunes-Viernes
-            self.rules['business_hours'][0] <= now.hour < self.rules['business_hours'][1]
-        )
-        is_weekend = now.weekday() >= 5
-        
-        # Análisis de contenido
-        has_critical_keywords = any(
-            keyword in filename for keyword in self.rules['critical_keywords']
-        )
-        is_excel_file = any(filename.endswith(ext) for ext in self.rules['excel_extensions'])
-        is_significant_change = abs(change_size) > (self.rules['urgent_size_mb'] * 1024 * 1024)
-        
-        # Lógica de decisión inteligente
-        base_priority = 'MEDIUM'
-        base_delay = 60  # 1 minuto por defecto
-        
-        # Reglas de escalamiento
-        if has_critical_keywords and is_excel_file:
-            base_priority = 'CRITICAL'
-            base_delay = 0  # Inmediato
-            reason = 'Archivo crítico de catálogo con palabras clave importantes'
-            
-        elif is_significant_change and is_excel_file:
-            base_priority = 'HIGH'
-            base_delay = 10 if is_business_hours else 30
-            reason = f'Cambio significativo en archivo Excel ({abs(change_size/1024/1024):.1f}MB)'
-            
-        elif is_excel_file and is_business_hours:
-            base_priority = 'MEDIUM'
-            base_delay = 30
-            reason = 'Archivo Excel modificado en horario laboral'
-            
-        else:
-            base_priority = 'LOW'
-            base_delay = 300  # 5 minutos
-            reason = 'Modificación estándar de archivo'
-        
-        # Ajustes por contexto temporal
-        if is_weekend:
-            base_delay *= self.rules['weekend_delay_multiplier']
-            reason += ' (fin de semana - menor urgencia)'
-        
-        if not is_business_hours and base_delay < 60:
-            base_delay = max(60, base_delay * 2)
-            reason += ' (fuera de horario laboral)'
-        
-        return {
-            'action': 'SYNC',
-            'priority': base_priority,
-            'reason': reason,
-            'delay_seconds': base_delay,
-            'sync_immediately': base_delay == 0,
-            'business_context': {
-                'is_business_hours': is_business_hours,
-                'is_weekend': is_weekend,
-                'has_critical_content': has_critical_keywords,
-                'is_excel': is_excel_file
-            }
-        }
+        return self.engine.classify_file(file_path, file_size, change_size)
 
 class FixedRealtimeHandler(FileSystemEventHandler):
     """Handler corregido que funciona con sistema real"""
@@ -234,9 +199,6 @@ class FixedRealtimeHandler(FileSystemEventHandler):
     def __init__(self, sync_manager):
         super().__init__()
         self.sync_manager = sync_manager
-        self.monitored_file = Path(Config.RUTA_ORIGEN)
-        self.last_change = {}
-        self.debounce_seconds = 3
         
     def on_modified(self, event):
         if event.is_directory:
@@ -244,55 +206,35 @@ class FixedRealtimeHandler(FileSystemEventHandler):
             
         file_path = Path(event.src_path)
         
-        # Solo nuestro archivo específico
-        if file_path.name != self.monitored_file.name:
+        # Solo archivos con un trabajo de sincronización registrado
+        if not self.sync_manager.registry.find_by_source(str(file_path)):
             return
         
-        current_time = time.time()
-        file_key = str(file_path)
-        
-        # Debounce
-        if file_key in self.last_change:
-            if current_time - self.last_change[file_key] < self.debounce_seconds:
-                return
-        
-        self.last_change[file_key] = current_time
-        
-        # Obtener info del archivo después de estabilidad
-        file_info = self._get_stable_file_info(file_path)
+        # Sin descartar ni esperar: el planificador agrupa la ráfaga
+        # (VENTANA_DEBOUNCE) y mide el archivo una vez quieto; el hilo de
+        # watchdog solo hace un stat
+        file_info = _file_info(file_path)
         if file_info:
             self.sync_manager.queue_sync(file_info)
-    
-    def _get_stable_file_info(self, file_path):
-        """Obtiene info del archivo cuando está estable"""
-        try:
-            # Esperar que el archivo esté estable
-            for _ in range(3):
-                if not file_path.exists():
-                    return None
-                    
-                initial_size = file_path.stat().st_size
-                time.sleep(1)
-                
-                if file_path.exists():
-                    final_size = file_path.stat().st_size
-                    if initial_size == final_size and final_size > 0:
-                        break
-                else:
-                    return None
-            
-            stat_info = file_path.stat()
-            return {
-                'path': str(file_path),
-                'name': file_path.name,
-                'size': stat_info.st_size,
-                'modified_time': datetime.fromtimestamp(stat_info.st_mtime),
-                'size_mb': round(stat_info.st_size / (1024*1024), 2)
-            }
-            
-        except Exception as e:
-            Config.log_event(f"Error obteniendo info de archivo: {e}", "WARNING")
-            return None
+
+
+def _file_info(file_path):
+    """Datos del archivo con un solo stat (None si ya no existe)"""
+    file_path = Path(file_path)
+    try:
+        stat_info = file_path.stat()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        Config.log_event(f"Error obteniendo info de archivo: {e}", "WARNING")
+        return None
+    return {
+        'path': str(file_path),
+        'name': file_path.name,
+        'size': stat_info.st_size,
+        'modified_time': datetime.fromtimestamp(stat_info.st_mtime),
+        'size_mb': round(stat_info.st_size / (1024*1024), 2)
+    }
 
 class FixedSyncSystem:
     """Sistema de sincronización corregido y funcional"""
@@ -300,20 +242,42 @@ class FixedSyncSystem:
     def __init__(self):
         self.is_running = False
         self.observer = None
-        self.sync_queue = Queue()
+        self.scheduler = CoalescingScheduler(
+            debounce_seconds=getattr(Config, 'VENTANA_DEBOUNCE', 3),
+            name='fixed_sync'
+        )
         self.worker_thread = None
         
+        # Estado persistente (sobrevive reinicios)
+        self.state_store = None
+        if getattr(Config, 'ESTADO_PERSISTENTE', False):
+            try:
+                self.state_store = get_state_store()
+            except Exception as e:
+                Config.log_event(f"Estado persistente no disponible: {e}", "WARNING")
+        
         # Componentes corregidos
-        self.sync_manager = PragmaticSyncManager()
+        self.sync_manager = PragmaticSyncManager(self.state_store)
         self.analyzer = IntelligentRuleAnalyzer()
         
+        # Trabajos (origen -> destinos) y pool de workers en paralelo
+        self.registry = SyncJobRegistry.from_config()
+        self.sync_pool = ParallelSyncManager(self.sync_manager.sync_file_pragmatic,
+                                             fanout_fn=self.sync_manager.sync_file_fanout)
+        self._stats_lock = threading.Lock()
+        
         # Estadísticas
         self.stats = {
             'detections': 0,
             'successful_syncs': 0,
             'failed_syncs': 0,
-            'ignored_files': 0
+            'ignored_files': 0,
+            'noop_saves': 0
         }
+        if self.state_store:
+            for key, value in self.state_store.get_counters('fixed_sync.').items():
+                if key in self.stats:
+                    self.stats[key] = value
         
         self.logger = logging.getLogger('FixedSyncSystem')
     
@@ -325,7 +289,11 @@ class FixedSyncSystem:
         
         try:
             # Verificar configuración básica
-            if not os.path.exists(Config.RUTA_ORIGEN):
+            jobs = self.registry.all()
+            for job in jobs:
+                if not os.path.exists(job.source):
+                    Config.log_event(f"Origen no existe para trabajo {job.name}: {job.source}", "WARNING")
+            if not any(os.path.exists(job.source) for job in jobs):
                 Config.log_event("ERROR CRÍTICO: Archivo origen no existe", "ERROR")
                 return False
             
@@ -338,9 +306,9 @@ class FixedSyncSystem:
             # Configurar observer
             self.observer = Observer()
             handler = FixedRealtimeHandler(self)
-            watch_dir = os.path.dirname(Config.RUTA_ORIGEN)
-            
-            self.observer.schedule(handler, watch_dir, recursive=False)
+            for watch_dir in self.registry.watch_dirs():
+                if os.path.isdir(watch_dir):
+                    self.observer.schedule(handler, watch_dir, recursive=False)
             self.observer.start()
             
             # Iniciar worker thread
@@ -357,7 +325,9 @@ class FixedSyncSystem:
             Config.log_event("  ✓ Análisis por reglas (sin API)")
             Config.log_event("  ✓ Compatible con OneDrive real")
             Config.log_event("  ✓ Detección en tiempo real")
-            Config.log_event(f"Monitoreando: {os.path.basename(Config.RUTA_ORIGEN)}")
+            Config.log_event(f"  ✓ Pool de {self.sync_pool.max_workers} workers en paralelo")
+            for job in jobs:
+                Config.log_event(f"Monitoreando: {os.path.basename(job.source)} -> {len(job.destinations)} destino(s)")
             Config.log_event("=" * 60)
             
             return True
@@ -386,44 +356,130 @@ class FixedSyncSystem:
             Config.log_event(f"Error instalando watchdog: {e}", "ERROR")
             return False
     
+    def _bump(self, key):
+        """Incrementa un contador (y su copia persistente)"""
+        with self._stats_lock:
+            self.stats[key] += 1
+            value = self.stats[key]
+        if self.state_store:
+            try:
+                self.state_store.incr(f'fixed_sync.{key}')
+            except Exception:
+                pass
+        return value
+    
+    def _analyze(self, file_info, change_size=0):
+        """Análisis por reglas; las reglas del trabajo tienen precedencia sobre el analizador"""
+        analysis = self.analyzer.analyze_file_change(file_info['path'], file_info['size'], change_size)
+        for job in self.registry.find_by_source(file_info['path']):
+            if 'priority' in job.rules:
+                analysis['priority'] = job.rules['priority']
+            if 'delay_seconds' in job.rules:
+                analysis['delay_seconds'] = job.rules['delay_seconds']
+                analysis['sync_immediately'] = job.rules['delay_seconds'] == 0
+        return analysis
+    
+    @staticmethod
+    def _merge_task(previo, nuevo):
+        """Agrupa dos tareas del mismo archivo conservando el primer evento"""
+        primero = min(previo['first_event_at'], nuevo['first_event_at'])
+        if nuevo.get('stage') == 'sync' and previo.get('stage') != 'sync':
+            # Llegó otro evento antes de reagendar: ese cambio aún no está medido
+            return dict(previo, first_event_at=primero)
+        return dict(nuevo, first_event_at=primero)
+    
     def queue_sync(self, file_info):
-        """Agrega sincronización a cola con análisis inteligente"""
-        self.stats['detections'] += 1
+        """
+        Agrega el cambio a la cola. Tras el debounce el worker mide el
+        cambio real (diff del libro) y recién con ese tamaño decide la
+        prioridad y la espera: este es el hilo de watchdog y no debe abrir
+        el libro en cada evento.
+        """
+        self._bump('detections')
         
-        # Análisis inteligente por reglas
-        analysis = self.analyzer.analyze_file_change(
-            file_info['path'],
-            file_info['size'],
-            0  # Por simplicidad, no calculamos cambio de tamaño aquí
-        )
+        # Análisis preliminar (sin tamaño de cambio): descarta ignorados
+        analysis = self._analyze(file_info)
         
         if analysis['action'] == 'IGNORE':
-            self.stats['ignored_files'] += 1
+            self._bump('ignored_files')
             Config.log_event(f"Archivo ignorado: {analysis['reason']}")
             return
         
-        Config.log_event("=" * 50)
-        Config.log_event(f"CAMBIO DETECTADO #{self.stats['detections']}")
-        Config.log_event(f"Archivo: {file_info['name']}")
-        Config.log_event(f"Tamaño: {file_info['size_mb']:.2f} MB")
-        Config.log_event(f"Análisis: {analysis['priority']} - {analysis['reason']}")
+        publish_event('detected', path=file_info['path'], name=file_info['name'],
+                      size=file_info['size'], priority=analysis['priority'])
+        
+        Config.log_event(f"Cambio en cola #{self.stats['detections']}: {file_info['name']} "
+                         f"({file_info['size_mb']:.2f} MB) - {analysis['priority']} - {analysis['reason']}")
         
-        # Agregar a cola
+        # Agendar la medición tras el debounce (o agrupar con la tarea
+        # pendiente del mismo archivo, que vuelve a medirse)
         sync_task = {
             'file_info': file_info,
             'analysis': analysis,
-            'queued_at': datetime.now()
+            'queued_at': datetime.now(),
+            'first_event_at': time.time(),
+            'stage': 'medir'
         }
         
-        if analysis['sync_immediately']:
-            Config.log_event("SINCRONIZACIÓN INMEDIATA")
-            # Poner al frente de la cola
-            self.sync_queue.put(sync_task)
+        created = self.scheduler.schedule(
+            file_info['path'],
+            sync_task,
+            delay_seconds=0,
+            priority=analysis['priority'],
+            merge=self._merge_task
+        )
+        
+        publish_event('queued', path=file_info['path'], priority=analysis['priority'],
+                      delay_seconds=self.scheduler.debounce_seconds, coalesced=not created)
+        
+        if not created:
+            Config.log_event("Cambio agrupado con sincronización pendiente")
         else:
-            delay = analysis['delay_seconds']
-            Config.log_event(f"Sincronización programada en {delay} segundos")
-            # En un sistema real, usaríamos un scheduler, por simplicidad agregamos inmediatamente
-            self.sync_queue.put(sync_task)
+            Config.log_event(f"Medición del cambio tras {self.scheduler.debounce_seconds}s sin cambios")
+    
+    def _measure(self, sync_task, jobs):
+        """
+        Mide el cambio real respecto de lo publicado en cada destino (CRC de
+        partes + celdas de las hojas modificadas) y vuelve a analizar con ese
+        tamaño. Devuelve la tarea lista para sincronizar, o None si quedó
+        descartada o reagendada.
+        """
+        # Datos del archivo ya quieto (los del último evento pueden ser de media escritura)
+        file_info = _file_info(sync_task['file_info']['path'])
+        if file_info is None:
+            Config.log_event(f"Archivo ya no existe: {sync_task['file_info']['name']} - sincronización omitida", "WARNING")
+            return None
+        sync_task = dict(sync_task, file_info=file_info)
+        diffs = [medir_cambio(file_info['path'], destino) for job in jobs for destino in job.destinations]
+        medidos = [diff for diff in diffs if diff is not None]
+        if diffs and len(medidos) == len(diffs) and all(diff['noop'] for diff in medidos):
+            self._bump('noop_saves')
+            Config.log_event(f"Guardado sin cambios de contenido: {file_info['name']} - sincronización omitida")
+            return None
+        cambio = max(medidos, key=lambda diff: diff['change_bytes']) if medidos else None
+        
+        # Con el tamaño real: un cambio grande toma la vía rápida (HIGH, sin espera)
+        analysis = self._analyze(file_info, cambio['change_bytes'] if cambio else 0)
+        sync_task = dict(sync_task, analysis=analysis, cambio=cambio, stage='sync')
+        if analysis['action'] == 'IGNORE':
+            self._bump('ignored_files')
+            Config.log_event(f"Archivo ignorado: {analysis['reason']}")
+            return None
+        
+        # CRITICAL/HIGH sale ya (el debounce ya dio la ventana de estabilidad);
+        # el resto espera lo que indiquen las reglas, contado desde el primer evento
+        if analysis['priority'] in ('CRITICAL', 'HIGH'):
+            return sync_task
+        restante = analysis['delay_seconds'] - (time.time() - sync_task['first_event_at'])
+        if restante > 0:
+            self.scheduler.schedule(file_info['path'], sync_task, delay_seconds=restante,
+                                    priority=analysis['priority'], merge=self._merge_task)
+            publish_event('queued', path=file_info['path'], priority=analysis['priority'],
+                          delay_seconds=restante, coalesced=False)
+            Config.log_event(f"Cambio medido: {file_info['name']} - {resumen_cambio(cambio)} - "
+                             f"{analysis['priority']} - sincronización programada en {restante:.0f} segundos")
+            return None
+        return sync_task
     
     def _sync_worker(self):
         """Worker que procesa sincronizaciones de forma inteligente"""
@@ -431,58 +487,85 @@ class FixedSyncSystem:
         
         while self.is_running:
             try:
-                # Obtener siguiente tarea
-                sync_task = self.sync_queue.get(timeout=1)
+                # Obtener siguiente tarea vencida (la más urgente primero)
+                scheduled = self.scheduler.pop_due(timeout=1)
+                if scheduled is None:
+                    continue
                 
+                sync_task = scheduled.payload
                 file_info = sync_task['file_info']
+                jobs = self.registry.find_by_source(file_info['path'])
+                
+                # Primer paso tras el debounce: medir y decidir con el tamaño real
+                if sync_task.get('stage') != 'sync':
+                    sync_task = self._measure(sync_task, jobs)
+                    if sync_task is None:
+                        continue
                 analysis = sync_task['analysis']
                 
+                Config.log_event("=" * 50)
+                Config.log_event(f"CAMBIO DETECTADO #{self.stats['detections']} - {resumen_cambio(sync_task['cambio'])}")
+                Config.log_event(f"Archivo: {file_info['name']}")
+                Config.log_event(f"Tamaño: {file_info['size_mb']:.2f} MB")
+                Config.log_event(f"Análisis: {analysis['priority']} - {analysis['reason']}")
                 Config.log_event("PROCESANDO SINCRONIZACIÓN")
                 Config.log_event(f"Prioridad: {analysis['priority']}")
+                if scheduled.coalesced:
+                    Config.log_event(f"Eventos agrupados: {scheduled.coalesced + 1} cambios -> 1 sincronización")
                 
-                # Ejecutar sincronización pragmática
-                start_time = time.time()
-                success, message = self.sync_manager.sync_file_pragmatic(
-                    Config.RUTA_ORIGEN,
-                    Config.RUTA_DESTINO
-                )
-                sync_duration = time.time() - start_time
-                
-                if success:
-                    self.stats['successful_syncs'] += 1
-                    Config.log_event(f"SINCRONIZACIÓN EXITOSA en {sync_duration:.2f}s")
-                    Config.log_event(f"Resultado: {message}")
-                else:
-                    self.stats['failed_syncs'] += 1
-                    Config.log_event(f"SINCRONIZACIÓN FALLIDA: {message}", "ERROR")
-                
-                Config.log_event(f"Estadísticas: {self.stats['successful_syncs']} éxitos, {self.stats['failed_syncs']} fallos")
-                Config.log_event("=" * 50)
+                # Despachar al pool: archivos distintos se copian en paralelo
+                detected_at = sync_task['first_event_at']
+                for sync_job in jobs:
+                    self.sync_pool.submit(sync_job, on_done=lambda job, result, detected_at=detected_at:
+                                          self._on_sync_done(job, result, detected_at))
                 
-                self.sync_queue.task_done()
-                
-            except Empty:
-                continue
             except Exception as e:
                 Config.log_event(f"Error en worker: {e}", "ERROR")
-                self.stats['failed_syncs'] += 1
+                self._bump('failed_syncs')
                 time.sleep(5)
     
+    def _on_sync_done(self, job, result, detected_at=None):
+        """Callback del pool al terminar un trabajo (`detected_at`: primer evento, time.time())"""
+        if result.get('coalesced'):
+            # Mismo resultado que otro pedido agrupado en esa repetición (ya contado)
+            Config.log_event(f"[{job.name}] Cambio agrupado con la repetición: {result['message']}",
+                             "INFO" if result['success'] else "ERROR")
+            return
+        
+        self._bump('successful_syncs' if result['success'] else 'failed_syncs')
+        SYNC_RESULTS.inc(strategy='pragmatic', result='ok' if result['success'] else 'failed')
+        if result['success'] and detected_at is not None:
+            DETECTION_TO_SYNC.observe(max(0.0, time.time() - detected_at), sync_job=job.name)
+        successful, failed = self.stats['successful_syncs'], self.stats['failed_syncs']
+        publish_event('counters', source='fixed_sync', **self.stats)
+        
+        if result['success']:
+            Config.log_event(f"[{job.name}] SINCRONIZACIÓN EXITOSA en {result.get('duration', 0):.2f}s")
+        else:
+            Config.log_event(f"[{job.name}] SINCRONIZACIÓN FALLIDA: {result['message']}", "ERROR")
+        for r in result['results']:
+            Config.log_event(f"  - {os.path.basename(os.path.dirname(r['destination']))}: {r['message']}",
+                             "INFO" if r['success'] else "ERROR")
+        
+        Config.log_event(f"Estadísticas: {successful} éxitos, {failed} fallos")
+        Config.log_event("=" * 50)
+    
     def force_sync(self):
         """Fuerza sincronización inmediata"""
         try:
             Config.log_event("SINCRONIZACIÓN FORZADA MANUAL")
-            success, message = self.sync_manager.sync_file_pragmatic(
-                Config.RUTA_ORIGEN,
-                Config.RUTA_DESTINO
-            )
+            results = self.sync_pool.run_all(self.registry.all())
+            success = True
             
-            if success:
-                Config.log_event(f"Sincronización manual exitosa: {message}")
-                self.stats['successful_syncs'] += 1
-            else:
-                Config.log_event(f"Error en sincronización manual: {message}", "ERROR")
-                self.stats['failed_syncs'] += 1
+            for result in results:
+                if result['success']:
+                    Config.log_event(f"Sincronización manual exitosa [{result['job']}]: {result['message']}")
+                else:
+                    Config.log_event(f"Error en sincronización manual [{result['job']}]: {result['message']}", "ERROR")
+                    success = False
+                if not result.get('coalesced'):
+                    self._bump('successful_syncs' if result['success'] else 'failed_syncs')
+                    SYNC_RESULTS.inc(strategy='pragmatic', result='ok' if result['success'] else 'failed')
             
             return success
             
@@ -496,8 +579,11 @@ class FixedSyncSystem:
             'running': self.is_running,
             'watchdog_available': WATCHDOG_AVAILABLE,
             'observer_alive': self.observer.is_alive() if self.observer else False,
-            'queue_size': self.sync_queue.qsize(),
+            'queue_size': self.scheduler.pending_count(),
             'stats': self.stats.copy(),
+            'scheduler': self.scheduler.get_stats(),
+            'pool': self.sync_pool.get_stats(),
+            'jobs': [job.to_dict() for job in self.registry.all()],
             'features': {
                 'no_backups': True,
                 'smart_verification': True,
@@ -510,6 +596,7 @@ class FixedSyncSystem:
         """Detiene el sistema"""
         Config.log_event("Deteniendo sistema corregido...")
         self.is_running = False
+        self.scheduler.close()
         
         if self.observer:
             self.observer.stop()
@@ -518,11 +605,15 @@ class FixedSyncSystem:
         if self.worker_thread:
             self.worker_thread.join(timeout=5)
         
+        # Esperar las copias en curso (publicación atómica, no quedan a medias)
+        self.sync_pool.shutdown(wait=True)
+        
         Config.log_event("ESTADÍSTICAS FINALES:")
         Config.log_event(f"  - Detecciones: {self.stats['detections']}")
         Config.log_event(f"  - Sincronizaciones exitosas: {self.stats['successful_syncs']}")
         Config.log_event(f"  - Sincronizaciones fallidas: {self.stats['failed_syncs']}")
         Config.log_event(f"  - Archivos ignorados: {self.stats['ignored_files']}")
+        Config.log_event(f"  - Eventos agrupados: {self.scheduler.stats['coalesced']}")
         Config.log_event("Sistema corregido detenido")
 
 # Instancia global
@@ -0,0 +1,101 @@
+# backend/log_buffer.py - BUFFER CIRCULAR DE LOGS Y LECTURA DESDE EL FINAL
+"""
+Registros recientes del log en memoria para /api/logs.
+
+El escritor asíncrono (async_logger) agrega cada lote al buffer circular con
+un número de secuencia creciente. El dashboard pide `?since=<seq>` y recibe
+solo las líneas nuevas, recorriendo el buffer desde el final: el costo es
+proporcional a las líneas nuevas, no al tamaño del archivo.
+
+`tail_lines` lee el archivo desde el final por bloques (seek hacia atrás)
+para el arranque en frío, cuando el buffer todavía no tiene historial.
+"""
+
+import os
+import threading
+from collections import deque
+
+
+class LogRingBuffer:
+    """Últimos N registros de log con número de secuencia"""
+
+    def __init__(self, capacidad=2000):
+        self._items = deque(maxlen=capacidad)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def __len__(self):
+        return len(self._items)
+
+    def extend(self, registros):
+        """registros: iterable de (timestamp, nivel, linea, mensaje)"""
+        with self._cond:
+            for ts, nivel, linea, mensaje in registros:
+                self._seq += 1
+                self._items.append({
+                    'seq': self._seq,
+                    'ts': ts,
+                    'nivel': nivel,
+                    'linea': linea,
+                    'mensaje': mensaje if mensaje is not None else linea
+                })
+            self._cond.notify_all()
+
+    def since(self, seq, limite=None):
+        """
+        Registros con secuencia > seq (los más recientes si hay más de
+        `limite`). Devuelve (registros, hueco): hueco=True si parte de lo
+        pedido no se devuelve (ya salió del buffer o quedó fuera por
+        `limite`) y conviene recargar completo.
+        """
+        with self._cond:
+            primero = self._items[0]['seq'] if self._items else self._seq + 1
+            hueco = seq < primero - 1
+            nuevos = []
+            for item in reversed(self._items):
+                if item['seq'] <= seq:
+                    break
+                if limite and len(nuevos) >= limite:
+                    # Quedan registros posteriores a `seq` sin devolver
+                    hueco = True
+                    break
+                nuevos.append(item)
+        nuevos.reverse()
+        return nuevos, hueco
+
+    def tail(self, n):
+        with self._cond:
+            if n <= 0:
+                return []
+            return list(self._items)[-n:]
+
+    def wait(self, seq, timeout=None):
+        """Bloquea hasta que haya registros posteriores a `seq` (o timeout)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq > seq, timeout)
+
+    def clear(self):
+        """Vacía el buffer conservando la secuencia (los cursores siguen siendo válidos)"""
+        with self._cond:
+            self._items.clear()
+
+
+def tail_lines(ruta, n, bloque=8192):
+    """Últimas `n` líneas del archivo leyendo bloques desde el final"""
+    if n <= 0:
+        return []
+    with open(ruta, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        datos = b''
+        # n+1 saltos garantizan n líneas completas (la primera puede estar cortada)
+        while posicion > 0 and datos.count(b'\n') <= n:
+            leer = min(bloque, posicion)
+            posicion -= leer
+            f.seek(posicion)
+            datos = f.read(leer) + datos
+    return datos.decode('utf-8', errors='ignore').splitlines()[-n:]
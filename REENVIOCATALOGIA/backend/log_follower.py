@@ -0,0 +1,196 @@
+# backend/log_follower.py - SEGUIMIENTO DEL LOG POR EVENTOS (TAIL -F)
+"""
+Sigue un archivo de log y entrega las líneas nuevas por lotes.
+
+- Mantiene el archivo abierto y avanza desde su posición: no re-abre ni
+  re-busca en cada ciclo.
+- Sobrevive a truncado (tamaño < posición: vuelve al inicio) y a rotación
+  (cambia el inode: termina de leer el archivo viejo y abre el nuevo desde
+  el principio), así no se pierden líneas.
+- Se despierta con eventos de watchdog del directorio o con el hook en
+  proceso del escritor asíncrono (add_listener); el sondeo periódico es solo
+  el tope de latencia si no llega ninguna notificación.
+- Solo entrega líneas completas (una línea a medio escribir espera al '\n').
+"""
+
+import os
+import threading
+import logging
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+
+class LogFollower:
+    """Hilo que entrega a `callback(lineas)` las líneas nuevas del log"""
+
+    def __init__(self, ruta, callback, max_latency=10.0, batch_max=500, from_end=True):
+        self.ruta = str(ruta)
+        self.callback = callback
+        self.max_latency = max_latency
+        self.batch_max = batch_max
+        self.from_end = from_end
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._writer = None
+
+        self._archivo = None
+        self._inode = None
+        self._posicion = 0
+        self._resto = b''
+
+        self.stats = {'lines': 0, 'batches': 0, 'truncations': 0, 'rotations': 0}
+        self.logger = logging.getLogger('LogFollower')
+
+    # ------------------------------------------------------------------
+    # Notificaciones
+    # ------------------------------------------------------------------
+    def notify(self, *_args):
+        """Despierta al hilo para leer ya (watchdog, escritor en proceso, etc.)"""
+        self._wake.set()
+
+    def attach_writer(self, writer):
+        """Engancha al escritor asíncrono del mismo proceso (cada lote despierta)"""
+        if os.path.normcase(os.path.abspath(writer.ruta)) == os.path.normcase(os.path.abspath(self.ruta)):
+            writer.add_listener(self.notify)
+            self._writer = writer
+            return True
+        return False
+
+    def _watch_directory(self):
+        if not WATCHDOG_AVAILABLE:
+            return
+        follower = self
+        nombre = os.path.basename(self.ruta)
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                rutas = (getattr(event, 'src_path', ''), getattr(event, 'dest_path', ''))
+                if any(os.path.basename(str(r)).startswith(nombre) for r in rutas if r):
+                    follower.notify()
+
+        try:
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), os.path.dirname(os.path.abspath(self.ruta)), recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+        except Exception as e:
+            self.logger.warning(f"Sin notificaciones de archivo, solo sondeo: {e}")
+            self._observer = None
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._open(al_final=self.from_end)
+        self._watch_directory()
+        self._thread = threading.Thread(target=self._run, name='LogFollower', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._writer:
+            self._writer.remove_listener(self.notify)
+            self._writer = None
+        if self._observer:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+            self._observer = None
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.max_latency)
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.error(f"Error siguiendo log: {e}")
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def _open(self, al_final=False):
+        self._close()
+        try:
+            self._archivo = open(self.ruta, 'rb')
+        except OSError:
+            return False
+        stat = os.fstat(self._archivo.fileno())
+        self._inode = (stat.st_dev, stat.st_ino)
+        self._posicion = stat.st_size if al_final else 0
+        self._archivo.seek(self._posicion)
+        self._resto = b''
+        return True
+
+    def _close(self):
+        if self._archivo:
+            try:
+                self._archivo.close()
+            except Exception:
+                pass
+        self._archivo = None
+
+    def _read_new(self):
+        """Lee desde la posición actual hasta el final del archivo abierto"""
+        if not self._archivo:
+            return []
+        datos = self._archivo.read()
+        if not datos:
+            return []
+        self._posicion += len(datos)
+        datos = self._resto + datos
+        partes = datos.split(b'\n')
+        self._resto = partes.pop()  # línea incompleta (o b'')
+        return [p.decode('utf-8', errors='ignore').rstrip('\r') for p in partes]
+
+    def poll(self):
+        """Lee todo lo nuevo (manejando truncado/rotación) y lo entrega por lotes"""
+        lineas = []
+
+        if self._archivo is None:
+            # El log no existía o se rotó sin reemplazo: leer desde el inicio
+            if not self._open(al_final=False):
+                return 0
+
+        try:
+            stat = os.stat(self.ruta)
+        except OSError:
+            stat = None
+
+        if stat is not None and (stat.st_dev, stat.st_ino) != self._inode:
+            # Rotación: terminar el archivo viejo y seguir con el nuevo desde 0
+            lineas.extend(self._read_new())
+            self.stats['rotations'] += 1
+            self._open(al_final=False)
+        elif stat is not None and stat.st_size < self._posicion:
+            # Truncado: el contenido nuevo empieza en 0
+            self.stats['truncations'] += 1
+            self._archivo.seek(0)
+            self._posicion = 0
+            self._resto = b''
+
+        lineas.extend(self._read_new())
+        lineas = [linea for linea in lineas if linea]
+
+        for inicio in range(0, len(lineas), self.batch_max):
+            lote = lineas[inicio:inicio + self.batch_max]
+            self.stats['batches'] += 1
+            self.stats['lines'] += len(lote)
+            self.callback(lote)
+
+        return len(lineas)
@@ -0,0 +1,320 @@
+# backend/metrics.py - MÉTRICAS EN PROCESO CON FORMATO DE TEXTO DE PROMETHEUS
+"""
+Contadores, gauges e histogramas en memoria, sin dependencias externas.
+
+`get_registry().render()` devuelve el formato de exposición de texto 0.0.4
+de Prometheus (el que sirve /metrics en app.py), así que cualquier scraper
+de Prometheus o agente compatible puede leerlo sin instalar
+prometheus_client.
+
+Métricas del sistema de sincronización (prefijo `reenvio_`):
+  detection_to_sync_seconds   primer evento de cambio -> copia verificada
+  copy_seconds                duración de cada copia por snapshot
+  copy_throughput_mbps        MB/s de cada copia por snapshot
+  copy_retries_total          relecturas del origen y reintentos de publicación
+  sync_results_total          sincronizaciones por estrategia y resultado
+  queue_depth                 trabajos pendientes por cola del planificador
+  coalesced_events_total      eventos agrupados con un trabajo pendiente
+  llm_call_seconds            latencia de cada llamada (lote) al LLM
+  llm_calls_total             llamadas al LLM por componente y resultado
+  startup_seconds             arranque del proceso hasta quedar monitoreando
+  time_to_first_sync_seconds  arranque del proceso hasta la primera sync exitosa
+
+Cada proceso expone solo lo que mide: el orquestador IA y
+start_ai_system_definitivo corren en procesos propios y sirven su propio
+/metrics con servir_metricas (Config.METRICS_PORT_ORQUESTADOR /
+METRICS_PORT_DEFINITIVO); app.py lo sirve en el puerto de Flask.
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BUCKETS_COPIA = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_THROUGHPUT = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+BUCKETS_LLM = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+
+
+def _formato_valor(valor):
+    if valor == math.inf:
+        return '+Inf'
+    if valor == -math.inf:
+        return '-Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _formato_labels(nombres, valores, extra=None):
+    pares = list(zip(nombres, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{n}="{_escapar(v)}"' for n, v in pares) + '}'
+
+
+class _Metrica:
+    tipo = 'untyped'
+
+    def __init__(self, nombre, ayuda, labels=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _clave(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.nombre}: se esperaban las etiquetas {self.labels}, "
+                             f"llegaron {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _muestras(self):
+        raise NotImplementedError
+
+    def render(self):
+        lineas = [f"# HELP {self.nombre} {_escapar(self.ayuda)}", f"# TYPE {self.nombre} {self.tipo}"]
+        for sufijo, valores, extra, valor in self._muestras():
+            lineas.append(f"{self.nombre}{sufijo}{_formato_labels(self.labels, valores, extra)} "
+                          f"{_formato_valor(valor)}")
+        return '\n'.join(lineas)
+
+
+class Counter(_Metrica):
+    """Contador monótono por combinación de etiquetas"""
+    tipo = 'counter'
+
+    def inc(self, valor=1, **labels):
+        if valor < 0:
+            raise ValueError("Un contador no puede decrecer")
+        clave = self._clave(labels)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._clave(labels), 0)
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [('_total' if not self.nombre.endswith('_total') else '', clave, None, valor)
+                for clave, valor in series]
+
+
+class Gauge(_Metrica):
+    """Valor instantáneo; `set_function` lo calcula en cada lectura"""
+    tipo = 'gauge'
+
+    def set(self, valor, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._series[clave] = valor
+
+    def inc(self, valor=1, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            actual = self._series.get(clave, 0)
+            self._series[clave] = (actual if not callable(actual) else actual()) + valor
+
+    def dec(self, valor=1, **labels):
+        self.inc(-valor, **labels)
+
+    def set_function(self, funcion, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._series[clave] = funcion
+
+    def value(self, **labels):
+        with self._lock:
+            valor = self._series.get(self._clave(labels), 0)
+        return valor() if callable(valor) else valor
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        muestras = []
+        for clave, valor in series:
+            if callable(valor):
+                try:
+                    valor = valor()
+                except Exception:
+                    continue
+            muestras.append(('', clave, None, valor))
+        return muestras
+
+
+class Histogram(_Metrica):
+    """Histograma acumulado con buckets fijos (más _sum y _count)"""
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, labels=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, labels)
+        self.buckets = tuple(sorted(float(b) for b in buckets)) + (math.inf,)
+
+    def observe(self, valor, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie['buckets'][i] += 1
+                    break
+            serie['sum'] += valor
+            serie['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observa la duración del bloque `with` (también si lanza)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            serie = self._series.get(self._clave(labels))
+            return serie['count'] if serie else 0
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted((clave, {'buckets': list(s['buckets']), 'sum': s['sum'], 'count': s['count']})
+                            for clave, s in self._series.items())
+        muestras = []
+        for clave, serie in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets, serie['buckets']):
+                acumulado += n
+                muestras.append(('_bucket', clave, ('le', _formato_valor(limite)), acumulado))
+            muestras.append(('_sum', clave, None, serie['sum']))
+            muestras.append(('_count', clave, None, serie['count']))
+        return muestras
+
+
+class MetricsRegistry:
+    """Métricas del proceso por nombre (pedir dos veces la misma devuelve la misma)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def _obtener(self, clase, nombre, ayuda, labels, **kwargs):
+        with self._lock:
+            metrica = self._metricas.get(nombre)
+            if metrica is None:
+                metrica = self._metricas[nombre] = clase(nombre, ayuda, labels, **kwargs)
+            elif not isinstance(metrica, clase) or metrica.labels != tuple(labels):
+                raise ValueError(f"La métrica {nombre} ya existe con otro tipo o etiquetas")
+            return metrica
+
+    def counter(self, nombre, ayuda, labels=()):
+        return self._obtener(Counter, nombre, ayuda, labels)
+
+    def gauge(self, nombre, ayuda, labels=()):
+        return self._obtener(Gauge, nombre, ayuda, labels)
+
+    def histogram(self, nombre, ayuda, labels=(), buckets=BUCKETS_LATENCIA):
+        return self._obtener(Histogram, nombre, ayuda, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda m: m.nombre)
+        return '\n'.join(m.render() for m in metricas) + '\n'
+
+
+# Un registro por proceso (`backend.metrics` es este mismo módulo)
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+DETECTION_TO_SYNC = _registry.histogram(
+    'reenvio_detection_to_sync_seconds',
+    'Segundos desde el primer evento de cambio hasta la sincronización verificada',
+    ('sync_job',))
+COPY_SECONDS = _registry.histogram(
+    'reenvio_copy_seconds', 'Duración de cada copia por snapshot (lectura + publicación)',
+    ('result',), buckets=BUCKETS_COPIA)
+COPY_THROUGHPUT = _registry.histogram(
+    'reenvio_copy_throughput_mbps', 'MB/s de cada copia por snapshot publicada',
+    buckets=BUCKETS_THROUGHPUT)
+COPY_RETRIES = _registry.counter(
+    'reenvio_copy_retries_total', 'Relecturas del origen y reintentos de publicación en destino',
+    ('reason',))
+SYNC_RESULTS = _registry.counter(
+    'reenvio_sync_results_total', 'Sincronizaciones terminadas por estrategia y resultado',
+    ('strategy', 'result'))
+QUEUE_DEPTH = _registry.gauge(
+    'reenvio_queue_depth', 'Trabajos pendientes en cada cola del planificador', ('queue',))
+COALESCED_EVENTS = _registry.counter(
+    'reenvio_coalesced_events_total', 'Eventos de cambio agrupados con un trabajo pendiente',
+    ('queue',))
+LLM_CALL_SECONDS = _registry.histogram(
+    'reenvio_llm_call_seconds', 'Latencia de cada llamada (lote) al LLM',
+    ('component', 'kind'), buckets=BUCKETS_LLM)
+LLM_CALLS = _registry.counter(
+    'reenvio_llm_calls_total', 'Llamadas al LLM por componente y resultado', ('component', 'result'))
+STARTUP_SECONDS = _registry.gauge(
+    'reenvio_startup_seconds', 'Segundos desde el arranque del proceso hasta quedar monitoreando',
+    ('component',))
+FIRST_SYNC_SECONDS = _registry.gauge(
+    'reenvio_time_to_first_sync_seconds',
+    'Segundos desde el arranque del proceso hasta la primera sincronización exitosa', ('component',))
+
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def servir_metricas(puerto, host='127.0.0.1', registry=None):
+    """
+    Sirve GET /metrics de este proceso en un hilo daemon (para los procesos
+    que no corren app.py). Devuelve el servidor (shutdown() lo detiene) o
+    None si `puerto` es 0/None. OSError si el puerto está ocupado.
+    """
+    if not puerto:
+        return None
+    handler = type('HandlerMetricas', (_HandlerMetricas,), {'registry': registry or _registry})
+    servidor = ThreadingHTTPServer((host, int(puerto)), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name=f'metrics-{puerto}', daemon=True).start()
+    return servidor
+
+
+@contextmanager
+def medir_llamada_llm(component, kind):
+    """Latencia y resultado de una llamada al LLM"""
+    resultado = 'error'
+    try:
+        with LLM_CALL_SECONDS.time(component=component, kind=kind):
+            yield
+        resultado = 'ok'
+    finally:
+        LLM_CALLS.inc(component=component, result=resultado)
@@ -0,0 +1,316 @@
+# backend/rule_engine.py - MOTOR DE REGLAS DECLARATIVAS PRECOMPILADAS
+"""
+Reglas de clasificación de cambios y logs, declaradas en la sección "rules"
+de ia_agent/config/orchestrator_config.json.
+
+- Todas las listas de palabras clave se compilan en UNA expresión regular
+  combinada: una sola pasada por línea devuelve todas las categorías
+  presentes (critical, ignore, conflict, ...). Equivale a evaluar
+  `any(k in texto)` por cada lista, pero sin recorrer las listas.
+- La decisión de sincronización sale de una tabla de decisión: la primera
+  fila cuyas condiciones se cumplen define prioridad, demora y motivo.
+- Los patrones de confianza de las respuestas IA se combinan en una sola
+  regex.
+- Recarga en caliente: si cambia el mtime del JSON se recompila y se
+  reemplaza el conjunto compilado de una vez (los lectores nunca ven reglas a
+  medio cargar). Si el JSON nuevo es inválido se conservan las reglas previas.
+"""
+
+import os
+import re
+import json
+import copy
+import logging
+import time
+import threading
+from datetime import datetime
+
+try:
+    from config import Config
+except ImportError:
+    from backend.config import Config
+
+DEFAULT_RULES = {
+    'keyword_sets': {
+        'critical': [
+            'precio', 'price', 'stock', 'inventario', 'inventory',
+            'descuento', 'discount', 'promocion', 'promotion', 'oferta',
+            'catalogo', 'catalog', 'producto', 'product'
+        ],
+        'ignore': ['temp', 'tmp', 'backup', 'bak', '~$', '.crdownload'],
+        'conflict': ['editing', 'locked', 'temp', 'backup'],
+        'urgent_response': ['crítico', 'urgent', 'immedia'],
+        'likely_response': ['probable', 'likely', 'normal']
+    },
+    'excel_extensions': ['.xlsx', '.xls', '.xlsm'],
+    'confidence_patterns': [
+        r'confianza[:\s]+(\d+)%',
+        r'confidence[:\s]+(\d+)%',
+        r'certeza[:\s]+(\d+)%'
+    ],
+    'confidence_defaults': {'urgent_response': 90, 'likely_response': 75, 'default': 80},
+    'urgent_size_mb': 0.1,
+    'business_hours': [8, 18],
+    'weekend_delay_multiplier': 2,
+    'off_hours_min_delay': 60,
+    # Primera fila que cumple todas sus condiciones gana
+    'decision_table': [
+        {'when': {'ignore': True}, 'action': 'IGNORE', 'priority': 'NONE', 'delay_seconds': 0,
+         'reason': 'Archivo temporal o backup detectado'},
+        {'when': {'critical': True, 'excel': True}, 'priority': 'CRITICAL', 'delay_seconds': 0,
+         'reason': 'Archivo crítico de catálogo con palabras clave importantes'},
+        {'when': {'significant_change': True, 'excel': True}, 'priority': 'HIGH',
+         'delay_seconds': 10, 'delay_seconds_off_hours': 30,
+         'reason': 'Cambio significativo en archivo Excel ({change_mb:.1f}MB)'},
+        {'when': {'excel': True, 'business_hours': True}, 'priority': 'MEDIUM', 'delay_seconds': 30,
+         'reason': 'Archivo Excel modificado en horario laboral'},
+        {'when': {}, 'priority': 'LOW', 'delay_seconds': 300,
+         'reason': 'Modificación estándar de archivo'}
+    ]
+}
+
+
+def _trie_pattern(palabras):
+    """
+    Regex con forma de trie (prefijos comunes factorizados): el motor de re
+    descarta una posición con un solo carácter en vez de probar cada palabra.
+    """
+    trie = {}
+    for palabra in palabras:
+        nodo = trie
+        for caracter in palabra:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = True
+
+    def construir(nodo):
+        fin = '' in nodo
+        ramas = [re.escape(c) + construir(hijo) for c, hijo in sorted(nodo.items()) if c != '']
+        if not ramas:
+            return ''
+        if len(ramas) == 1 and not fin:
+            return ramas[0]
+        return '(?:' + '|'.join(ramas) + ')' + ('?' if fin else '')
+
+    return construir(trie)
+
+
+def _merge_rules(base, override):
+    """Reglas por defecto + sección "rules" del JSON (keyword_sets se combina por lista)"""
+    reglas = copy.deepcopy(base)
+    for clave, valor in (override or {}).items():
+        if clave == 'keyword_sets' and isinstance(valor, dict):
+            reglas['keyword_sets'].update(valor)
+        else:
+            reglas[clave] = valor
+    return reglas
+
+
+class CompiledRules:
+    """Reglas compiladas (inmutables: una recarga crea otra instancia)"""
+
+    def __init__(self, reglas):
+        self.reglas = reglas
+
+        # keyword -> categorías. Si una palabra contiene a otra, hereda sus
+        # categorías: la regex (lookahead en cada posición, cuantificadores
+        # codiciosos) toma la palabra más larga que empieza ahí y así no se
+        # pierden coincidencias superpuestas.
+        categorias = {}
+        for categoria, palabras in reglas['keyword_sets'].items():
+            for palabra in palabras:
+                palabra = str(palabra).lower()
+                if palabra:
+                    categorias.setdefault(palabra, set()).add(categoria)
+        self.categorias = {
+            palabra: frozenset().union(*(cats for otra, cats in categorias.items() if otra in palabra))
+            for palabra in categorias
+        }
+        self.keywords_re = re.compile(
+            '(?=(' + _trie_pattern(self.categorias) + '))'
+        ) if self.categorias else None
+
+        extensiones = [str(e).lower().lstrip('.') for e in reglas['excel_extensions']]
+        self.excel_re = re.compile(
+            r'\.(?:' + '|'.join(re.escape(e) for e in extensiones) + r')$'
+        ) if extensiones else None
+
+        patrones = reglas['confidence_patterns']
+        self.confidence_re = re.compile(
+            '|'.join(f'(?:{p})' for p in patrones)
+        ) if patrones else None
+
+        self.decision_table = list(reglas['decision_table'])
+
+    def categories(self, texto):
+        """Categorías presentes en `texto` (una pasada, sin distinguir mayúsculas)"""
+        if self.keywords_re is None or not texto:
+            return frozenset()
+        encontradas = set()
+        for match in self.keywords_re.finditer(texto.lower()):
+            encontradas |= self.categorias[match.group(1)]
+        return frozenset(encontradas)
+
+
+class RuleEngine:
+    """Reglas declarativas compiladas con recarga en caliente"""
+
+    def __init__(self, config_path=None, reload_interval=2.0):
+        self.config_path = config_path or getattr(Config, 'RULES_FILE', None)
+        self.reload_interval = reload_interval
+        self.logger = logging.getLogger('RuleEngine')
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._last_check = time.monotonic()
+        self.reloads = 0
+        self._compiled = CompiledRules(DEFAULT_RULES)
+        self.reload(force=True)
+
+    # ------------------------------------------------------------------
+    # Carga y recarga
+    # ------------------------------------------------------------------
+    def reload(self, force=False):
+        """Recompila si el JSON cambió. True si se cargaron reglas nuevas"""
+        if not self.config_path:
+            return False
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return False
+        with self._lock:
+            if not force and mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            try:
+                with open(self.config_path, 'r', encoding='utf-8') as f:
+                    seccion = json.load(f).get('rules')
+                compiladas = CompiledRules(_merge_rules(DEFAULT_RULES, seccion))
+            except Exception as e:
+                self.logger.warning(f"Reglas inválidas en {self.config_path}, se mantienen las anteriores: {e}")
+                return False
+            self._compiled = compiladas
+            self.reloads += 1
+        return True
+
+    @property
+    def compiled(self):
+        """Reglas vigentes (revisa el mtime como mucho cada `reload_interval` s)"""
+        ahora = time.monotonic()
+        if ahora - self._last_check >= self.reload_interval:
+            self._last_check = ahora
+            self.reload()
+        return self._compiled
+
+    @property
+    def rules(self):
+        return self.compiled.reglas
+
+    # ------------------------------------------------------------------
+    # Clasificación
+    # ------------------------------------------------------------------
+    def categories(self, texto):
+        return self.compiled.categories(texto)
+
+    def classify_log_line(self, linea):
+        """Categorías de una línea de log en una pasada"""
+        categorias = self.categories(linea)
+        return {
+            'categories': categorias,
+            'is_critical': 'critical' in categorias,
+            'is_conflict': 'conflict' in categorias
+        }
+
+    def extract_confidence(self, texto):
+        """Confianza declarada en una respuesta IA o el valor por defecto según palabras clave"""
+        compiladas = self.compiled
+        defaults = compiladas.reglas['confidence_defaults']
+        if compiladas.confidence_re is not None:
+            match = compiladas.confidence_re.search(texto.lower())
+            if match:
+                return int(next(g for g in match.groups() if g is not None))
+        categorias = compiladas.categories(texto)
+        for categoria in ('urgent_response', 'likely_response'):
+            if categoria in categorias:
+                return defaults.get(categoria, defaults['default'])
+        return defaults['default']
+
+    def is_business_hours(self, now=None):
+        now = now or datetime.now()
+        inicio, fin = self.rules['business_hours']
+        return now.weekday() < 5 and inicio <= now.hour < fin
+
+    def classify_file(self, file_path, file_size=0, change_size=0, now=None):
+        """Decisión de sincronización para un cambio de archivo (tabla de decisión)"""
+        compiladas = self.compiled
+        reglas = compiladas.reglas
+        filename = os.path.basename(file_path).lower()
+        now = now or datetime.now()
+
+        categorias = compiladas.categories(filename)
+        is_business_hours = self.is_business_hours(now)
+        is_weekend = now.weekday() >= 5
+        hechos = {
+            'ignore': 'ignore' in categorias,
+            'critical': 'critical' in categorias,
+            'excel': bool(compiladas.excel_re and compiladas.excel_re.search(filename)),
+            'significant_change': abs(change_size) > reglas['urgent_size_mb'] * 1024 * 1024,
+            'business_hours': is_business_hours,
+            'weekend': is_weekend
+        }
+
+        fila = next((f for f in compiladas.decision_table
+                     if all(hechos.get(k, False) == v for k, v in f.get('when', {}).items())), None)
+        if fila is None:
+            fila = DEFAULT_RULES['decision_table'][-1]
+
+        action = fila.get('action', 'SYNC')
+        reason = fila.get('reason', '').format(change_mb=abs(change_size / 1024 / 1024))
+        if action != 'SYNC':
+            return {
+                'action': action,
+                'priority': fila.get('priority', 'NONE'),
+                'reason': reason,
+                'delay_seconds': fila.get('delay_seconds', 0),
+                'sync_immediately': False
+            }
+
+        delay = fila.get('delay_seconds', 60)
+        if not is_business_hours and 'delay_seconds_off_hours' in fila:
+            delay = fila['delay_seconds_off_hours']
+
+        # Ajustes por contexto temporal
+        if is_weekend:
+            delay *= reglas['weekend_delay_multiplier']
+            reason += ' (fin de semana - menor urgencia)'
+
+        minimo = reglas['off_hours_min_delay']
+        if not is_business_hours and delay < minimo:
+            delay = max(minimo, delay * 2)
+            reason += ' (fuera de horario laboral)'
+
+        return {
+            'action': 'SYNC',
+            'priority': fila.get('priority', 'MEDIUM'),
+            'reason': reason,
+            'delay_seconds': delay,
+            'sync_immediately': delay == 0,
+            'business_context': {
+                'is_business_hours': is_business_hours,
+                'is_weekend': is_weekend,
+                'has_critical_content': hechos['critical'],
+                'is_excel': hechos['excel']
+            }
+        }
+
+
+# Un motor por archivo de reglas y proceso
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_rule_engine(config_path=None):
+    """Motor compartido para `config_path` (Config.RULES_FILE por defecto)"""
+    clave = config_path or getattr(Config, 'RULES_FILE', None) or 'default'
+    with _engines_lock:
+        if clave not in _engines:
+            _engines[clave] = RuleEngine(config_path)
+        return _engines[clave]
@@ -0,0 +1,276 @@
+# backend/snapshot_copy.py - COPIA POR SNAPSHOT CONSISTENTE DE LIBROS ABIERTOS
+"""
+Copia de un archivo que puede estar abierto (Excel, OneDrive) sin escaleras
+de reintentos.
+
+1. Lectura compartida: el origen se abre solo para lectura y compartiendo
+   lectura/escritura/borrado (en Windows vía CreateFileW), así no choca con
+   Excel ni con OneDrive y no hace falta "probar" el bloqueo abriéndolo en
+   escritura.
+2. Snapshot: se copia a un temporal de staging con hash al vuelo, comparando
+   tamaño, mtime e identidad del archivo antes y después de la lectura.
+3. Validación: para .xlsx/.xlsm se lee el directorio central del ZIP y se
+   comprueba que cada parte apunte a una cabecera local válida (un guardado
+   a medio terminar no tiene directorio central al final); .xls verifica la
+   firma OLE.
+4. Solo si el snapshot es consistente se publica con os.replace. Si el
+   destino está bloqueado, se reintenta la publicación en cuanto se libera
+   (backoff + eventos de FileReadinessWaiter) dentro de un plazo máximo.
+
+Si el snapshot sale inconsistente se espera a que el origen quede quieto
+(sin escrituras durante SNAPSHOT_QUIETUD segundos) y se toma otro.
+"""
+
+import os
+import time
+import zipfile
+import hashlib
+
+try:
+    from config import Config
+    from copia_segura import ruta_temporal
+    from file_readiness import FileReadinessWaiter
+    from metrics import COPY_SECONDS, COPY_THROUGHPUT, COPY_RETRIES
+except ImportError:
+    from backend.config import Config
+    from backend.copia_segura import ruta_temporal
+    from backend.file_readiness import FileReadinessWaiter
+    from backend.metrics import COPY_SECONDS, COPY_THROUGHPUT, COPY_RETRIES
+
+EXTENSIONES_ZIP = ('.xlsx', '.xlsm', '.xlsb', '.xltx', '.xltm')
+FIRMA_OLE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_FIRMA_CABECERA_LOCAL = b'PK\x03\x04'
+
+
+def abrir_lectura_compartida(ruta):
+    """Abre `ruta` para lectura binaria sin negar acceso a otros procesos"""
+    if os.name == 'nt':
+        import ctypes
+        import msvcrt
+        from ctypes import wintypes
+
+        GENERIC_READ = 0x80000000
+        FILE_SHARE_READ_WRITE_DELETE = 0x00000007
+        OPEN_EXISTING = 3
+        FILE_FLAG_SEQUENTIAL_SCAN = 0x08000000
+
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        kernel32.CreateFileW.argtypes = (wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                         wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE)
+        handle = kernel32.CreateFileW(os.fspath(ruta), GENERIC_READ, FILE_SHARE_READ_WRITE_DELETE, None,
+                                      OPEN_EXISTING, FILE_FLAG_SEQUENTIAL_SCAN, None)
+        if handle in (None, wintypes.HANDLE(-1).value):
+            raise ctypes.WinError(ctypes.get_last_error())
+        fd = msvcrt.open_osfhandle(handle, os.O_RDONLY | os.O_BINARY)
+        return os.fdopen(fd, 'rb', buffering=0)
+    return open(ruta, 'rb', buffering=0)
+
+
+def _firma_stat(st):
+    return (st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino)
+
+
+def validar_libro(ruta, extension=None):
+    """
+    Valida la estructura de un libro Excel sin leerlo entero.
+    Devuelve (ok, mensaje). Formatos desconocidos se aceptan.
+    """
+    extension = (extension or os.path.splitext(ruta)[1]).lower()
+    try:
+        if extension in EXTENSIONES_ZIP:
+            with open(ruta, 'rb') as f, zipfile.ZipFile(f) as libro:
+                partes = libro.infolist()
+                if not partes:
+                    return False, "ZIP sin partes"
+                if extension != '.xlsb' and '[Content_Types].xml' not in libro.NameToInfo:
+                    return False, "Falta [Content_Types].xml"
+                tamano = os.fstat(f.fileno()).st_size
+                for parte in partes:
+                    if parte.header_offset + 30 + parte.compress_size > tamano:
+                        return False, f"Parte truncada: {parte.filename}"
+                    f.seek(parte.header_offset)
+                    if f.read(4) != _FIRMA_CABECERA_LOCAL:
+                        return False, f"Cabecera local inválida: {parte.filename}"
+            return True, f"ZIP válido ({len(partes)} partes)"
+        if extension == '.xls':
+            with open(ruta, 'rb') as f:
+                if f.read(8) != FIRMA_OLE:
+                    return False, "Firma OLE inválida"
+            return True, "OLE válido"
+    except zipfile.BadZipFile as e:
+        return False, f"Directorio central ZIP inválido: {e}"
+    except OSError as e:
+        return False, f"No se pudo validar: {e}"
+    return True, "Formato sin validación estructural"
+
+
+def tomar_snapshot(origen, staging, algoritmo="md5", tamano_buffer=None):
+    """
+    Un intento: copia origen -> staging y comprueba que el snapshot sea
+    consistente. No publica nada. El staging queda en disco solo si es
+    consistente.
+    """
+    tamano_buffer = tamano_buffer or getattr(Config, 'TAMANO_BUFFER_COPIA', 1024 * 1024)
+    digest = hashlib.new(algoritmo)
+    buffer = bytearray(tamano_buffer)
+    vista = memoryview(buffer)
+    escritos = 0
+    cabecera = b''
+
+    try:
+        antes_ruta = os.stat(origen)
+        with abrir_lectura_compartida(origen) as entrada, open(staging, 'wb') as salida:
+            antes = os.fstat(entrada.fileno())
+            while True:
+                leidos = entrada.readinto(buffer)
+                if not leidos:
+                    break
+                trozo = vista[:leidos]
+                if not cabecera:
+                    cabecera = bytes(trozo[:8])
+                digest.update(trozo)
+                salida.write(trozo)
+                escritos += leidos
+            salida.flush()
+            os.fsync(salida.fileno())
+            despues = os.fstat(entrada.fileno())
+        despues_ruta = os.stat(origen)
+
+        # Mismo contenido leído de principio a fin y el nombre sigue apuntando
+        # al mismo archivo (Excel guarda escribiendo otro y renombrando)
+        estable = (_firma_stat(antes) == _firma_stat(despues)
+                   == _firma_stat(antes_ruta) == _firma_stat(despues_ruta)
+                   and antes.st_size == escritos)
+        if estable:
+            formato_valido, motivo = validar_libro(staging, os.path.splitext(origen)[1])
+        else:
+            formato_valido, motivo = False, "El origen cambió mientras se leía"
+    except Exception:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+    consistente = estable and formato_valido
+    if consistente:
+        os.utime(staging, ns=(antes.st_atime_ns, antes.st_mtime_ns))
+    elif os.path.exists(staging):
+        os.remove(staging)
+
+    return {
+        'hash': digest.hexdigest(),
+        'algoritmo': algoritmo,
+        'tamano': escritos,
+        'cabecera': cabecera,
+        'mtime_origen': antes.st_mtime,
+        'stat_origen': antes,
+        'origen_estable': estable,
+        'formato_valido': formato_valido,
+        'consistente': consistente,
+        'motivo': motivo,
+        'staging': staging
+    }
+
+
+def _origen_quieto(origen, quietud):
+    return time.time() - os.stat(origen).st_mtime >= quietud
+
+
+def capturar_snapshot(origen, staging, plazo=None, max_intentos=None, waiter=None, algoritmo="md5"):
+    """
+    Toma snapshots hasta obtener uno consistente, esperando entre intentos a
+    que el origen quede quieto. Devuelve el dict del último intento más
+    'snapshots' (intentos) y 'espera_s'.
+    """
+    plazo = getattr(Config, 'SNAPSHOT_PLAZO', 20) if plazo is None else plazo
+    max_intentos = max_intentos or getattr(Config, 'SNAPSHOT_MAX_INTENTOS', 5)
+    quietud = getattr(Config, 'SNAPSHOT_QUIETUD', 1.0)
+    waiter = waiter or FileReadinessWaiter()
+    inicio = time.monotonic()
+    espera = 0.0
+    resultado = None
+
+    for intento in range(1, max_intentos + 1):
+        try:
+            resultado = tomar_snapshot(origen, staging, algoritmo)
+        except FileNotFoundError:
+            raise
+        except PermissionError as e:
+            # Apertura exclusiva durante el guardado: se espera y se repite
+            resultado = {'consistente': False, 'origen_estable': False, 'formato_valido': False,
+                         'hash': None, 'tamano': 0, 'cabecera': b'', 'algoritmo': algoritmo,
+                         'motivo': f"Origen sin acceso de lectura: {e}", 'staging': staging}
+        resultado['snapshots'] = intento
+
+        restante = plazo - (time.monotonic() - inicio)
+        if resultado['consistente'] or intento == max_intentos or restante <= 0:
+            break
+        t0 = time.monotonic()
+        waiter.wait_for(lambda: _origen_quieto(origen, quietud), deadline=restante, technique='snapshot_origen')
+        espera += time.monotonic() - t0
+
+    resultado['espera_s'] = round(espera, 3)
+    return resultado
+
+
+def publicar_con_espera(publicar, plazo=None, waiter=None):
+    """
+    Ejecuta `publicar()`; si el destino está bloqueado (PermissionError) lo
+    reintenta en cuanto se libera, hasta `plazo` segundos.
+    Devuelve (resultado de publicar | None, motivo del fallo | None).
+    """
+    plazo = getattr(Config, 'SNAPSHOT_PLAZO', 20) if plazo is None else plazo
+    estado = {'resultado': None, 'error': None}
+
+    def _intentar():
+        try:
+            estado['resultado'] = publicar()
+            return True
+        except PermissionError as e:
+            estado['error'] = e
+            COPY_RETRIES.inc(reason='destino_bloqueado')
+            return False
+
+    if _intentar():
+        return estado['resultado'], None
+    waiter = waiter or FileReadinessWaiter()
+    if waiter.wait_for(_intentar, deadline=plazo, technique='snapshot_destino'):
+        return estado['resultado'], None
+    return None, f"Destino bloqueado: {estado['error']}"
+
+
+def copiar_snapshot(origen, destino, plazo=None, max_intentos=None, waiter=None, algoritmo="md5"):
+    """
+    Copia origen -> destino solo a partir de un snapshot consistente.
+
+    Devuelve el dict de copiar_con_hash (hash, tamano, cabecera, ...) más:
+      publicado   True si el destino quedó reemplazado
+      motivo      por qué no se publicó (o el resultado de la validación)
+      snapshots   lecturas del origen realizadas
+      stat_origen os.stat del origen tomado antes de leerlo (para record_sync)
+    """
+    inicio = time.perf_counter()
+    staging = ruta_temporal(destino, "snapshot")
+    resultado = capturar_snapshot(origen, staging, plazo, max_intentos, waiter, algoritmo)
+    resultado['publicado'] = False
+    if resultado['snapshots'] > 1:
+        COPY_RETRIES.inc(resultado['snapshots'] - 1, reason='snapshot_inconsistente')
+    if not resultado['consistente']:
+        COPY_SECONDS.observe(time.perf_counter() - inicio, result='inconsistente')
+        return resultado
+
+    try:
+        _, motivo = publicar_con_espera(lambda: os.replace(staging, destino), plazo, waiter)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    duracion = time.perf_counter() - inicio
+    if motivo:
+        resultado['motivo'] = motivo
+        COPY_SECONDS.observe(duracion, result='destino_bloqueado')
+    else:
+        resultado['publicado'] = True
+        COPY_SECONDS.observe(duracion, result='ok')
+        if duracion > 0:
+            COPY_THROUGHPUT.observe(resultado['tamano'] / 1024 / 1024 / duracion)
+    return resultado
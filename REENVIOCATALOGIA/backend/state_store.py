@@ -0,0 +1,133 @@
+# backend/state_store.py - ESTADO PERSISTENTE DE SINCRONIZACIÓN (SQLITE WAL)
+"""
+Almacén embebido del estado de sincronización.
+
+Guarda por ruta el tamaño, mtime, digest, última sincronización y resultado,
+además de los contadores de los sistemas. Así un reinicio de app.py o
+start_ai_system_definitivo.py no arranca en frío: un archivo cuyo
+tamaño/mtime no cambió desde la última sincronización exitosa se omite sin
+volver a leerlo.
+
+SQLite en modo WAL: lectores y escritor no se bloquean entre sí y cada
+commit es un append al WAL (no reescribe la base completa).
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from config import Config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archivos (
+    ruta        TEXT PRIMARY KEY,
+    tamano      INTEGER,
+    mtime       REAL,
+    digest      TEXT,
+    algoritmo   TEXT,
+    ultima_sync TEXT,
+    resultado   TEXT,
+    mensaje     TEXT
+);
+CREATE TABLE IF NOT EXISTS contadores (
+    nombre TEXT PRIMARY KEY,
+    valor  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _clave(ruta):
+    return os.path.normcase(os.path.abspath(ruta))
+
+
+class SyncStateStore:
+    """Estado por ruta y contadores en una base SQLite"""
+
+    def __init__(self, ruta_db=None):
+        self.ruta_db = ruta_db or getattr(Config, 'STATE_DB', None) or \
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync_state.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta_db, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # ------------------------------------------------------------------
+    # Estado por archivo
+    # ------------------------------------------------------------------
+    def get_file(self, ruta):
+        filas = self._execute("SELECT * FROM archivos WHERE ruta = ?", (_clave(ruta),))
+        return dict(filas[0]) if filas else None
+
+    def record_sync(self, ruta, digest=None, resultado='ok', mensaje='', algoritmo='md5', stat=None):
+        """Registra el estado de `ruta` tras una sincronización (stat actual si no se pasa)"""
+        try:
+            stat = stat or os.stat(ruta)
+            tamano, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            tamano, mtime = None, None
+        self._execute(
+            "INSERT OR REPLACE INTO archivos "
+            "(ruta, tamano, mtime, digest, algoritmo, ultima_sync, resultado, mensaje) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (_clave(ruta), tamano, mtime, digest, algoritmo,
+             datetime.now().isoformat(timespec='seconds'), resultado, mensaje)
+        )
+
+    def matches(self, ruta):
+        """True si `ruta` tiene el mismo tamaño/mtime que en la última sincronización OK"""
+        estado = self.get_file(ruta)
+        if not estado or estado['resultado'] != 'ok':
+            return False
+        try:
+            stat = os.stat(ruta)
+        except OSError:
+            return False
+        return stat.st_size == estado['tamano'] and stat.st_mtime == estado['mtime']
+
+    def is_unchanged(self, origen, destino):
+        """Origen y destino intactos desde la última sincronización exitosa (solo stat)"""
+        if not (self.matches(origen) and self.matches(destino)):
+            return False
+        return self.get_file(origen)['digest'] == self.get_file(destino)['digest']
+
+    # ------------------------------------------------------------------
+    # Contadores
+    # ------------------------------------------------------------------
+    def incr(self, nombre, n=1):
+        self._execute(
+            "INSERT INTO contadores (nombre, valor) VALUES (?, ?) "
+            "ON CONFLICT(nombre) DO UPDATE SET valor = valor + excluded.valor",
+            (nombre, n)
+        )
+
+    def get_counters(self, prefijo=''):
+        """Contadores cuyo nombre empieza por `prefijo` (sin el prefijo)"""
+        filas = self._execute(
+            "SELECT nombre, valor FROM contadores WHERE substr(nombre, 1, ?) = ?",
+            (len(prefijo), prefijo)
+        )
+        return {fila['nombre'][len(prefijo):]: fila['valor'] for fila in filas}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Instancia compartida por proceso
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_state_store(ruta_db=None):
+    """Almacén compartido (una conexión por base y proceso)"""
+    with _stores_lock:
+        clave = ruta_db or 'default'
+        if clave not in _stores:
+            _stores[clave] = SyncStateStore(ruta_db)
+        return _stores[clave]
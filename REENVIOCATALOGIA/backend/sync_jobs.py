@@ -0,0 +1,329 @@
+# backend/sync_jobs.py - REGISTRO DE TRABAJOS Y SINCRONIZACIÓN EN PARALELO
+"""
+Registro de trabajos de sincronización (origen -> varios destinos) y pool de
+workers acotado que los ejecuta en paralelo.
+
+- Un lock por ruta de origen: el mismo archivo nunca se sincroniza dos veces
+  a la vez. Si llega otro pedido mientras copia, se marca una repetición y el
+  worker en curso vuelve a copiar al terminar (no se bloquea otro worker).
+  El pedido agrupado recibe un future con el resultado real de esa
+  repetición (el primero tal cual; los demás, la misma copia marcada
+  'coalesced' para no contar dos veces una sola copia).
+- Un lock por ruta de destino: dos trabajos que escriben el mismo destino
+  no se pisan.
+- Un semáforo por carpeta destino: limita las copias simultáneas hacia un
+  mismo recurso compartido de OneDrive.
+- Con `fanout_fn`, un trabajo con varios destinos lee el origen una sola vez
+  y escribe todos los destinos en paralelo (ver fanout.py).
+
+Config.SYNC_JOBS acepta una lista de dicts:
+    {'name': 'catalogo_ivd', 'source': r'...\\Catalogo.xlsx',
+     'destinations': [r'...\\Catalogo.xlsx', ...],
+     'rules': {'priority': 'HIGH', 'delay_seconds': 10, 'enabled': True}}
+Si está vacía se usa el par clásico RUTA_ORIGEN / RUTA_DESTINO.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import Config
+from event_bus import publish as publish_event
+
+
+def _norm(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class SyncJob:
+    """Un archivo origen y los destinos donde debe replicarse"""
+
+    def __init__(self, name, source, destinations, rules=None):
+        self.name = name
+        self.source = source
+        self.destinations = list(destinations)
+        self.rules = rules or {}
+
+    @property
+    def enabled(self):
+        return self.rules.get('enabled', True)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'source': self.source,
+            'destinations': self.destinations,
+            'rules': self.rules
+        }
+
+
+class SyncJobRegistry:
+    """Trabajos registrados, indexados por ruta de origen"""
+
+    def __init__(self, jobs=None):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_source = {}
+        for job in jobs or []:
+            self.register(job)
+
+    @classmethod
+    def from_config(cls):
+        definiciones = getattr(Config, 'SYNC_JOBS', None) or []
+        jobs = []
+        for i, d in enumerate(definiciones):
+            destinos = d.get('destinations') or [d['destination']]
+            jobs.append(SyncJob(d.get('name') or f"job_{i + 1}", d['source'], destinos, d.get('rules')))
+        if not jobs:
+            jobs.append(SyncJob(
+                os.path.splitext(os.path.basename(Config.RUTA_ORIGEN))[0],
+                Config.RUTA_ORIGEN,
+                [Config.RUTA_DESTINO]
+            ))
+        return cls(jobs)
+
+    def register(self, job):
+        with self._lock:
+            if job.name in self._jobs:
+                raise ValueError(f"Trabajo duplicado: {job.name}")
+            self._jobs[job.name] = job
+            self._by_source.setdefault(_norm(job.source), []).append(job)
+
+    def unregister(self, name):
+        with self._lock:
+            job = self._jobs.pop(name, None)
+            if job:
+                self._by_source[_norm(job.source)].remove(job)
+            return job
+
+    def get(self, name):
+        return self._jobs.get(name)
+
+    def find_by_source(self, path):
+        """Trabajos activos cuyo origen es `path`"""
+        return [job for job in self._by_source.get(_norm(path), []) if job.enabled]
+
+    def all(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.enabled]
+
+    def watch_dirs(self):
+        """Carpetas que hay que observar (una por cada origen distinto)"""
+        return sorted({os.path.dirname(job.source) for job in self.all()})
+
+
+class ParallelSyncManager:
+    """Pool acotado que sincroniza trabajos independientes en paralelo"""
+
+    def __init__(self, sync_fn, max_workers=None, per_destination_limit=None, fanout_fn=None):
+        """
+        sync_fn(origen, destino) -> (success, message), p.ej.
+        PragmaticSyncManager.sync_file_pragmatic
+        fanout_fn(origen, destinos, guard) -> [{'destination', 'success', 'message'}, ...]
+        para trabajos con varios destinos, p.ej. PragmaticSyncManager.sync_file_fanout
+        """
+        self.sync_fn = sync_fn
+        self.fanout_fn = fanout_fn
+        self.max_workers = max_workers or getattr(Config, 'MAX_WORKERS_SYNC', 4)
+        self.per_destination_limit = per_destination_limit or getattr(Config, 'MAX_CONCURRENCIA_DESTINO', 2)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync')
+
+        self._registry_lock = threading.Lock()
+        self._path_locks = {}
+        self._dest_semaphores = {}
+        self._rerun = {}  # origen -> {nombre: (trabajo, [futures que esperan la repetición])}
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'runs': 0,
+            'reruns_coalesced': 0,
+            'destinations_ok': 0,
+            'destinations_failed': 0,
+            'fanout_runs': 0,
+            'in_flight': 0
+        }
+
+    # ------------------------------------------------------------------
+    # Locks y semáforos
+    # ------------------------------------------------------------------
+    def _path_lock(self, path):
+        with self._registry_lock:
+            return self._path_locks.setdefault(_norm(path), threading.Lock())
+
+    def _dest_semaphore(self, destino):
+        share = _norm(os.path.dirname(destino))
+        with self._registry_lock:
+            if share not in self._dest_semaphores:
+                self._dest_semaphores[share] = threading.BoundedSemaphore(self.per_destination_limit)
+            return self._dest_semaphores[share]
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+    def submit(self, job, on_done=None):
+        """
+        Encola el trabajo en el pool; on_done(job, result) al terminar. Si el
+        origen ya se está copiando no ocupa un worker: devuelve el future de
+        la repetición que hará el worker en curso.
+        """
+        self._count('submitted')
+        future = self._coalesce(job, only_if_busy=True)
+        if future is None:
+            future = self.executor.submit(self.run_job, job)
+        if on_done:
+            future.add_done_callback(lambda f: on_done(job, f.result() if not f.exception() else {
+                'success': False, 'job': job.name, 'message': str(f.exception()), 'results': []
+            }))
+        return future
+
+    def _coalesce(self, job, only_if_busy=False):
+        """
+        Toma el lock del origen (devuelve None) o, si otro worker lo tiene,
+        agenda una repetición y devuelve el future con su resultado. Con
+        `only_if_busy` no toma el lock: None si el origen está libre.
+        """
+        source_lock = self._path_lock(job.source)
+        with self._registry_lock:
+            if only_if_busy:
+                if not source_lock.locked():
+                    return None
+            elif source_lock.acquire(blocking=False):
+                return None
+            # Ya hay un worker copiando este archivo: que repita al terminar
+            future = Future()
+            _, waiters = self._rerun.setdefault(_norm(job.source), {}).get(job.name, (job, []))
+            waiters.append(future)
+            self._rerun[_norm(job.source)][job.name] = (job, waiters)
+        self._count('reruns_coalesced')
+        return future
+
+    @staticmethod
+    def _deliver(waiters, result=None, error=None):
+        for n, waiter in enumerate(waiters):
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result if n == 0 else dict(result, coalesced=True))
+
+    def run_job(self, job):
+        """
+        Sincroniza `job` en todos sus destinos (bloquea el origen mientras
+        tanto) y devuelve su resultado. Si el origen ya se está copiando,
+        espera y devuelve el resultado de la repetición.
+        """
+        waiting = self._coalesce(job)
+        if waiting is not None:
+            return waiting.result()
+
+        source_lock = self._path_lock(job.source)
+        key = _norm(job.source)
+        self._count('in_flight')
+        released = False
+        pending = [(job, [])]
+        own_result = None
+        try:
+            while True:
+                for pending_job, waiters in pending:
+                    try:
+                        result = self._run_destinations(pending_job)
+                    except Exception as e:
+                        self._deliver(waiters, error=e)
+                        raise
+                    self._deliver(waiters, result)
+                    if own_result is None:
+                        own_result = result
+                pending = []
+                # Revisar repeticiones y soltar el lock de forma atómica
+                with self._registry_lock:
+                    rerun = self._rerun.pop(key, None)
+                    if not rerun:
+                        source_lock.release()
+                        released = True
+                        return own_result
+                pending = list(rerun.values())
+                Config.log_event(f"[{job.name}] Cambios durante la copia, repitiendo sincronización")
+        finally:
+            self._count('in_flight', -1)
+            if not released:
+                # Error: nadie repetirá lo agendado, se avisa a quienes esperan
+                with self._registry_lock:
+                    abandoned = list(self._rerun.pop(key, {}).values())
+                    source_lock.release()
+                error = RuntimeError(f"[{job.name}] La sincronización en curso falló, repetición cancelada")
+                for _, waiters in pending + abandoned:
+                    self._deliver([w for w in waiters if not w.done()], error=error)
+
+    @contextmanager
+    def _destination_guard(self, destino):
+        """Semáforo de la carpeta y lock del destino mientras se escribe"""
+        with self._dest_semaphore(destino), self._path_lock(destino):
+            yield
+
+    def _run_destinations(self, job):
+        self._count('runs')
+        start = time.time()
+
+        if self.fanout_fn and len(job.destinations) > 1:
+            results = self._run_fanout(job)
+            for r in results:
+                self._destination_done(job, r)
+        else:
+            results = []
+            for destino in job.destinations:
+                with self._destination_guard(destino):
+                    publish_event('copying', job=job.name, source=job.source, destination=destino)
+                    try:
+                        success, message = self.sync_fn(job.source, destino)
+                    except Exception as e:
+                        success, message = False, f"Error crítico: {e}"
+                results.append({'destination': destino, 'success': success, 'message': message})
+                self._destination_done(job, results[-1])
+
+        ok = sum(1 for r in results if r['success'])
+        return {
+            'success': ok == len(results),
+            'job': job.name,
+            'coalesced': False,
+            'duration': round(time.time() - start, 3),
+            'message': f"{ok}/{len(results)} destinos sincronizados",
+            'results': results
+        }
+
+    def _destination_done(self, job, result):
+        self._count('destinations_ok' if result['success'] else 'destinations_failed')
+        publish_event('verified' if result['success'] else 'failed', job=job.name,
+                      source=job.source, destination=result['destination'], message=result['message'])
+
+    def _run_fanout(self, job):
+        """Una lectura del origen para todos los destinos del trabajo"""
+        self._count('fanout_runs')
+        for destino in job.destinations:
+            publish_event('copying', job=job.name, source=job.source, destination=destino)
+        try:
+            results = self.fanout_fn(job.source, job.destinations, self._destination_guard)
+        except Exception as e:
+            return [{'destination': d, 'success': False, 'message': f"Error crítico: {e}"}
+                    for d in job.destinations]
+        return [{'destination': r['destination'], 'success': r['success'], 'message': r['message']}
+                for r in results]
+
+    def run_all(self, jobs):
+        """Ejecuta varios trabajos en paralelo y espera sus resultados"""
+        futures = [self.submit(job) for job in jobs]
+        return [f.result() for f in futures]
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = self.stats.copy()
+        stats['max_workers'] = self.max_workers
+        stats['per_destination_limit'] = self.per_destination_limit
+        return stats
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
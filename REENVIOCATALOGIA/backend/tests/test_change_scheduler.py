@@ -0,0 +1,72 @@
+# backend/tests/test_change_scheduler.py - DEBOUNCE, AGRUPACIÓN Y PRIORIDADES DE LA COLA DE CAMBIOS
+import sys
+import time
+import unittest
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir))
+
+from change_scheduler import CoalescingScheduler
+
+
+class CoalescingSchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = CoalescingScheduler(debounce_seconds=0.1)
+        self.addCleanup(self.scheduler.close)
+
+    def test_burst_becomes_one_job_after_the_last_event(self):
+        inicio = time.monotonic()
+        for n in range(5):
+            self.scheduler.schedule('libro', {'n': n})
+            time.sleep(0.03)
+        self.assertIsNone(self.scheduler.pop_due(timeout=0.01))
+
+        job = self.scheduler.pop_due(timeout=2)
+        self.assertEqual(job.payload, {'n': 4})
+        self.assertEqual(job.coalesced, 4)
+        # Vence una ventana de debounce después del último evento, no del primero
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.2)
+        self.assertIsNone(self.scheduler.pop_due(timeout=0.2))
+
+    def test_delay_is_respected_and_never_shortened_below_debounce(self):
+        self.scheduler.schedule('libro', 'x', delay_seconds=0.4)
+        self.assertIsNone(self.scheduler.pop_due(timeout=0.25))
+        self.assertIsNotNone(self.scheduler.pop_due(timeout=1))
+
+    def test_due_jobs_leave_by_priority(self):
+        self.scheduler.schedule('bajo', 'b', priority='LOW')
+        self.scheduler.schedule('medio', 'm', priority='MEDIUM')
+        self.scheduler.schedule('critico', 'c', priority='CRITICAL')
+        time.sleep(0.2)
+        orden = [self.scheduler.pop_due(timeout=1).key for _ in range(3)]
+        self.assertEqual(orden, ['critico', 'medio', 'bajo'])
+
+    def test_coalescing_keeps_the_most_urgent_priority_and_merges(self):
+        self.scheduler.schedule('libro', ['a'], priority='LOW')
+        self.scheduler.schedule('libro', ['b'], priority='HIGH', merge=lambda viejo, nuevo: viejo + nuevo)
+        self.scheduler.schedule('libro', ['c'], priority='MEDIUM', merge=lambda viejo, nuevo: viejo + nuevo)
+        job = self.scheduler.pop_due(timeout=2)
+        self.assertEqual((job.priority, job.payload), ('HIGH', ['a', 'b', 'c']))
+
+    def test_cancel_and_drain(self):
+        self.scheduler.schedule('uno', 1, delay_seconds=60, priority='LOW')
+        self.scheduler.schedule('dos', 2, delay_seconds=60, priority='HIGH')
+        self.scheduler.schedule('tres', 3, delay_seconds=60)
+        self.assertTrue(self.scheduler.cancel('tres'))
+        self.assertFalse(self.scheduler.cancel('tres'))
+
+        self.assertEqual([job.key for job in self.scheduler.drain()], ['dos', 'uno'])
+        self.assertEqual(self.scheduler.pending_count(), 0)
+        self.assertEqual(self.scheduler.get_stats()['cancelled'], 1)
+
+    def test_close_wakes_the_consumer(self):
+        self.scheduler.close()
+        inicio = time.monotonic()
+        self.assertIsNone(self.scheduler.pop_due(timeout=5))
+        self.assertLess(time.monotonic() - inicio, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# backend/tests/test_sync_jobs.py - REPETICIONES AGRUPADAS Y LÍMITES DEL POOL DE SINCRONIZACIÓN
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir))
+
+from config import Config
+
+Config.LOG_FILE = os.path.join(tempfile.mkdtemp(prefix='sync_jobs_'), 'log.txt')
+Config.LOG_EN_CONSOLA = False
+
+from sync_jobs import ParallelSyncManager, SyncJob
+
+
+class _CopiaControlada:
+    """sync_fn falso: cada copia avisa que empezó y espera a que el test la libere"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.llamadas = 0
+        self.activas = 0
+        self.max_activas = 0
+        self.empezadas = threading.Semaphore(0)
+        self.liberar = threading.Event()
+
+    def __call__(self, origen, destino):
+        with self._lock:
+            self.llamadas += 1
+            numero = self.llamadas
+            self.activas += 1
+            self.max_activas = max(self.max_activas, self.activas)
+        self.empezadas.release()
+        try:
+            self.liberar.wait(5)
+            time.sleep(0.02)
+        finally:
+            with self._lock:
+                self.activas -= 1
+        return True, f"copia #{numero}"
+
+    def esperar_inicio(self, n=1):
+        for _ in range(n):
+            if not self.empezadas.acquire(timeout=5):
+                raise AssertionError("la copia no empezó")
+
+
+class ParallelSyncManagerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.copia = _CopiaControlada()
+        self.addCleanup(self.copia.liberar.set)
+        self.manager = ParallelSyncManager(self.copia, max_workers=6, per_destination_limit=2)
+        self.addCleanup(self.manager.shutdown)
+        self.job = SyncJob('catalogo', '/origen/Catalogo.xlsx', ['/destino/Catalogo.xlsx'])
+
+    def test_submit_during_copy_gets_the_rerun_result(self):
+        primero = self.manager.submit(self.job)
+        self.copia.esperar_inicio()
+        segundo = self.manager.submit(self.job)
+
+        self.copia.liberar.set()
+        self.assertEqual(primero.result(timeout=5)['message'], '1/1 destinos sincronizados')
+        resultado = segundo.result(timeout=5)
+        self.assertEqual(resultado['results'][0]['message'], 'copia #2')
+        self.assertFalse(resultado['coalesced'])
+        self.assertEqual(self.copia.llamadas, 2)
+
+    def test_coalesced_submits_share_one_rerun(self):
+        primero = self.manager.submit(self.job)
+        self.copia.esperar_inicio()
+        agrupados = [self.manager.submit(self.job) for _ in range(4)]
+
+        self.copia.liberar.set()
+        primero.result(timeout=5)
+        resultados = [future.result(timeout=5) for future in agrupados]
+        self.assertEqual(self.copia.llamadas, 2)
+        self.assertEqual([r['coalesced'] for r in resultados], [False, True, True, True])
+        self.assertEqual({r['results'][0]['message'] for r in resultados}, {'copia #2'})
+        self.assertEqual(self.manager.get_stats()['reruns_coalesced'], 4)
+
+    def test_failed_rerun_fails_every_waiter(self):
+        primero = self.manager.submit(self.job)
+        self.copia.esperar_inicio()
+        agrupados = [self.manager.submit(self.job) for _ in range(3)]
+
+        def falla(job):
+            raise OSError("destino desconectado")
+
+        original = self.manager._run_destinations
+        self.manager._run_destinations = falla
+        self.copia.liberar.set()
+
+        with self.assertRaises(OSError):
+            primero.result(timeout=5)
+        for future in agrupados:
+            with self.assertRaises(OSError):
+                future.result(timeout=5)
+
+        # El origen quedó libre: el siguiente pedido copia normalmente
+        self.manager._run_destinations = original
+        self.assertTrue(self.manager.submit(self.job).result(timeout=5)['success'])
+
+    def test_destination_semaphore_caps_concurrency(self):
+        jobs = [SyncJob(f"job_{n}", f"/origen/Libro{n}.xlsx", [f"/destino/Libro{n}.xlsx"]) for n in range(5)]
+        futures = [self.manager.submit(job) for job in jobs]
+        self.copia.esperar_inicio(2)
+        time.sleep(0.2)
+        # Seis workers libres, pero solo dos copias hacia la misma carpeta
+        self.assertEqual(self.copia.activas, 2)
+
+        self.copia.liberar.set()
+        self.assertTrue(all(future.result(timeout=5)['success'] for future in futures))
+        self.assertEqual(self.copia.max_activas, 2)
+        self.assertEqual(self.manager.get_stats()['destinations_ok'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
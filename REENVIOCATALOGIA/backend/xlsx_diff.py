@@ -0,0 +1,395 @@
+# backend/xlsx_diff.py - DIFERENCIA ESTRUCTURAL ENTRE DOS VERSIONES DE UN LIBRO XLSX
+"""
+Compara dos .xlsx sin cargarlos en openpyxl:
+
+1. Directorio central del ZIP: CRC-32 y tamaño de cada parte. Las partes
+   idénticas no se abren.
+2. Solo se abren las hojas cuyo XML cambió. Se separan por filas (<row r=>)
+   y solo las filas con bytes distintos se analizan celda a celda por
+   referencia (A1, B7...). Si cambió sharedStrings.xml los índices se
+   resuelven (texto y formato de cada string) en todas las hojas que usan
+   strings compartidos, aunque su XML no haya cambiado; así un
+   reordenamiento de la tabla no cuenta como cambio y una edición de un
+   string sí. Hojas sin referencias se recorren con iterparse.
+3. Todo lo que una hoja tiene fuera de <sheetData> (celdas combinadas,
+   anchos de columna, formato condicional, validaciones...) es estructural,
+   salvo <sheetViews>.
+
+Resultado por hoja: celdas cambiadas/agregadas/eliminadas, cambios solo de
+formato y delta de bytes de la parte. `noop` indica un guardado sin cambios de
+contenido (solo metadatos en docProps/, calcChain o vista de hoja), que no
+hace falta sincronizar; `change_bytes` es el tamaño estimado del cambio real
+para el analizador de prioridad.
+"""
+
+import os
+import re
+import time
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+# Partes que cambian en cada guardado aunque el contenido sea el mismo
+PARTES_METADATOS = ('docProps/', 'xl/calcChain.xml')
+_PARTE_STRINGS = 'xl/sharedStrings.xml'
+_REF_RE = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _columna(letras):
+    numero = 0
+    for letra in letras:
+        numero = numero * 26 + ord(letra) - 64
+    return numero
+
+
+def _es_metadato(parte):
+    return parte.startswith(PARTES_METADATOS)
+
+
+def _hojas_del_libro(libro):
+    """Parte XML -> nombre visible de la hoja (según workbook.xml y sus rels)"""
+    try:
+        rels = {}
+        for elem in ET.fromstring(libro.read('xl/_rels/workbook.xml.rels')):
+            destino = elem.get('Target', '')
+            destino = destino.lstrip('/') if destino.startswith('/') else posixpath.normpath(
+                posixpath.join('xl', destino))
+            rels[elem.get('Id')] = destino
+        hojas = {}
+        for elem in ET.fromstring(libro.read('xl/workbook.xml')).iter():
+            if _local(elem.tag) == 'sheet':
+                rid = next((v for k, v in elem.attrib.items() if _local(k) == 'id'), None)
+                if rid in rels:
+                    hojas[rels[rid]] = elem.get('name')
+        return hojas
+    except (KeyError, ET.ParseError):
+        return {}
+
+
+def _shared_strings(libro):
+    """
+    Texto de cada <si>. Los strings con formato (runs <r>, fonética) se
+    resuelven a su XML completo para que un cambio de formato no pase por
+    guardado sin cambios.
+    """
+    if _PARTE_STRINGS not in libro.NameToInfo:
+        return []
+    textos = []
+    with libro.open(_PARTE_STRINGS) as f:
+        for _, elem in ET.iterparse(f):
+            if _local(elem.tag) == 'si':
+                if all(_local(hijo.tag) == 't' for hijo in elem):
+                    textos.append(''.join(t.text or '' for t in elem))
+                else:
+                    textos.append(ET.tostring(elem, encoding='unicode'))
+                elem.clear()
+    return textos
+
+
+def _celdas(libro, parte, strings=None):
+    """
+    Recorre la hoja en streaming y produce ((fila, columna), contenido, estilo, bytes).
+    Con `strings` los valores de tipo "s" se resuelven a texto.
+    """
+    fila_actual = 0
+    columna_actual = 0
+    with libro.open(parte) as f:
+        for _, elem in ET.iterparse(f):
+            nombre = _local(elem.tag)
+            if nombre == 'row':
+                elem.clear()
+                continue
+            if nombre != 'c':
+                continue
+            ref = elem.get('r')
+            match = _REF_RE.match(ref) if ref else None
+            if match:
+                columna_actual, fila_actual = _columna(match.group(1)), int(match.group(2))
+            else:
+                columna_actual += 1
+            tipo = elem.get('t', 'n')
+            valor = formula = None
+            for hijo in elem:
+                local = _local(hijo.tag)
+                if local == 'v':
+                    valor = hijo.text
+                elif local == 'f':
+                    formula = hijo.text or hijo.get('ref') or ''
+                elif local == 'is':
+                    valor = ''.join(t.text or '' for t in hijo.iter() if _local(t.tag) == 't')
+            if tipo == 's' and strings is not None and valor is not None:
+                try:
+                    valor = strings[int(valor)]
+                    tipo = 'str'
+                except (ValueError, IndexError):
+                    pass
+            contenido = (tipo, valor, formula)
+            yield (fila_actual, columna_actual), contenido, elem.get('s'), len(valor or '') + len(formula or '')
+            elem.clear()
+
+
+class _Desordenado(Exception):
+    """Las celdas de la hoja no vienen en orden fila/columna"""
+
+
+def _ordenadas(celdas):
+    anterior = None
+    for celda in celdas:
+        if anterior is not None and celda[0] <= anterior:
+            raise _Desordenado()
+        anterior = celda[0]
+        yield celda
+
+
+def _comparar_celdas(viejas, nuevas, resultado):
+    """Merge de dos secuencias ordenadas por referencia"""
+    vieja = next(viejas, None)
+    nueva = next(nuevas, None)
+    while vieja is not None or nueva is not None:
+        if nueva is None or (vieja is not None and vieja[0] < nueva[0]):
+            resultado['removed_cells'] += 1
+            resultado['change_bytes'] += vieja[3]
+            vieja = next(viejas, None)
+        elif vieja is None or nueva[0] < vieja[0]:
+            resultado['added_cells'] += 1
+            resultado['change_bytes'] += nueva[3]
+            nueva = next(nuevas, None)
+        else:
+            if vieja[1] != nueva[1]:
+                resultado['changed_cells'] += 1
+                resultado['change_bytes'] += max(vieja[3], nueva[3])
+            elif vieja[2] != nueva[2]:
+                resultado['format_changes'] += 1
+            vieja = next(viejas, None)
+            nueva = next(nuevas, None)
+
+
+_ROW_RE = re.compile(rb'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_ROW_NUM_RE = re.compile(rb'\br="(\d+)"')
+_CELDA_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_ATRIB_RE = re.compile(rb'([\w:]+)="([^"]*)"')
+_V_RE = re.compile(rb'<v>(.*?)</v>', re.S)
+_F_RE = re.compile(rb'<f\b([^>]*?)(?:/>|>(.*?)</f>)', re.S)
+_T_RE = re.compile(rb'<t\b[^>]*>(.*?)</t>', re.S)
+_SHEET_DATA_RE = re.compile(rb'<(?:\w+:)?sheetData\b(?:[^>]*/>|.*?</(?:\w+:)?sheetData>)', re.S)
+_SHEET_VIEWS_RE = re.compile(rb'<(?:\w+:)?sheetViews\b(?:[^>]*/>|.*?</(?:\w+:)?sheetViews>)', re.S)
+_SPANS_RE = re.compile(rb'\s+spans="[^"]*"')
+
+
+def _fuera_de_datos(datos):
+    """XML de la hoja sin <sheetData> ni <sheetViews> (lo que es estructural)"""
+    return _SHEET_VIEWS_RE.sub(b'', _SHEET_DATA_RE.sub(b'', datos))
+
+
+def _filas(datos):
+    """
+    {número de fila: (atributos, bytes de la fila)}; None si alguna fila no
+    trae r="..." (spans se descarta: lo recalcula Excel)
+    """
+    filas = {}
+    for match in _ROW_RE.finditer(datos):
+        numero = _ROW_NUM_RE.search(match.group(1))
+        if numero is None:
+            return None
+        filas[int(numero.group(1))] = (_SPANS_RE.sub(b'', match.group(1)), match.group(2) or b'')
+    return filas
+
+
+def _celdas_fila(fila, strings=None):
+    """{columna: (contenido, estilo, bytes)} de una fila ya separada"""
+    celdas = {}
+    for match in _CELDA_RE.finditer(fila):
+        atributos = dict(_ATRIB_RE.findall(match.group(1)))
+        ref = _REF_RE.match(atributos.get(b'r', b'').decode('ascii', 'ignore'))
+        if ref is None:
+            return None
+        cuerpo = match.group(2) or b''
+        tipo = atributos.get(b't', b'n').decode('ascii', 'ignore')
+        valor = _V_RE.search(cuerpo)
+        valor = valor.group(1).decode('utf-8', 'replace') if valor else None
+        formula = _F_RE.search(cuerpo)
+        formula = (formula.group(2) or formula.group(1)).decode('utf-8', 'replace') if formula else None
+        if tipo == 'inlineStr':
+            valor = ''.join(t.decode('utf-8', 'replace') for t in _T_RE.findall(cuerpo))
+        if tipo == 's' and strings is not None and valor is not None:
+            try:
+                valor = strings[int(valor)]
+                tipo = 'str'
+            except (ValueError, IndexError):
+                pass
+        celdas[_columna(ref.group(1))] = ((tipo, valor, formula), atributos.get(b's'),
+                                          len(valor or '') + len(formula or ''))
+    return celdas
+
+
+def _diff_por_filas(datos_viejos, datos_nuevos, strings_viejos, strings_nuevos, resultado):
+    """
+    Compara fila a fila: las filas con los mismos bytes se saltean sin
+    analizar sus celdas (salvo que cambió sharedStrings y la fila usa
+    strings compartidos). Un cambio en los atributos de la fila (alto,
+    oculta, estilo) cuenta como cambio de formato. False si la hoja no se
+    puede tratar así.
+    """
+    filas_viejas = _filas(datos_viejos)
+    filas_nuevas = _filas(datos_nuevos)
+    if filas_viejas is None or filas_nuevas is None:
+        return False
+    resolver = strings_viejos is not None
+
+    for numero in sorted(filas_viejas.keys() | filas_nuevas.keys()):
+        atributos_viejos, vieja = filas_viejas.get(numero, (None, b''))
+        atributos_nuevos, nueva = filas_nuevas.get(numero, (None, b''))
+        if None not in (atributos_viejos, atributos_nuevos) and atributos_viejos != atributos_nuevos:
+            resultado['format_changes'] += 1
+        if vieja == nueva and not (resolver and b't="s"' in nueva):
+            continue
+        celdas_viejas = _celdas_fila(vieja, strings_viejos)
+        celdas_nuevas = _celdas_fila(nueva, strings_nuevos)
+        if celdas_viejas is None or celdas_nuevas is None:
+            return False
+        _comparar_celdas(iter(sorted(((numero, c), *v) for c, v in celdas_viejas.items())),
+                         iter(sorted(((numero, c), *v) for c, v in celdas_nuevas.items())),
+                         resultado)
+    return True
+
+
+def _diff_hoja(libro_viejo, libro_nuevo, parte, datos_viejos, datos_nuevos, strings_viejos, strings_nuevos):
+    resultado = {'changed_cells': 0, 'added_cells': 0, 'removed_cells': 0,
+                 'format_changes': 0, 'change_bytes': 0}
+    if _diff_por_filas(datos_viejos, datos_nuevos, strings_viejos, strings_nuevos, resultado):
+        return resultado
+
+    # Hoja sin referencias de fila/celda: recorrido completo en streaming
+    resultado = {clave: 0 for clave in resultado}
+    try:
+        _comparar_celdas(_ordenadas(_celdas(libro_viejo, parte, strings_viejos)),
+                         _ordenadas(_celdas(libro_nuevo, parte, strings_nuevos)), resultado)
+    except _Desordenado:
+        # Hoja escrita fuera de orden (no la genera Excel): comparación en memoria
+        resultado = {clave: 0 for clave in resultado}
+        viejas = sorted(_celdas(libro_viejo, parte, strings_viejos), key=lambda celda: celda[0])
+        nuevas = sorted(_celdas(libro_nuevo, parte, strings_nuevos), key=lambda celda: celda[0])
+        _comparar_celdas(iter(viejas), iter(nuevas), resultado)
+    return resultado
+
+
+def diff_workbooks(nuevo, anterior):
+    """
+    Diferencia entre dos versiones de un .xlsx (rutas o archivos abiertos).
+    Lanza zipfile.BadZipFile / OSError si alguno no se puede leer.
+    """
+    inicio = time.perf_counter()
+    with zipfile.ZipFile(anterior) as viejo, zipfile.ZipFile(nuevo) as actual:
+        partes_viejas = {i.filename: i for i in viejo.infolist()}
+        partes_nuevas = {i.filename: i for i in actual.infolist()}
+
+        cambiadas = sorted(
+            nombre for nombre in partes_viejas.keys() & partes_nuevas.keys()
+            if (partes_viejas[nombre].CRC, partes_viejas[nombre].file_size)
+            != (partes_nuevas[nombre].CRC, partes_nuevas[nombre].file_size)
+        )
+        agregadas = sorted(partes_nuevas.keys() - partes_viejas.keys())
+        eliminadas = sorted(partes_viejas.keys() - partes_nuevas.keys())
+
+        hojas = _hojas_del_libro(actual)
+        hojas_viejas = _hojas_del_libro(viejo)
+        strings_viejos = strings_nuevos = None
+        if _PARTE_STRINGS in cambiadas:
+            strings_viejos, strings_nuevos = _shared_strings(viejo), _shared_strings(actual)
+
+        # Con sharedStrings cambiado, también las hojas intactas que usan
+        # strings compartidos: el mismo índice puede ser otro texto
+        a_comparar = list(cambiadas)
+        if strings_viejos is not None:
+            a_comparar += sorted(
+                parte for parte in (hojas.keys() | hojas_viejas.keys())
+                if parte in partes_viejas and parte in partes_nuevas and parte not in cambiadas
+            )
+
+        por_hoja = {}
+        change_bytes = 0
+        estructurales = []
+        for parte in a_comparar:
+            if parte in hojas or parte in hojas_viejas:
+                datos_viejos, datos_nuevos = viejo.read(parte), actual.read(parte)
+                if parte not in cambiadas and b't="s"' not in datos_nuevos:
+                    continue
+                detalle = _diff_hoja(viejo, actual, parte, datos_viejos, datos_nuevos,
+                                     strings_viejos, strings_nuevos)
+                detalle['part'] = parte
+                detalle['bytes_delta'] = partes_nuevas[parte].file_size - partes_viejas[parte].file_size
+                if parte in cambiadas and _fuera_de_datos(datos_viejos) != _fuera_de_datos(datos_nuevos):
+                    # combinadas, columnas, formato condicional...: fuera de las celdas
+                    estructurales.append(parte)
+                    change_bytes += abs(detalle['bytes_delta']) or 1
+                por_hoja[hojas.get(parte) or hojas_viejas.get(parte)] = detalle
+                change_bytes += detalle['change_bytes']
+            elif parte != _PARTE_STRINGS and not _es_metadato(parte):
+                # estilos, tablas, gráficos...: su delta de tamaño es el cambio
+                estructurales.append(parte)
+                change_bytes += abs(partes_nuevas[parte].file_size - partes_viejas[parte].file_size) or 1
+
+        for parte in agregadas:
+            if not _es_metadato(parte):
+                estructurales.append(parte)
+                change_bytes += partes_nuevas[parte].file_size
+        for parte in eliminadas:
+            if not _es_metadato(parte):
+                estructurales.append(parte)
+                change_bytes += partes_viejas[parte].file_size
+
+    celdas = sum(h['changed_cells'] + h['added_cells'] + h['removed_cells'] for h in por_hoja.values())
+    formato = sum(h['format_changes'] for h in por_hoja.values())
+    tamano_nuevo = _tamano(nuevo)
+    tamano_viejo = _tamano(anterior)
+
+    return {
+        'identical': not (cambiadas or agregadas or eliminadas),
+        'noop': celdas == 0 and formato == 0 and not estructurales,
+        'changed_parts': cambiadas,
+        'added_parts': agregadas,
+        'removed_parts': eliminadas,
+        'structural_parts': estructurales,
+        'sheets': por_hoja,
+        'changed_cells': celdas,
+        'format_changes': formato,
+        'change_bytes': change_bytes,
+        'bytes_delta': (tamano_nuevo - tamano_viejo) if None not in (tamano_nuevo, tamano_viejo) else None,
+        'elapsed_s': round(time.perf_counter() - inicio, 4)
+    }
+
+
+def _tamano(archivo):
+    try:
+        if hasattr(archivo, 'fileno'):
+            return os.fstat(archivo.fileno()).st_size
+        return os.path.getsize(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def medir_cambio(origen, destino):
+    """
+    diff_workbooks(origen, destino) si ambos son .xlsx legibles; None si no
+    se puede medir (otro formato, destino aún inexistente, guardado a medias).
+    """
+    if not origen.lower().endswith(('.xlsx', '.xlsm')) or not os.path.exists(destino):
+        return None
+    try:
+        return diff_workbooks(origen, destino)
+    except (zipfile.BadZipFile, OSError, ET.ParseError, KeyError):
+        return None
+
+
+def resumen_cambio(diff):
+    """Texto corto para el log: '12 celdas en 2 hojas, 0.01 MB'"""
+    if diff is None:
+        return "tamaño del cambio desconocido"
+    hojas = sum(1 for h in diff['sheets'].values()
+                if h['changed_cells'] or h['added_cells'] or h['removed_cells'] or h['format_changes'])
+    return (f"{diff['changed_cells']} celdas en {hojas} hojas, "
+            f"{diff['change_bytes'] / (1024 * 1024):.2f} MB")
@@ -7,8 +7,13 @@ class SincronizadorUI {
         this.estado = {
             monitorActivo: false,
             configuracionVisible: false,
-            modoAutomatico: true  // NUEVO: Indicar que está en modo automático
+            modoAutomatico: true,  // NUEVO: Indicar que está en modo automático
+            ultimoSeqLog: null,    // Cursor de /api/logs?since= (solo líneas nuevas)
+            lineasLog: [],
+            streamConectado: false,
+            streamReconectando: false  // Tras un error del stream: al reabrir se pide /api/estado una vez
         };
+        this.eventSource = null;
         
         this.inicializarElementos();
         this.configurarEventListeners();
@@ -111,11 +116,6 @@ class SincronizadorUI {
         // Actualizar estado inicial
         this.actualizarEstado();
         
-        // Iniciar actualización automática cada 5 segundos (más frecuente para el modo automático)
-        this.intervalos.estadoAuto = setInterval(() => {
-            this.actualizarEstado();
-        }, 5000);
-        
         // NUEVO: Iniciar countdown para próxima sincronización
         this.intervalos.countdown = setInterval(() => {
             this.actualizarCountdown();
@@ -124,15 +124,115 @@ class SincronizadorUI {
         // Cargar logs iniciales
         this.cargarLogs();
         
-        // NUEVO: Actualizar logs automáticamente cada 10 segundos
-        this.intervalos.logsAuto = setInterval(() => {
-            this.cargarLogs();
-        }, 10000);
+        // Eventos en tiempo real (SSE); si no hay stream, polling como antes
+        this.conectarStream();
+        this.iniciarPolling();
         
         this.ocultarLoading();
         this.mostrarNotificacion('Sistema automático iniciado correctamente', 'success', 'Sistema');
     }
 
+    // === EVENTOS EN TIEMPO REAL (SSE) ===
+    iniciarPolling() {
+        // Fallback sin stream: estado cada 5s y logs cada 10s
+        if (!this.intervalos.estadoAuto) {
+            this.intervalos.estadoAuto = setInterval(() => this.actualizarEstado(), 5000);
+        }
+        if (!this.intervalos.logsAuto) {
+            this.intervalos.logsAuto = setInterval(() => this.cargarLogs(true), 10000);
+        }
+    }
+
+    limpiarPolling() {
+        ['estadoAuto', 'logsAuto'].forEach(nombre => {
+            if (this.intervalos[nombre]) {
+                clearInterval(this.intervalos[nombre]);
+                delete this.intervalos[nombre];
+            }
+        });
+    }
+
+    conectarStream() {
+        if (!window.EventSource) {
+            return;  // Navegador sin SSE: queda el polling
+        }
+        
+        this.eventSource = new EventSource('/api/stream');
+        
+        this.eventSource.onopen = () => {
+            const reconexion = this.estado.streamReconectando;
+            this.estado.streamConectado = true;
+            this.estado.streamReconectando = false;
+            // Con stream abierto no se consulta /api/estado: los eventos traen los datos
+            this.limpiarPolling();
+            this.actualizarEstadoConexion(true);
+            if (reconexion) {
+                this.actualizarEstado();
+            }
+            // Ponerse al día con lo que se escribió mientras no había stream
+            this.cargarLogs(true);
+        };
+        
+        this.eventSource.onerror = () => {
+            // EventSource reintenta solo; mientras tanto, volver al polling
+            if (this.estado.streamConectado) {
+                this.estado.streamConectado = false;
+                this.estado.streamReconectando = true;
+                this.actualizarEstado();
+                this.limpiarPolling();
+                this.iniciarPolling();
+            }
+        };
+        
+        this.eventSource.addEventListener('log', (e) => {
+            const datos = JSON.parse(e.data);
+            this.estado.ultimoSeqLog = datos.ultimo_seq;
+            this.agregarLineasLog(datos.lineas);
+        });
+        
+        // Los eventos se pintan con su propio contenido (sin pedir /api/estado)
+        this.eventSource.addEventListener('counters', (e) => this.aplicarContadores(JSON.parse(e.data)));
+        this.eventSource.addEventListener('status', (e) => this.aplicarContadores(JSON.parse(e.data)));
+        this.eventSource.addEventListener('verified', (e) => {
+            const datos = JSON.parse(e.data);
+            this.mostrarNotificacion(datos.message || 'Archivo sincronizado y verificado', 'success', 'Sincronización');
+            this.aplicarUltimaVerificacion(datos.ts);
+        });
+        this.eventSource.addEventListener('failed', (e) => {
+            const datos = JSON.parse(e.data);
+            this.mostrarNotificacion(datos.message || 'Error en sincronización', 'error', 'Sincronización');
+        });
+    }
+
+    aplicarContadores(datos) {
+        // 'counters' (app/envio) y 'status' traen solo los campos que cambiaron
+        if (typeof datos.corriendo === 'boolean') {
+            this.estado.monitorActivo = datos.corriendo;
+            this.actualizarBotonesControl();
+            this.elementos.monitorActivo.textContent = datos.corriendo ? 'Sí' : 'No';
+            this.elementos.monitorActivo.className = datos.corriendo ? 'status-value text-success' : 'status-value text-danger';
+        }
+        const contador = datos.sincronizaciones_realizadas ?? datos.sincronizaciones_exitosas;
+        if (this.elementos.contadorSincronizaciones && contador !== undefined) {
+            this.elementos.contadorSincronizaciones.textContent = contador;
+        }
+    }
+
+    aplicarUltimaVerificacion(ts) {
+        if (ts) {
+            this.elementos.ultimaVerificacion.textContent = new Date(ts * 1000).toLocaleString();
+        }
+    }
+
+    agregarLineasLog(lineas) {
+        if (!lineas || lineas.length === 0) {
+            return;
+        }
+        const maximo = parseInt(this.elementos.selectLineasLog.value, 10);
+        this.estado.lineasLog = this.estado.lineasLog.concat(lineas).slice(-maximo);
+        this.renderizarLogs();
+    }
+
     // === NUEVOS MÉTODOS PARA SINCRONIZACIÓN AUTOMÁTICA ===
     
     actualizarTextoIntervalo(valor) {
@@ -538,10 +638,15 @@ class SincronizadorUI {
     }
 
     // === MÉTODOS DE LOGS (ACTUALIZADOS) ===
-    async cargarLogs() {
+    async cargarLogs(incremental = false) {
         try {
-            const lineas = this.elementos.selectLineasLog.value;
-            const response = await fetch(`/api/logs?lineas=${lineas}`);
+            const lineas = parseInt(this.elementos.selectLineasLog.value, 10);
+            let url = `/api/logs?lineas=${lineas}`;
+            if (incremental && this.estado.ultimoSeqLog !== null) {
+                // Solo las líneas posteriores al último cursor recibido
+                url += `&since=${this.estado.ultimoSeqLog}`;
+            }
+            const response = await fetch(url);
             const datos = await response.json();
             
             if (datos.error) {
@@ -549,22 +654,20 @@ class SincronizadorUI {
                 return;
             }
             
-            if (!datos.logs || datos.logs.length === 0) {
-                this.elementos.logsContainer.innerHTML = '<p class="text-muted">No hay logs disponibles</p>';
-                return;
+            if (datos.ultimo_seq !== undefined && datos.ultimo_seq !== null) {
+                this.estado.ultimoSeqLog = datos.ultimo_seq;
             }
             
-            // Formatear y mostrar logs con mejor resaltado para modo automático
-            const logsHTML = datos.logs.map(linea => {
-                const claseCSS = this.obtenerClaseLog(linea);
-                const lineaFormateada = this.formatearLineaLog(linea);
-                return `<div class="log-line ${claseCSS}">${lineaFormateada}</div>`;
-            }).join('');
-            
-            this.elementos.logsContainer.innerHTML = logsHTML;
+            if (datos.incremental) {
+                if (!datos.logs || datos.logs.length === 0) {
+                    return;  // Nada nuevo: no redibujar
+                }
+                this.estado.lineasLog = this.estado.lineasLog.concat(datos.logs).slice(-lineas);
+            } else {
+                this.estado.lineasLog = datos.logs || [];
+            }
             
-            // Scroll al final
-            this.elementos.logsContainer.scrollTop = this.elementos.logsContainer.scrollHeight;
+            this.renderizarLogs();
             
         } catch (error) {
             console.error('Error cargando logs:', error);
@@ -572,6 +675,25 @@ class SincronizadorUI {
         }
     }
 
+    renderizarLogs() {
+        if (this.estado.lineasLog.length === 0) {
+            this.elementos.logsContainer.innerHTML = '<p class="text-muted">No hay logs disponibles</p>';
+            return;
+        }
+        
+        // Formatear y mostrar logs con mejor resaltado para modo automático
+        const logsHTML = this.estado.lineasLog.map(linea => {
+            const claseCSS = this.obtenerClaseLog(linea);
+            const lineaFormateada = this.formatearLineaLog(linea);
+            return `<div class="log-line ${claseCSS}">${lineaFormateada}</div>`;
+        }).join('');
+        
+        this.elementos.logsContainer.innerHTML = logsHTML;
+        
+        // Scroll al final
+        this.elementos.logsContainer.scrollTop = this.elementos.logsContainer.scrollHeight;
+    }
+
     async limpiarLogs() {
         if (!confirm('¿Estás seguro de que quieres limpiar todos los logs?')) {
             return;
@@ -736,6 +858,10 @@ class SincronizadorUI {
             clearInterval(intervalo);
         });
         
+        if (this.eventSource) {
+            this.eventSource.close();
+        }
+        
         // Remover event listeners si es necesario
         console.log('UI destruida correctamente');
     }
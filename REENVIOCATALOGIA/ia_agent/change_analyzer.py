@@ -5,8 +5,9 @@
 import re
 import json
 import os
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 import logging
 
 # LangChain imports
@@ -17,29 +18,54 @@ try:
 except ImportError:
     LANGCHAIN_AVAILABLE = False
 
+from .decision_cache import (
+    DecisionCache, MicroBatcher, LocalStubLLM, BATCH_INSTRUCTIONS,
+    build_messages, build_batch_prompt, parse_batch_response,
+    context_fingerprint, log_line_fingerprint
+)
+from backend.rule_engine import get_rule_engine
+from backend.metrics import medir_llamada_llm
+
 class ChangeAnalyzer:
     """Analizador inteligente mejorado con IA real visible"""
     
-    def __init__(self, langchain_config: dict):
+    def __init__(self, langchain_config: dict, llm=None):
         self.config = langchain_config
         self.logger = logging.getLogger(__name__)
-        self.llm = self._setup_llm()
+        self.llm = llm or self._setup_llm()
+        
+        # Caché de respuestas y micro-lotes: una llamada al LLM por lote de
+        # eventos y ninguna para contextos ya consultados
+        self.decision_cache = DecisionCache(
+            max_entries=self.config.get('cache_max_entries', 256),
+            ttl_seconds=self.config.get('cache_ttl_seconds', 600)
+        )
+        self.batcher = MicroBatcher(
+            self._run_llm_batch,
+            max_batch=self.config.get('batch_max_size', 8),
+            max_wait=self.config.get('batch_window_seconds', 0.5)
+        )
+        self.llm_timeout = self.config.get('llm_timeout_seconds', 30)
         
         # Contadores para visibilidad
         self.total_analyses = 0
         self.ai_overrides = 0
         self.confidence_history = []
         
-        # Contexto empresarial para decisiones
+        # Contexto empresarial para decisiones; las palabras clave viven en
+        # el motor de reglas (una pasada por línea, recarga en caliente)
+        self.rule_engine = get_rule_engine()
         self.business_context = {
-            'critical_keywords': ['catalogo', 'precio', 'price', 'stock', 'inventario', 'inventory'],
             'business_hours': (8, 18),
-            'critical_size_mb': 0.5,
-            'conflict_indicators': ['editing', 'locked', 'temp', 'backup']
+            'critical_size_mb': 0.5
         }
     
     def _setup_llm(self):
         """Configura LLM con fallbacks mejorados"""
+        if self.config.get('provider') == 'stub':
+            self.logger.info("Usando modelo local de pruebas (stub)")
+            return LocalStubLLM()
+        
         if not LANGCHAIN_AVAILABLE:
             self.logger.warning("LangChain no disponible, usando análisis inteligente simulado")
             return None
@@ -71,46 +97,98 @@ class ChangeAnalyzer:
         self.logger.info("Usando análisis inteligente simulado (sin costo)")
         return None
     
+    # Tipo de evento -> contexto que recibe el LLM
+    EVENT_CONTEXTS = {
+        'sync': "sincronización exitosa",
+        'error': "error del sistema",
+        'change': "cambio en archivo"
+    }
+    
     def analyze_sync_success(self, log_line: str) -> str:
         """Analiza una sincronización exitosa CON IA"""
-        self.total_analyses += 1
-        
-        if self.llm:
-            return self._analyze_with_llm(log_line, "sincronización exitosa")
-        else:
-            return self._analyze_intelligent_sync(log_line)
+        return self.analyze_events([('sync', log_line)])[0]
     
     def analyze_error(self, log_line: str) -> str:
         """Analiza un error del sistema CON IA"""
-        self.total_analyses += 1
-        
-        if self.llm:
-            return self._analyze_with_llm(log_line, "error del sistema")
-        else:
-            return self._analyze_intelligent_error(log_line)
+        return self.analyze_events([('error', log_line)])[0]
     
     def analyze_file_change(self, log_line: str) -> str:
         """Analiza cambios en archivos CON IA"""
-        self.total_analyses += 1
+        return self.analyze_events([('change', log_line)])[0]
+    
+    def analyze_events(self, events: List[Tuple[str, str]]) -> List[str]:
+        """
+        Analiza varias líneas de log a la vez: [(tipo, línea)] con tipo
+        'sync' | 'error' | 'change'. Con IA real, todas las que no están en
+        caché van juntas al mismo micro-lote (una llamada al LLM).
+        """
+        self.total_analyses += len(events)
+        
+        if not self.llm:
+            simulated = {
+                'sync': self._analyze_intelligent_sync,
+                'error': self._analyze_intelligent_error,
+                'change': self._analyze_intelligent_change
+            }
+            return [simulated[kind](log_line) for kind, log_line in events]
         
-        if self.llm:
-            return self._analyze_with_llm(log_line, "cambio en archivo")
-        else:
-            return self._analyze_intelligent_change(log_line)
+        now = datetime.now()
+        requests = []
+        for kind, log_line in events:
+            context = self.EVENT_CONTEXTS[kind]
+            key = ('analysis', context) + log_line_fingerprint(log_line, now)
+            requests.append((key, {'context': context, 'log': log_line}))
+        
+        analyses = []
+        for (kind, log_line), (answer, cached) in zip(events, self._ask_llm_many('analysis', requests)):
+            content = str((answer or {}).get('analysis', '')).strip()
+            if not content:
+                analyses.append(self._get_fallback_analysis(log_line, self.EVENT_CONTEXTS[kind]))
+                continue
+            
+            # Extraer nivel de confianza si es posible
+            self.confidence_history.append(self._extract_confidence_from_response(content))
+            
+            # Agregar indicador de IA real
+            analyses.append(f"[ANÁLISIS IA REAL{' - CACHÉ' if cached else ''}] {content}")
+        return analyses
     
     def analyze_conflict_situation(self, context_data: dict) -> Dict[str, Any]:
         """NUEVO: Analiza situaciones de conflicto de edición"""
-        self.total_analyses += 1
-        
-        if self.llm:
-            return self._analyze_conflict_with_llm(context_data)
-        else:
-            return self._analyze_conflict_intelligent(context_data)
+        return self.analyze_conflict_situations([context_data])[0]
     
-    def _analyze_with_llm(self, log_line: str, context: str) -> str:
-        """Análisis con LangChain/OpenAI REAL"""
-        try:
-            system_message = SystemMessage(content=f"""
+    def analyze_conflict_situations(self, contexts: List[dict]) -> List[Dict[str, Any]]:
+        """Varios conflictos a la vez: con IA real, en un solo micro-lote"""
+        self.total_analyses += len(contexts)
+        
+        if not self.llm:
+            return [self._analyze_conflict_intelligent(context_data) for context_data in contexts]
+        
+        requests = []
+        for context_data in contexts:
+            key = ('conflict',) + context_fingerprint(context_data, extra=('is_critical',))
+            requests.append((key, {
+                'source_editing': context_data.get('source_editing', False),
+                'dest_editing': context_data.get('dest_editing', False),
+                'is_critical': context_data.get('is_critical', True),
+                'business_hours': context_data.get('business_hours', True),
+                'last_sync_minutes': context_data.get('last_sync_minutes', 'N/A')
+            }))
+        
+        analyses = []
+        for context_data, (answer, cached) in zip(contexts, self._ask_llm_many('conflict', requests)):
+            if answer and answer.get('recommendation'):
+                analysis = dict(answer)
+                analysis.pop('id', None)
+                analysis['analysis_type'] = 'real_ai_conflict'
+                analysis['cached'] = cached
+                analyses.append(analysis)
+            else:
+                analyses.append(self._analyze_conflict_intelligent(context_data))
+        return analyses
+    
+    # Prompts base; el formato de cada respuesta va en los prompts de lote
+    LOG_SYSTEM_PROMPT = """
             Eres un Analista IA especializado en sistemas de sincronización empresarial.
             
             CONTEXTO EMPRESARIAL:
@@ -126,32 +204,11 @@ class ChangeAnalyzer:
             4. Nivel de urgencia (1-10)
             5. Presencia de conflictos potenciales
             
-            Contexto específico: {context}
-            
             Responde de forma profesional y directa. Enfócate en impacto empresarial.
-            """)
-            
-            user_message = HumanMessage(content=f"Analiza este evento del sistema: {log_line}")
-            
-            response = self.llm([system_message, user_message])
-            
-            # Agregar indicador de IA real
-            analysis = f"[ANÁLISIS IA REAL] {response.content}"
-            
-            # Extraer nivel de confianza si es posible
-            confidence = self._extract_confidence_from_response(response.content)
-            self.confidence_history.append(confidence)
-            
-            return analysis
-            
-        except Exception as e:
-            self.logger.error(f"Error en análisis LLM: {e}")
-            return self._get_fallback_analysis(log_line, context)
+            Formato de cada objeto: {"id": 1, "analysis": "texto del análisis"}
+            """
     
-    def _analyze_conflict_with_llm(self, context_data: dict) -> Dict[str, Any]:
-        """Analiza conflictos de edición con IA real"""
-        try:
-            system_prompt = """Eres un Especialista IA en resolución de conflictos de archivos empresariales.
+    CONFLICT_SYSTEM_PROMPT = """Eres un Especialista IA en resolución de conflictos de archivos empresariales.
 
 SITUACIÓN: Múltiples usuarios pueden estar editando el mismo archivo crítico simultáneamente.
 
@@ -166,42 +223,61 @@ DECISIONES DISPONIBLES:
 - BACKUP_MERGE: Crear backup y sincronizar
 - ALERT_USERS: Notificar conflicto a usuarios
 
-Responde en JSON:
+Formato de cada objeto:
 {
+    "id": 1,
     "recommendation": "FORCE_SYNC|WAIT_USERS|BACKUP_MERGE|ALERT_USERS",
     "risk_level": "Alto|Medio|Bajo",
     "business_impact": "descripción del impacto",
     "confidence": 85,
     "reasoning": "explicación detallada"
 }"""
-            
-            user_prompt = f"""ANÁLISIS DE CONFLICTO REQUERIDO:
-
-CONTEXTO:
-- Usuarios editando origen: {context_data.get('source_editing', False)}
-- Usuarios editando destino: {context_data.get('dest_editing', False)}
-- Archivo crítico: {context_data.get('is_critical', True)}
-- Horario laboral: {context_data.get('business_hours', True)}
-- Última sincronización: {context_data.get('last_sync_minutes', 'N/A')} min
-
-¿Cuál es la mejor estrategia para manejar este conflicto?"""
-
-            response = self.llm([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ])
-            
-            # Parsear respuesta JSON
-            json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
-            if json_match:
-                analysis = json.loads(json_match.group())
-                analysis['analysis_type'] = 'real_ai_conflict'
-                return analysis
-        
-        except Exception as e:
-            self.logger.error(f"Error en análisis de conflicto IA: {e}")
+    
+    def _run_llm_batch(self, kind: str, payloads: list) -> list:
+        """Un solo prompt al LLM para todos los eventos pendientes de un tipo"""
+        if kind == 'conflict':
+            system_prompt = self.CONFLICT_SYSTEM_PROMPT
+            header = "ANÁLISIS DE CONFLICTO REQUERIDO. ¿Cuál es la mejor estrategia para cada situación?"
+        else:
+            system_prompt = self.LOG_SYSTEM_PROMPT
+            header = "Analiza estos eventos del sistema (campo 'context': tipo de evento, 'log': línea):"
         
-        return self._analyze_conflict_intelligent(context_data)
+        with medir_llamada_llm('change_analyzer', kind):
+            response = self.llm(build_messages(system_prompt + BATCH_INSTRUCTIONS,
+                                               build_batch_prompt(header, payloads)))
+        return parse_batch_response(response.content, len(payloads))
+    
+    def _ask_llm_many(self, kind: str, requests: list) -> list:
+        """
+        Respuestas cacheadas o pedidas al LLM para [(clave, payload)]: las no
+        cacheadas se encolan juntas (submit_many) y quedan en el mismo
+        micro-lote. Devuelve [(respuesta | None, cacheada)] en el mismo orden.
+        """
+        results = [(None, False)] * len(requests)
+        pending = []
+        for i, (key, payload) in enumerate(requests):
+            cached = self.decision_cache.get(key)
+            if cached is not None:
+                results[i] = (cached, True)
+            else:
+                pending.append((i, key, payload))
+        
+        futures = []
+        if pending:
+            try:
+                futures = self.batcher.submit_many(kind, [(key, payload) for _i, key, payload in pending])
+            except Exception as e:
+                self.logger.error(f"Error en análisis LLM: {e}")
+        
+        deadline = time.monotonic() + self.llm_timeout
+        for (i, key, _payload), future in zip(pending, futures):
+            try:
+                answer = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                self.decision_cache.put(key, answer)
+                results[i] = (answer, False)
+            except Exception as e:
+                self.logger.error(f"Error en análisis LLM: {e}")
+        return results
     
     def _analyze_intelligent_sync(self, log_line: str) -> str:
         """Análisis inteligente de sincronización (sin API)"""
@@ -214,7 +290,7 @@ CONTEXTO:
         
         # Análisis contextual inteligente
         is_fast = float(time_taken) < 1.0 if time_taken != "N/A" else False
-        is_critical_file = any(keyword in log_line.lower() for keyword in self.business_context['critical_keywords'])
+        is_critical_file = self.rule_engine.classify_log_line(log_line)['is_critical']
         
         # Generar análisis inteligente
         analysis = f"[ANÁLISIS IA SIMULADO] Sincronización #{sync_num} procesada"
@@ -285,7 +361,7 @@ CONTEXTO:
         has_bytes = byte_match is not None
         
         # Detectar palabras clave críticas
-        is_critical = any(keyword in log_line.lower() for keyword in self.business_context['critical_keywords'])
+        is_critical = self.rule_engine.classify_log_line(log_line)['is_critical']
         
         # Análisis contextual
         now = datetime.now()
@@ -367,25 +443,7 @@ CONTEXTO:
     
     def _extract_confidence_from_response(self, response_text: str) -> int:
         """Extrae nivel de confianza de respuesta IA"""
-        # Buscar patrones de confianza
-        confidence_patterns = [
-            r'confianza[:\s]+(\d+)%',
-            r'confidence[:\s]+(\d+)%',
-            r'certeza[:\s]+(\d+)%'
-        ]
-        
-        for pattern in confidence_patterns:
-            match = re.search(pattern, response_text.lower())
-            if match:
-                return int(match.group(1))
-        
-        # Valor por defecto basado en palabras clave
-        if any(word in response_text.lower() for word in ['crítico', 'urgent', 'immedia']):
-            return 90
-        elif any(word in response_text.lower() for word in ['probable', 'likely', 'normal']):
-            return 75
-        else:
-            return 80
+        return self.rule_engine.extract_confidence(response_text)
     
     def _get_fallback_analysis(self, log_line: str, context: str) -> str:
         """Análisis de fallback cuando LLM falla"""
@@ -405,5 +463,11 @@ CONTEXTO:
             'average_confidence': round(avg_confidence, 1),
             'recent_confidence_trend': self.confidence_history[-10:] if len(self.confidence_history) >= 10 else self.confidence_history,
             'langchain_available': LANGCHAIN_AVAILABLE,
-            'api_connected': self.llm is not None
-        }
\ No newline at end of file
+            'api_connected': self.llm is not None,
+            'cache': self.decision_cache.get_stats(),
+            'batching': self.batcher.get_stats()
+        }
+    
+    def close(self):
+        """Detiene el hilo de micro-lotes"""
+        self.batcher.close()
\ No newline at end of file
@@ -0,0 +1,393 @@
+# ia_agent/decision_cache.py - CACHÉ DE DECISIONES Y MICRO-LOTES PARA EL LLM
+"""
+Reduce las llamadas al LLM del ChangeAnalyzer y del AIOrchestrator.
+
+- DecisionCache: caché TTL + LRU indexada por una huella normalizada del
+  contexto (archivo, franja horaria laboral, rango de tamaño, edición
+  activa). Contextos casi idénticos reutilizan la decisión anterior en vez
+  de volver a preguntar.
+- MicroBatcher: junta los eventos pendientes durante una ventana corta y
+  los envía en un solo prompt (un arreglo JSON con una respuesta por
+  evento). Eventos con la misma huella dentro del lote comparten respuesta.
+- LocalStubLLM: modelo local determinista con la misma interfaz que
+  ChatOpenAI (`llm(mensajes).content`), para pruebas y modo "stub".
+
+Así el costo y la latencia del LLM dejan de crecer con el volumen del log.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+try:
+    from langchain.schema import HumanMessage, SystemMessage
+except ImportError:
+    HumanMessage = SystemMessage = None
+
+
+# Rangos de tamaño del cambio (MB) para la huella
+SIZE_BUCKETS = ((0.1, 'xs'), (0.5, 's'), (5.0, 'm'))
+BUSINESS_HOURS = (8, 18)
+
+
+def _size_bucket(size_mb):
+    if size_mb is None:
+        return 'na'
+    try:
+        size_mb = float(size_mb)
+    except (TypeError, ValueError):
+        return 'na'
+    for limite, nombre in SIZE_BUCKETS:
+        if size_mb < limite:
+            return nombre
+    return 'l'
+
+
+def _business_hours_bucket(context, now=None):
+    if 'business_hours' in context:
+        return 'laboral' if context['business_hours'] else 'fuera'
+    now = now or datetime.now()
+    laboral = BUSINESS_HOURS[0] <= now.hour < BUSINESS_HOURS[1] and now.weekday() < 5
+    return 'laboral' if laboral else 'fuera'
+
+
+def _editing_flag(context):
+    origen = bool(context.get('source_editing'))
+    destino = bool(context.get('dest_editing'))
+    if origen or destino:
+        return 'origen+destino' if origen and destino else ('origen' if origen else 'destino')
+    return 'usuarios' if context.get('users_editing') else 'no'
+
+
+def context_fingerprint(context, extra=()):
+    """
+    Huella normalizada de un contexto de decisión:
+    (archivo, franja laboral, rango de tamaño, edición activa, *extra)
+    """
+    filename = os.path.basename(str(context.get('filename') or '')).lower()
+    huella = (
+        filename,
+        _business_hours_bucket(context),
+        _size_bucket(context.get('change_size_mb')),
+        _editing_flag(context),
+    )
+    return huella + tuple(context.get(clave) for clave in extra)
+
+
+_TIMESTAMP = re.compile(r'^\s*\[?\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\]?\s*')
+_ARCHIVO = re.compile(r'([\w\-. ]+\.(?:xlsx|xlsm|xls|csv))', re.IGNORECASE)
+_BYTES = re.compile(r'([+-]?\d+(?:,\d+)*)\s*bytes', re.IGNORECASE)
+_NUMEROS = re.compile(r'\d+(?:[.,]\d+)*')
+
+
+def log_line_fingerprint(log_line, now=None):
+    """
+    Huella de una línea de log: el contexto que se puede extraer de ella más
+    su plantilla (sin fecha ni números), para que líneas que solo difieren
+    en hora, contador o duración compartan análisis.
+    """
+    archivo = _ARCHIVO.search(log_line)
+    bytes_match = _BYTES.search(log_line)
+    size_mb = None
+    if bytes_match:
+        size_mb = abs(int(bytes_match.group(1).replace(',', ''))) / (1024 * 1024)
+    contexto = {
+        'filename': archivo.group(1).strip() if archivo else '',
+        'change_size_mb': size_mb,
+        'users_editing': any(p in log_line.lower() for p in ('editing', 'locked', 'bloqueado')),
+    }
+    if now is not None:
+        contexto['business_hours'] = BUSINESS_HOURS[0] <= now.hour < BUSINESS_HOURS[1] and now.weekday() < 5
+    plantilla = _NUMEROS.sub('#', _TIMESTAMP.sub('', log_line)).strip().lower()
+    plantilla = ' '.join(plantilla.split())[:200]
+    return context_fingerprint(contexto) + (plantilla,)
+
+
+class DecisionCache:
+    """Caché TTL + LRU de respuestas del LLM"""
+
+    def __init__(self, max_entries=256, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key):
+        """Valor guardado o None (vencido cuenta como ausente)"""
+        ahora = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.stats['misses'] += 1
+                return None
+            vence, valor = item
+            if vence <= ahora:
+                del self._items[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats['hits'] += 1
+        return dict(valor) if isinstance(valor, dict) else valor
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_stats(self):
+        with self._lock:
+            consultas = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self._items),
+                        hit_rate=round(self.stats['hits'] / consultas * 100, 1) if consultas else 0.0)
+
+
+class MicroBatcher:
+    """
+    Agrupa pedidos al LLM en lotes.
+
+    `submit(grupo, clave, payload)` devuelve un Future. Un hilo espera hasta
+    `max_wait` segundos (o `max_batch` pedidos) y llama una vez a
+    `procesar(grupo, payloads)` por grupo, que debe devolver una respuesta
+    por payload en el mismo orden. Pedidos con la misma clave en el lote
+    comparten el Future.
+    """
+
+    def __init__(self, procesar, max_batch=8, max_wait=0.5):
+        self.procesar = procesar
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pendientes = OrderedDict()  # (grupo, clave) -> (payload, future)
+        self._thread = None
+        self._closed = False
+        self.stats = {'requests': 0, 'deduplicated': 0, 'batches': 0, 'llm_calls': 0, 'errors': 0}
+
+    def submit(self, grupo, clave, payload):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher cerrado")
+            self.stats['requests'] += 1
+            existente = self._pendientes.get((grupo, clave))
+            if existente is not None:
+                self.stats['deduplicated'] += 1
+                return existente[1]
+            future = Future()
+            self._pendientes[(grupo, clave)] = (payload, future)
+            self._ensure_started()
+            self._cond.notify_all()
+            return future
+
+    def submit_many(self, grupo, pedidos):
+        """Encola varios (clave, payload) a la vez: quedan en el mismo lote"""
+        with self._cond:
+            futures = [self.submit(grupo, clave, payload) for clave, payload in pedidos]
+        return futures
+
+    def close(self, timeout=5):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='llm-batcher', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        """Espera el primer pedido y luego la ventana del lote"""
+        with self._cond:
+            while not self._pendientes and not self._closed:
+                self._cond.wait()
+            if not self._pendientes:
+                return None
+            limite = time.monotonic() + self.max_wait
+            while len(self._pendientes) < self.max_batch and not self._closed:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._cond.wait(restante)
+            lote = []
+            while self._pendientes and len(lote) < self.max_batch:
+                lote.append(self._pendientes.popitem(last=False))
+            return lote
+
+    def _run(self):
+        while True:
+            lote = self._take_batch()
+            if lote is None:
+                return
+            grupos = OrderedDict()
+            for (grupo, _clave), (payload, future) in lote:
+                grupos.setdefault(grupo, []).append((payload, future))
+            self.stats['batches'] += 1
+            for grupo, items in grupos.items():
+                self._dispatch(grupo, items)
+
+    def _dispatch(self, grupo, items):
+        self.stats['llm_calls'] += 1
+        try:
+            respuestas = self.procesar(grupo, [payload for payload, _f in items])
+        except Exception as e:
+            self.stats['errors'] += 1
+            for _payload, future in items:
+                future.set_exception(e)
+            return
+        for i, (_payload, future) in enumerate(items):
+            respuesta = respuestas[i] if i < len(respuestas) else None
+            if respuesta is None:
+                future.set_exception(ValueError(f"Sin respuesta para el elemento {i + 1} del lote"))
+            else:
+                future.set_result(respuesta)
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats, pending=len(self._pendientes))
+
+
+# ----------------------------------------------------------------------
+# Prompts por lote
+# ----------------------------------------------------------------------
+class _Mensaje:
+    """Mensaje mínimo (role/content) cuando LangChain no está instalado"""
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+
+def build_messages(system_prompt, user_prompt):
+    if SystemMessage is not None:
+        return [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
+    return [_Mensaje('system', system_prompt), _Mensaje('user', user_prompt)]
+
+
+_INICIO_ITEMS = '<<ITEMS>>'
+_FIN_ITEMS = '<</ITEMS>>'
+
+BATCH_INSTRUCTIONS = """
+Recibirás una lista JSON de situaciones numeradas (campo "id").
+Responde SOLO con un arreglo JSON con un objeto por situación, en el mismo
+orden y con el mismo "id", usando el formato indicado para cada objeto."""
+
+
+def build_batch_prompt(encabezado, payloads):
+    """Prompt de usuario con los eventos del lote numerados"""
+    items = [dict(payload, id=i + 1) for i, payload in enumerate(payloads)]
+    return (f"{encabezado}\n\n{_INICIO_ITEMS}\n"
+            f"{json.dumps(items, ensure_ascii=False, indent=1, default=str)}\n{_FIN_ITEMS}")
+
+
+def parse_batch_response(texto, n):
+    """
+    Lista de n respuestas (dict o None) a partir del arreglo JSON devuelto.
+    Si el modelo respondió un único objeto y el lote es de uno, se acepta.
+    """
+    resultados = [None] * n
+    arreglo = re.search(r'\[.*\]', texto, re.DOTALL)
+    datos = None
+    if arreglo:
+        try:
+            datos = json.loads(arreglo.group())
+        except ValueError:
+            datos = None
+    if datos is None and n == 1:
+        objeto = re.search(r'\{.*\}', texto, re.DOTALL)
+        if objeto:
+            try:
+                datos = [json.loads(objeto.group())]
+            except ValueError:
+                datos = None
+    if not isinstance(datos, list):
+        return resultados
+
+    for posicion, item in enumerate(datos):
+        if not isinstance(item, dict):
+            continue
+        indice = item.get('id', posicion + 1)
+        try:
+            indice = int(indice) - 1
+        except (TypeError, ValueError):
+            indice = posicion
+        if 0 <= indice < n and resultados[indice] is None:
+            resultados[indice] = item
+    return resultados
+
+
+# ----------------------------------------------------------------------
+# Modelo local para pruebas
+# ----------------------------------------------------------------------
+class _RespuestaStub:
+    def __init__(self, content):
+        self.content = content
+
+
+class LocalStubLLM:
+    """
+    Modelo local determinista con la interfaz de ChatOpenAI: `llm(mensajes)`
+    devuelve un objeto con `.content`. Responde un arreglo JSON con un objeto
+    por situación del lote. `responder(item) -> dict` permite personalizar
+    la respuesta; `calls` cuenta las llamadas recibidas.
+    """
+
+    def __init__(self, responder=None, latency=0.0):
+        self.responder = responder or self._respuesta_por_defecto
+        self.latency = latency
+        self.calls = 0
+        self.items = 0
+
+    def __call__(self, mensajes):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        texto = mensajes[-1].content if mensajes else ''
+        items = []
+        if _INICIO_ITEMS in texto and _FIN_ITEMS in texto:
+            bloque = texto.split(_INICIO_ITEMS, 1)[1].split(_FIN_ITEMS, 1)[0]
+            try:
+                items = json.loads(bloque)
+            except ValueError:
+                items = []
+        self.items += len(items)
+        respuestas = []
+        for item in items:
+            respuesta = dict(self.responder(item))
+            respuesta['id'] = item.get('id')
+            respuestas.append(respuesta)
+        return _RespuestaStub(json.dumps(respuestas, ensure_ascii=False))
+
+    invoke = __call__
+
+    @staticmethod
+    def _respuesta_por_defecto(item):
+        editando = item.get('users_editing') or item.get('source_editing') or item.get('dest_editing')
+        return {
+            'analysis': f"Evento '{item.get('context', 'sistema')}' evaluado por modelo local. CONFIANZA IA: 80%.",
+            'action': 'WAIT_STABILITY' if editando else 'SYNC_IMMEDIATE',
+            'recommendation': 'WAIT_USERS' if editando else 'FORCE_SYNC',
+            'reasoning': 'Respuesta del modelo local de pruebas',
+            'risk_level': 'Medio' if editando else 'Bajo',
+            'business_impact': 'Medio',
+            'confidence': 80,
+            'delay_minutes': 3 if editando else 0,
+        }
@@ -8,6 +8,8 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 import logging
 
+from .notification_dispatcher import NotificationDispatcher
+
 class EmailNotifier:
     """Sistema de notificaciones por email con soporte Outlook y SMTP corporativo"""
     
@@ -15,6 +17,21 @@ class EmailNotifier:
         self.config = email_config
         self.logger = logging.getLogger(__name__)
         
+        # Envío en segundo plano: conexión persistente, límite por minuto y
+        # resúmenes de eventos repetidos (errores, syncs) por ventana
+        self.dispatcher = None
+        if self.config.get('async_dispatch', True):
+            self.dispatcher = NotificationDispatcher(
+                self._create_smtp_connection,
+                self.config.get('from_email', ''),
+                self.config.get('to_email', ''),
+                rate_limit_per_minute=self.config.get('rate_limit_per_minute', 10),
+                digest_window=self.config.get('digest_window_seconds', 60),
+                idle_timeout=self.config.get('smtp_idle_timeout', 240),
+                retry_backoff=self.config.get('smtp_retry_backoff', 5),
+                max_attempts=self.config.get('smtp_max_attempts', 6)
+            )
+        
     def _create_smtp_connection(self):
         """Crea conexión SMTP según configuración"""
         try:
@@ -39,8 +56,11 @@ class EmailNotifier:
             self.logger.error(f"Error creando conexión SMTP: {str(e)}")
             return None
     
-    def _send_email(self, subject: str, body: str, is_html: bool = False):
-        """Envía email genérico"""
+    def _send_email(self, subject: str, body: str, is_html: bool = False, category: str = None):
+        """Envía email genérico (encolado si hay dispatcher; `category` habilita resúmenes)"""
+        if self.dispatcher:
+            return self.dispatcher.submit(subject, body, is_html, category)
+        
         try:
             msg = MIMEMultipart()
             msg['From'] = self.config['from_email']
@@ -110,7 +130,7 @@ class EmailNotifier:
         <p><small>Análisis generado automáticamente por IA Agent REENVIOCATALOG</small></p>
         """
         
-        self._send_email(subject, body, is_html=True)
+        self._send_email(subject, body, is_html=True, category='sync_success')
     
     def send_error_notification(self, error_count: int, analysis: str, log_line: str):
         """Notifica errores con análisis IA"""
@@ -139,4 +159,13 @@ class EmailNotifier:
         <p><small>Análisis de error generado automáticamente por IA Agent REENVIOCATALOG</small></p>
         """
         
-        self._send_email(subject, body, is_html=True)
\ No newline at end of file
+        self._send_email(subject, body, is_html=True, category='error')
+    
+    def get_stats(self):
+        """Estadísticas de la cola de envío"""
+        return self.dispatcher.get_stats() if self.dispatcher else {}
+    
+    def close(self, timeout: float = 30):
+        """Envía lo pendiente y cierra la conexión SMTP"""
+        if self.dispatcher:
+            self.dispatcher.close(timeout)
\ No newline at end of file
@@ -0,0 +1,363 @@
+# ia_agent/notification_dispatcher.py - ENVÍO DE NOTIFICACIONES EN SEGUNDO PLANO
+"""
+Cola de notificaciones por email con sesión SMTP persistente.
+
+- SMTPSession: mantiene una conexión abierta (STARTTLS + login una sola vez)
+  y se reconecta sola si el servidor la cerró. Si queda ociosa más de
+  `idle_timeout` segundos se cierra y se reabre en el próximo envío.
+- NotificationDispatcher: quien notifica solo encola; un hilo envía.
+  * Límite de envíos por minuto (token bucket): lo que excede espera en
+    cola, no se pierde.
+  * Modo resumen por categoría: el primer evento sale de inmediato y los
+    siguientes dentro de `digest_window` segundos se agrupan en un solo
+    email de resumen al cerrar la ventana (una tormenta de errores produce
+    dos emails por ventana, no uno por error).
+  * Si el envío falla y la reconexión también (servidor caído, red), el
+    email vuelve al frente de la cola y los envíos se pausan con espera
+    exponencial (`retry_backoff` .. `max_retry_backoff` segundos). Se
+    descarta solo tras `max_attempts` intentos.
+
+La conexión la crea `connect()` (p. ej. EmailNotifier._create_smtp_connection),
+así se puede probar contra un servidor SMTP local (aiosmtpd, smtpd).
+"""
+
+import time
+import queue
+import socket
+import smtplib
+import logging
+import threading
+from collections import deque, OrderedDict
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+_FLUSH = object()
+_STOP = object()
+
+# Errores que indican conexión perdida: se reconecta y reintenta una vez
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                      ConnectionError, socket.timeout)
+
+
+def _is_transient(error):
+    """Conexión/red o respuesta 4xx: reintentar más tarde puede funcionar"""
+    if isinstance(error, _CONNECTION_ERRORS):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # SMTPException hereda de OSError: un rechazo no es un fallo de red
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class Notification:
+    """Email pendiente de envío"""
+
+    def __init__(self, subject, body, is_html=False, category=None):
+        self.subject = subject
+        self.body = body
+        self.is_html = is_html
+        self.category = category
+        self.created_at = datetime.now()
+        self.attempts = 0
+
+
+class SMTPSession:
+    """Conexión SMTP reutilizable con reconexión automática"""
+
+    def __init__(self, connect, idle_timeout=240):
+        self.connect = connect
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+        self.stats = {'connections': 0, 'reconnects': 0}
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def connected(self):
+        return self._server is not None
+
+    def idle_for(self):
+        return time.monotonic() - self._last_used if self._server else 0.0
+
+    def _open(self):
+        server = self.connect()
+        if server is None:
+            raise ConnectionError("No se pudo abrir la conexión SMTP")
+        self._server = server
+        self.stats['connections'] += 1
+        return server
+
+    def _ensure(self):
+        if self._server is not None and self.idle_for() > self.idle_timeout:
+            # Conexión vieja: el servidor pudo haberla cerrado
+            try:
+                self._server.noop()
+            except Exception:
+                self._drop()
+        return self._server or self._open()
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                try:
+                    self._server.close()
+                except Exception:
+                    pass
+        self._server = None
+
+    def send(self, msg):
+        """Envía por la conexión abierta; si se perdió, reconecta y reintenta una vez"""
+        try:
+            self._ensure().send_message(msg)
+        except _CONNECTION_ERRORS:
+            self._drop()
+            self.stats['reconnects'] += 1
+            self._open().send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._server is not None and self.idle_for() > self.idle_timeout:
+            self._drop()
+
+    def close(self):
+        self._drop()
+
+
+class _TokenBucket:
+    """`rate` envíos por minuto con ráfaga de hasta `burst`"""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, rate_per_minute))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class NotificationDispatcher:
+    """Cola + hilo de envío con límite de tasa y resúmenes por categoría"""
+
+    def __init__(self, connect, from_email, to_email, rate_limit_per_minute=10,
+                 digest_window=60, idle_timeout=240, max_pending=500,
+                 retry_backoff=5, max_retry_backoff=300, max_attempts=6):
+        self.from_email = from_email
+        self.to_email = to_email
+        self.digest_window = digest_window
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.max_attempts = max_attempts
+        self._paused_until = 0.0
+        self.session = SMTPSession(connect, idle_timeout)
+        self._bucket = _TokenBucket(rate_limit_per_minute) if rate_limit_per_minute else None
+
+        self._queue = queue.Queue()
+        self._outgoing = deque()
+        self._windows = OrderedDict()  # categoría -> {'closes_at': t, 'items': [...]}
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {
+            'queued': 0, 'sent': 0, 'digests': 0, 'folded': 0,
+            'rate_limited': 0, 'errors': 0, 'dropped': 0, 'retried': 0
+        }
+        self.logger = logging.getLogger(__name__)
+
+    # ------------------------------------------------------------------
+    # API para productores (no bloquea)
+    # ------------------------------------------------------------------
+    def submit(self, subject, body, is_html=False, category=None):
+        """
+        Encola una notificación. Con `category` participa del modo resumen;
+        sin categoría se envía sola (sujeta solo al límite de tasa).
+        """
+        self._ensure_started()
+        self._queue.put(Notification(subject, body, is_html, category))
+        self.stats['queued'] += 1
+        return True
+
+    def flush(self, timeout=30):
+        """Cierra las ventanas abiertas y espera a que se envíe todo lo pendiente"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=30):
+        """Envía lo pendiente (ignorando el límite de tasa) y detiene el hilo"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        self.session.close()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='email-dispatcher', daemon=True)
+                self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Hilo de envío
+    # ------------------------------------------------------------------
+    def _next_wakeup(self):
+        now = time.monotonic()
+        waits = [window['closes_at'] - now for window in self._windows.values()]
+        if self._outgoing:
+            waits.append(max(self._paused_until - now,
+                             self._bucket.wait_time() if self._bucket else 0.0))
+        if self.session.connected:
+            waits.append(self.session.idle_timeout - self.session.idle_for())
+        return max(0.0, min(waits)) if waits else None
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._next_wakeup())
+            except queue.Empty:
+                item = None
+
+            flush_event = None
+            if item is _STOP:
+                self._close_windows(force=True)
+                self._send_pending(ignore_rate=True, final=True)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                flush_event = item[1]
+                self._close_windows(force=True)
+            elif isinstance(item, Notification):
+                self._accept(item)
+
+            self._close_windows()
+            self._send_pending(ignore_rate=flush_event is not None)
+            self.session.close_if_idle()
+            if flush_event:
+                flush_event.set()
+
+    def _accept(self, notification):
+        if notification.category is None or not self.digest_window:
+            self._enqueue_outgoing(notification)
+            return
+        window = self._windows.get(notification.category)
+        if window is None:
+            # Primer evento de la categoría: sale ya y abre la ventana
+            self._windows[notification.category] = {
+                'closes_at': time.monotonic() + self.digest_window,
+                'items': []
+            }
+            self._enqueue_outgoing(notification)
+        else:
+            window['items'].append(notification)
+            self.stats['folded'] += 1
+
+    def _close_windows(self, force=False):
+        now = time.monotonic()
+        for category in list(self._windows):
+            window = self._windows[category]
+            if force or window['closes_at'] <= now:
+                del self._windows[category]
+                if window['items']:
+                    self._enqueue_outgoing(self._build_digest(category, window['items']))
+
+    def _enqueue_outgoing(self, notification):
+        self._outgoing.append(notification)
+        while len(self._outgoing) > self.max_pending:
+            self._outgoing.popleft()
+            self.stats['dropped'] += 1
+
+    def _send_pending(self, ignore_rate=False, final=False):
+        """
+        Envía lo que permita el límite de tasa. Durante la espera tras un
+        fallo de conexión no envía nada; al cerrar (`final`) se hace un
+        último intento y, si falla, lo pendiente se descarta.
+        """
+        if not final and time.monotonic() < self._paused_until:
+            return
+        while self._outgoing:
+            if self._bucket and not ignore_rate and not self._bucket.take():
+                self.stats['rate_limited'] += 1
+                return
+            if not self._deliver(self._outgoing.popleft()):
+                if final:
+                    self.stats['dropped'] += len(self._outgoing)
+                    self.logger.error(f"Cierre con SMTP no disponible: {len(self._outgoing)} emails sin enviar")
+                    self._outgoing.clear()
+                return
+
+    def _build_digest(self, category, items):
+        self.stats['digests'] += 1
+        subject = f"[Resumen x{len(items)}] {items[-1].subject}"
+        sections = []
+        for item in items:
+            content = item.body if item.is_html else f"<pre>{item.body}</pre>"
+            sections.append(
+                f"<h3>{item.subject}</h3>"
+                f"<p><small>{item.created_at.strftime('%Y-%m-%d %H:%M:%S')}</small></p>{content}"
+            )
+        body = (f"<h2>{len(items)} notificaciones '{category}' agrupadas "
+                f"en {self.digest_window}s</h2>" + "<hr>".join(sections))
+        return Notification(subject, body, True, category)
+
+    def _deliver(self, notification):
+        """False si el email quedó reencolado por un fallo de conexión"""
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = self.to_email
+        msg['Subject'] = notification.subject
+        msg.attach(MIMEText(notification.body, 'html' if notification.is_html else 'plain', 'utf-8'))
+        notification.attempts += 1
+        try:
+            self.session.send(msg)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.session.close()
+            if not _is_transient(e):
+                # Rechazo del servidor (destinatario, mensaje): reintentar no ayuda
+                self.logger.error(f"Error enviando email: {str(e)}")
+                return True
+            # SMTPSession ya reconectó una vez: el servidor no está disponible
+            if notification.attempts >= self.max_attempts:
+                self.stats['dropped'] += 1
+                self.logger.error(f"Email descartado tras {notification.attempts} intentos: "
+                                  f"{notification.subject} ({str(e)})")
+                return True
+            delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** (notification.attempts - 1))
+            self._paused_until = time.monotonic() + delay
+            self._outgoing.appendleft(notification)
+            self.stats['retried'] += 1
+            self.logger.warning(f"SMTP no disponible ({str(e)}), reintento #{notification.attempts} "
+                                f"en {delay:.0f}s: {notification.subject}")
+            return False
+        self._paused_until = 0.0
+        self.stats['sent'] += 1
+        self.logger.info(f"Email enviado: {notification.subject}")
+        return True
+
+    def get_stats(self):
+        return dict(
+            self.stats,
+            pending=len(self._outgoing) + self._queue.qsize(),
+            open_windows=len(self._windows),
+            **self.session.stats
+        )
@@ -3,6 +3,7 @@
 # ==============================================================================
 
 import os
+import re
 import sys
 import json
 import time
@@ -39,8 +40,23 @@ except ImportError:
 
 from .email_notifier import EmailNotifier
 from .change_analyzer import ChangeAnalyzer
+from .decision_cache import (
+    DecisionCache, MicroBatcher, LocalStubLLM, BATCH_INSTRUCTIONS,
+    build_messages, build_batch_prompt, parse_batch_response, context_fingerprint
+)
 from backend.config import Config
 
+try:
+    from backend.state_store import get_state_store
+except ImportError:
+    get_state_store = None
+
+from backend.log_follower import LogFollower
+from backend.metrics import medir_llamada_llm, servir_metricas
+
+# Tamaño del cambio que FixedSyncSystem agrega a "CAMBIO DETECTADO"
+CHANGE_SIZE_RE = re.compile(r'(\d+) celdas en (\d+) hojas, ([\d.]+) MB')
+
 class AIOrchestrator:
     """Orquestrador IA MEJORADO con visibilidad real de agente inteligente"""
     
@@ -49,6 +65,8 @@ class AIOrchestrator:
         self.is_running = False
         self.backend_process = None
         self.log_monitor_thread = None
+        self.log_follower = None
+        self.metrics_server = None
         
         # Cargar configuración
         self.config = self._load_orchestrator_config()
@@ -63,6 +81,19 @@ class AIOrchestrator:
         self.ai_decisions_count = 0
         self.ai_confidence_scores = []
         
+        # Caché de decisiones por huella de contexto y micro-lotes al LLM
+        langchain_config = self.config.get('langchain', {})
+        self.decision_cache = DecisionCache(
+            max_entries=langchain_config.get('cache_max_entries', 256),
+            ttl_seconds=langchain_config.get('cache_ttl_seconds', 600)
+        )
+        self.decision_batcher = MicroBatcher(
+            self._run_decision_batch,
+            max_batch=langchain_config.get('batch_max_size', 8),
+            max_wait=langchain_config.get('batch_window_seconds', 0.5)
+        )
+        self.llm_timeout = langchain_config.get('llm_timeout_seconds', 30)
+        
         # Inicializar componentes IA
         self.email_notifier = EmailNotifier(self.config['email'])
         self.change_analyzer = ChangeAnalyzer(self.config['langchain'])
@@ -73,6 +104,10 @@ class AIOrchestrator:
         self.total_errors = 0
         self.ai_interventions = 0
         
+        # Contadores persistentes: no arrancar en cero tras cada reinicio
+        self.state_store = None
+        self._restore_counters()
+        
         # INTENTAR ACTIVAR IA REAL
         self._activate_real_ai()
         
@@ -93,7 +128,11 @@ class AIOrchestrator:
         langchain_config = self.config.get('langchain', {})
         provider = langchain_config.get('provider', 'fallback')
         
-        if provider == 'openai' and LANGCHAIN_AVAILABLE:
+        if provider == 'stub':
+            self.llm = LocalStubLLM()
+            self.ai_agent_active = True
+            self.logger.info("IA en modo stub - modelo local de pruebas")
+        elif provider == 'openai' and LANGCHAIN_AVAILABLE:
             api_key = langchain_config.get('openai_api_key', '')
             
             if api_key and api_key != 'sk-your-api-key-here' and len(api_key) > 20:
@@ -179,36 +218,64 @@ class AIOrchestrator:
         print("2. Agrega tu API key de OpenAI")
         print("3. Reinicia el sistema")
     
+    def _restore_counters(self):
+        """Recupera contadores guardados en el almacén de estado del backend"""
+        if get_state_store is None or not getattr(Config, 'ESTADO_PERSISTENTE', False):
+            return
+        try:
+            self.state_store = get_state_store()
+            for name, value in self.state_store.get_counters('orchestrator.').items():
+                if name in ('ai_decisions_count', 'total_syncs', 'total_errors', 'ai_interventions'):
+                    setattr(self, name, value)
+        except Exception as e:
+            self.logger.warning(f"Estado persistente no disponible: {e}")
+            self.state_store = None
+    
+    def _count(self, name):
+        """Incrementa un contador del orquestador y su copia persistente"""
+        setattr(self, name, getattr(self, name) + 1)
+        if self.state_store:
+            try:
+                self.state_store.incr(f'orchestrator.{name}')
+            except Exception:
+                pass
+    
     def make_ai_decision(self, context_data):
         """Toma decisión inteligente usando IA"""
-        self.ai_decisions_count += 1
-        decision_id = f"AI-{self.ai_decisions_count:04d}"
+        return self.make_ai_decisions([context_data])[0]
+    
+    def make_ai_decisions(self, contexts):
+        """Decide varios cambios a la vez: con IA real van en un solo micro-lote"""
+        decision_ids = []
+        for _ in contexts:
+            self._count('ai_decisions_count')
+            decision_ids.append(f"AI-{self.ai_decisions_count:04d}")
         
-        self.logger.info(f"IA ANALIZANDO DECISIÓN {decision_id}...")
+        self.logger.info(f"IA ANALIZANDO DECISIÓN {', '.join(decision_ids)}...")
         
         if self.ai_agent_active and self.llm:
             # DECISIÓN CON IA REAL
-            decision = self._make_real_ai_decision(context_data, decision_id)
+            decisions = self._make_real_ai_decisions(contexts, decision_ids)
         else:
             # DECISIÓN CON IA SIMULADA INTELIGENTE
-            decision = self._make_simulated_ai_decision(context_data, decision_id)
+            decisions = [self._make_simulated_ai_decision(context_data, decision_id)
+                         for context_data, decision_id in zip(contexts, decision_ids)]
+        
+        for decision_id, decision in zip(decision_ids, decisions):
+            # Guardar score de confianza
+            self.ai_confidence_scores.append(decision['confidence'])
+            
+            # LOG VISIBLE DE DECISIÓN IA
+            self.logger.info(f"DECISIÓN IA {decision_id}: {decision['action']}")
+            self.logger.info(f"Confianza: {decision['confidence']}% | Impacto: {decision['business_impact']}")
+            self.logger.info(f"Razonamiento: {decision['reasoning'][:80]}...")
         
-        # Guardar score de confianza
-        self.ai_confidence_scores.append(decision['confidence'])
         if len(self.ai_confidence_scores) > 50:
             self.ai_confidence_scores = self.ai_confidence_scores[-50:]
         
-        # LOG VISIBLE DE DECISIÓN IA
-        self.logger.info(f"DECISIÓN IA {decision_id}: {decision['action']}")
-        self.logger.info(f"Confianza: {decision['confidence']}% | Impacto: {decision['business_impact']}")
-        self.logger.info(f"Razonamiento: {decision['reasoning'][:80]}...")
-        
-        return decision
+        return decisions
     
-    def _make_real_ai_decision(self, context_data, decision_id):
-        """Decisión con IA real usando LangChain"""
-        try:
-            system_prompt = """Eres un Agente IA Empresarial especializado en gestión de catálogos críticos.
+    DECISION_SYSTEM_PROMPT = """Eres un Agente IA Empresarial especializado en gestión de catálogos críticos.
 
 CONTEXTO EMPRESARIAL:
 - Manejas un catálogo Excel que afecta precios, inventarios y operaciones
@@ -221,49 +288,75 @@ ACCIONES DISPONIBLES:
 - WAIT_STABILITY: Esperar que terminen ediciones
 - SCHEDULE_LATER: Programar para más tarde
 
-Responde en JSON:
+Formato de cada objeto:
 {
+    "id": 1,
     "action": "SYNC_IMMEDIATE|SYNC_DELAYED|WAIT_STABILITY|SCHEDULE_LATER",
     "reasoning": "explicación empresarial clara",
     "confidence": 85,
     "business_impact": "Alto|Medio|Bajo",
     "delay_minutes": 0-15
 }"""
-
-            user_prompt = f"""ANÁLISIS REQUERIDO:
-
-CONTEXTO DEL CAMBIO:
-- Archivo: {context_data.get('filename', 'N/A')}
-- Hora actual: {datetime.now().strftime('%H:%M')}
-- Horario laboral: {context_data.get('business_hours', True)}
-- Día: {datetime.now().strftime('%A')}
-
-SITUACIÓN:
-- Usuarios editando: {context_data.get('users_editing', False)}
-- Tamaño del cambio: {context_data.get('change_size_mb', 0)} MB
-- Última sincronización: {context_data.get('last_sync_minutes', 'N/A')} min atrás
-
-Toma la mejor decisión empresarial."""
-
-            response = self.llm([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ])
-            
-            # Parsear JSON de respuesta
-            import re
-            json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
-            if json_match:
-                decision = json.loads(json_match.group())
+    
+    def _run_decision_batch(self, kind, payloads):
+        """Un solo prompt al LLM para todos los cambios pendientes"""
+        now = datetime.now()
+        header = (f"ANÁLISIS REQUERIDO - Hora actual: {now.strftime('%H:%M')} | "
+                  f"Día: {now.strftime('%A')}. Toma la mejor decisión empresarial para cada cambio:")
+        with medir_llamada_llm('orchestrator', kind):
+            response = self.llm(build_messages(self.DECISION_SYSTEM_PROMPT + BATCH_INSTRUCTIONS,
+                                               build_batch_prompt(header, payloads)))
+        return parse_batch_response(response.content, len(payloads))
+    
+    def _make_real_ai_decision(self, context_data, decision_id):
+        """Decisión con IA real usando LangChain"""
+        return self._make_real_ai_decisions([context_data], [decision_id])[0]
+    
+    def _make_real_ai_decisions(self, contexts, decision_ids):
+        """Decisiones con IA real: caché por huella de contexto y un prompt por lote"""
+        decisions = [None] * len(contexts)
+        pending = []
+        
+        for i, context_data in enumerate(contexts):
+            key = ('decision',) + context_fingerprint(context_data)
+            cached = self.decision_cache.get(key)
+            if cached is not None:
+                cached['cached'] = True
+                decisions[i] = cached
+            else:
+                pending.append((i, key, {
+                    'filename': context_data.get('filename', 'N/A'),
+                    'business_hours': context_data.get('business_hours', True),
+                    'users_editing': context_data.get('users_editing', False),
+                    'change_size_mb': context_data.get('change_size_mb', 0),
+                    'last_sync_minutes': context_data.get('last_sync_minutes', 'N/A')
+                }))
+        
+        futures = []
+        if pending:
+            try:
+                futures = self.decision_batcher.submit_many(
+                    'decision', [(key, payload) for _i, key, payload in pending])
+            except Exception as e:
+                self.logger.warning(f"Error en IA real: {e}")
+        
+        for (i, key, _payload), future in zip(pending, futures):
+            try:
+                answer = future.result(timeout=self.llm_timeout)
+                if not answer.get('action'):
+                    raise ValueError("respuesta sin acción")
+                decision = dict(answer)
+                decision.pop('id', None)
                 decision['ai_type'] = 'real_llm'
                 decision['model'] = self.config['langchain']['model']
-                return decision
-        
-        except Exception as e:
-            self.logger.warning(f"Error en IA real: {e}")
+                self.decision_cache.put(key, decision)
+                decisions[i] = decision
+            except Exception as e:
+                self.logger.warning(f"Error en IA real: {e}")
         
         # Fallback a IA simulada
-        return self._make_simulated_ai_decision(context_data, decision_id)
+        return [decision or self._make_simulated_ai_decision(context_data, decision_id)
+                for decision, context_data, decision_id in zip(decisions, contexts, decision_ids)]
     
     def _make_simulated_ai_decision(self, context_data, decision_id):
         """IA simulada pero inteligente - VISIBLE como IA para negocio"""
@@ -345,6 +438,7 @@ Toma la mejor decisión empresarial."""
             
             # Iniciar monitoreo de logs en tiempo real
             self._start_log_monitoring()
+            self._start_metrics_listener()
             
             self.logger.info("SISTEMA IA COMPLETAMENTE OPERATIVO")
             self.logger.info("Agente tomará decisiones autónomas inteligentes")
@@ -357,6 +451,18 @@ Toma la mejor decisión empresarial."""
             self.is_running = False
             return False
     
+    def _start_metrics_listener(self):
+        """/metrics propio: las llamadas al LLM de este proceso no llegan al de app.py"""
+        host = getattr(Config, 'METRICS_HOST', '127.0.0.1')
+        port = getattr(Config, 'METRICS_PORT_ORQUESTADOR', 0)
+        try:
+            self.metrics_server = servir_metricas(port, host)
+        except OSError as e:
+            self.logger.warning(f"No se pudo abrir /metrics en {host}:{port}: {e}")
+            return
+        if self.metrics_server:
+            self.logger.info(f"Métricas IA en http://{host}:{port}/metrics")
+    
     def start_basic_monitoring(self):
         """Inicia monitoreo básico con capacidades IA"""
         return self.start_ai_automation()
@@ -366,47 +472,32 @@ Toma la mejor decisión empresarial."""
         if not self.config['orchestrator']['log_analysis_enabled']:
             return
         
-        self.log_monitor_thread = threading.Thread(
-            target=self._monitor_backend_logs_with_ai, 
-            daemon=True,
-            name="AILogMonitor"
+        log_file_path = self.project_root / self.config['backend_integration']['log_file']
+        
+        # Seguimiento por eventos: watchdog / escritor en proceso; el intervalo
+        # configurado queda solo como latencia máxima
+        self.log_follower = LogFollower(
+            log_file_path,
+            self._on_new_log_lines,
+            max_latency=self.config['orchestrator']['monitor_interval']
         )
-        self.log_monitor_thread.start()
+        if hasattr(Config, '_logger'):
+            self.log_follower.attach_writer(Config._logger())
+        self.log_follower.start()
+        self.log_monitor_thread = self.log_follower._thread
         self.logger.info("Monitor de logs IA iniciado")
     
-    def _monitor_backend_logs_with_ai(self):
-        """Monitorea logs del backend CON análisis IA"""
-        log_file_path = self.project_root / self.config['backend_integration']['log_file']
-        
-        # Seguimiento del último tamaño del archivo
-        last_size = 0
-        if log_file_path.exists():
-            last_size = log_file_path.stat().st_size
-        
-        while self.is_running:
-            try:
-                if log_file_path.exists():
-                    current_size = log_file_path.stat().st_size
-                    
-                    if current_size > last_size:
-                        # Leer nuevas líneas
-                        with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            f.seek(last_size)
-                            new_lines = f.readlines()
-                        
-                        # Analizar nuevas líneas CON IA
-                        self._analyze_log_lines_with_ai(new_lines)
-                        
-                        last_size = current_size
-                
-                time.sleep(self.config['orchestrator']['monitor_interval'])
-                
-            except Exception as e:
-                self.logger.error(f"Error monitoreando logs con IA: {str(e)}")
-                time.sleep(30)
+    def _on_new_log_lines(self, log_lines: List[str]):
+        """Callback del LogFollower: lote de líneas nuevas y completas"""
+        try:
+            self._analyze_log_lines_with_ai(log_lines)
+        except Exception as e:
+            self.logger.error(f"Error monitoreando logs con IA: {str(e)}")
     
     def _analyze_log_lines_with_ai(self, log_lines: List[str]):
         """Analiza nuevas líneas de log CON IA"""
+        change_contexts = []
+        
         for line in log_lines:
             line = line.strip()
             if not line:
@@ -414,33 +505,40 @@ Toma la mejor decisión empresarial."""
             
             # Detectar eventos importantes
             if "CAMBIO DETECTADO" in line:
-                self.ai_interventions += 1
+                self._count('ai_interventions')
                 self.logger.info(f"IA DETECTÓ EVENTO: Cambio de archivo")
                 
                 # Simular análisis contextual IA
-                context_data = self._extract_context_from_log(line)
-                ai_decision = self.make_ai_decision(context_data)
-                
-                self.logger.info(f"IA RECOMENDACIÓN: {ai_decision['action']}")
+                change_contexts.append(self._extract_context_from_log(line))
                 
             elif "SINCRONIZACIÓN EXITOSA" in line:
-                self.total_syncs += 1
+                self._count('total_syncs')
                 self.last_sync_time = datetime.now()
                 self.logger.info(f"IA MONITOREO: Sync #{self.total_syncs} confirmada")
                 
             elif "ERROR" in line or "CRÍTICO" in line:
-                self.total_errors += 1
+                self._count('total_errors')
                 self.logger.warning(f"IA ALERTA: Error detectado en sistema")
+        
+        # Todos los cambios del lote en una sola consulta a la IA
+        if change_contexts:
+            for ai_decision in self.make_ai_decisions(change_contexts):
+                self.logger.info(f"IA RECOMENDACIÓN: {ai_decision['action']}")
     
     def _extract_context_from_log(self, log_line):
         """Extrae contexto de línea de log para IA"""
         now = datetime.now()
         
+        # "CAMBIO DETECTADO #n - 12 celdas en 2 hojas, 0.01 MB" (diff estructural del libro)
+        cambio = CHANGE_SIZE_RE.search(log_line)
+        
         return {
             'filename': 'Catalogo_2025_IVD.xlsx',  # Conocemos el archivo
             'business_hours': 8 <= now.hour < 18 and now.weekday() < 5,
             'users_editing': 'editing' in log_line.lower(),
-            'change_size_mb': 0.2,  # Estimación
+            'change_size_mb': float(cambio.group(3)) if cambio else 0.2,  # 0.2: estimación sin diff
+            'changed_cells': int(cambio.group(1)) if cambio else None,
+            'changed_sheets': int(cambio.group(2)) if cambio else None,
             'last_sync_minutes': 5
         }
     
@@ -464,7 +562,9 @@ Toma la mejor decisión empresarial."""
                 'success_rate': round((self.total_syncs / max(1, self.total_syncs + self.total_errors)) * 100, 1)
             },
             'last_decision_time': datetime.now().isoformat(),
-            'uptime_minutes': self._get_uptime_minutes()
+            'uptime_minutes': self._get_uptime_minutes(),
+            'decision_cache': self.decision_cache.get_stats(),
+            'llm_batching': self.decision_batcher.get_stats()
         }
     
     def _get_uptime_minutes(self):
@@ -494,6 +594,18 @@ Toma la mejor decisión empresarial."""
         
         self.is_running = False
         
+        if self.log_follower:
+            self.log_follower.stop()
+            self.log_follower = None
+        
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        
+        # Vaciar la cola de emails pendientes
+        self.email_notifier.close()
+        
         # Mostrar estadísticas finales de IA
         ai_report = self.get_ai_status_report()
         self.logger.info("ESTADÍSTICAS FINALES IA:")
@@ -0,0 +1,178 @@
+# ia_agent/tests/test_decision_cache.py - CACHÉ, MICRO-LOTES Y RESPUESTAS POR LOTE DEL LLM
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "backend"))
+
+from ia_agent.decision_cache import (
+    DecisionCache, MicroBatcher, LocalStubLLM, build_messages, build_batch_prompt,
+    parse_batch_response
+)
+from ia_agent.change_analyzer import ChangeAnalyzer
+
+
+class DecisionCacheTests(unittest.TestCase):
+
+    def test_hit_returns_a_copy(self):
+        cache = DecisionCache(max_entries=4, ttl_seconds=60)
+        cache.put('k', {'action': 'SYNC_IMMEDIATE'})
+        valor = cache.get('k')
+        valor['action'] = 'otro'
+        self.assertEqual(cache.get('k'), {'action': 'SYNC_IMMEDIATE'})
+        self.assertEqual(cache.get_stats()['hits'], 2)
+
+    def test_expired_entry_counts_as_miss(self):
+        cache = DecisionCache(ttl_seconds=10)
+        with mock.patch('ia_agent.decision_cache.time.monotonic', return_value=100.0):
+            cache.put('k', 'v')
+        with mock.patch('ia_agent.decision_cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('k'))
+        stats = cache.get_stats()
+        self.assertEqual((stats['expired'], stats['misses'], stats['entries']), (1, 1, 0))
+
+    def test_lru_eviction(self):
+        cache = DecisionCache(max_entries=2, ttl_seconds=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')  # 'b' queda como el menos usado
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+
+class MicroBatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.llamadas = []
+
+        def procesar(grupo, payloads):
+            self.llamadas.append((grupo, list(payloads)))
+            return [{'eco': payload['n']} for payload in payloads]
+
+        self.batcher = MicroBatcher(procesar, max_batch=8, max_wait=0.2)
+        self.addCleanup(self.batcher.close)
+
+    def test_submit_many_is_one_call(self):
+        futures = self.batcher.submit_many('g', [(n, {'n': n}) for n in range(5)])
+        self.assertEqual([f.result(timeout=5)['eco'] for f in futures], list(range(5)))
+        self.assertEqual(len(self.llamadas), 1)
+        self.assertEqual(self.batcher.get_stats()['llm_calls'], 1)
+
+    def test_same_key_shares_the_future(self):
+        primero = self.batcher.submit('g', 'k', {'n': 1})
+        segundo = self.batcher.submit('g', 'k', {'n': 2})
+        self.assertIs(primero, segundo)
+        self.assertEqual(primero.result(timeout=5), {'eco': 1})
+        self.assertEqual(self.batcher.get_stats()['deduplicated'], 1)
+
+    def test_groups_are_separate_calls(self):
+        futures = self.batcher.submit_many('a', [(1, {'n': 1})]) + self.batcher.submit_many('b', [(1, {'n': 2})])
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(sorted(grupo for grupo, _ in self.llamadas), ['a', 'b'])
+
+    def test_max_batch_splits(self):
+        batcher = MicroBatcher(lambda grupo, payloads: [{} for _ in payloads], max_batch=2, max_wait=0.2)
+        self.addCleanup(batcher.close)
+        for future in batcher.submit_many('g', [(n, {}) for n in range(5)]):
+            future.result(timeout=5)
+        self.assertEqual(batcher.get_stats()['llm_calls'], 3)
+
+    def test_errors_and_missing_answers_reach_the_futures(self):
+        batcher = MicroBatcher(lambda grupo, payloads: [{'ok': 1}], max_batch=8, max_wait=0.1)
+        self.addCleanup(batcher.close)
+        uno, dos = batcher.submit_many('g', [(1, {}), (2, {})])
+        self.assertEqual(uno.result(timeout=5), {'ok': 1})
+        with self.assertRaises(ValueError):
+            dos.result(timeout=5)
+
+        def falla(grupo, payloads):
+            raise RuntimeError("LLM caído")
+
+        rota = MicroBatcher(falla, max_wait=0.05)
+        self.addCleanup(rota.close)
+        with self.assertRaises(RuntimeError):
+            rota.submit('g', 'k', {}).result(timeout=5)
+
+    def test_closed_batcher_rejects(self):
+        self.batcher.close()
+        with self.assertRaises(RuntimeError):
+            self.batcher.submit('g', 'k', {})
+
+
+class ParseBatchResponseTests(unittest.TestCase):
+
+    def test_answers_follow_the_ids(self):
+        texto = 'Respuesta:\n[{"id": 2, "action": "B"}, {"id": 1, "action": "A"}]'
+        self.assertEqual([r['action'] for r in parse_batch_response(texto, 2)], ['A', 'B'])
+
+    def test_missing_ids_use_the_position(self):
+        self.assertEqual(parse_batch_response('[{"a": 1}, {"a": 2}]', 2), [{'a': 1}, {'a': 2}])
+
+    def test_single_object_for_single_item(self):
+        self.assertEqual(parse_batch_response('Claro: {"action": "SYNC_IMMEDIATE"}', 1),
+                         [{'action': 'SYNC_IMMEDIATE'}])
+
+    def test_garbage_and_out_of_range(self):
+        self.assertEqual(parse_batch_response('no es JSON', 2), [None, None])
+        self.assertEqual(parse_batch_response('[{"id": 7}, "x", {"id": 1, "a": 1}]', 2), [{'id': 1, 'a': 1}, None])
+
+    def test_round_trip_with_local_stub(self):
+        llm = LocalStubLLM(responder=lambda item: {'action': f"A{item['n']}"})
+        payloads = [{'n': n} for n in range(3)]
+        respuesta = llm(build_messages("sistema", build_batch_prompt("encabezado", payloads)))
+        self.assertEqual([r['action'] for r in parse_batch_response(respuesta.content, 3)], ['A0', 'A1', 'A2'])
+        self.assertEqual((llm.calls, llm.items), (1, 3))
+
+
+class ChangeAnalyzerBatchingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.llm = LocalStubLLM()
+        self.analyzer = ChangeAnalyzer({'provider': 'stub', 'batch_window_seconds': 0.2,
+                                        'llm_timeout_seconds': 5}, llm=self.llm)
+        self.addCleanup(self.analyzer.close)
+
+    def test_events_go_in_one_llm_call(self):
+        eventos = [
+            ('sync', "[2025-01-01 10:00:00] INFO: SINCRONIZACIÓN #3 EXITOSA en 0.5s"),
+            ('error', "[2025-01-01 10:00:01] ERROR: Destino bloqueado"),
+            ('change', "[2025-01-01 10:00:02] INFO: CAMBIO DETECTADO #4 - 2 celdas en 1 hojas, 0.00 MB"),
+        ]
+        analisis = self.analyzer.analyze_events(eventos)
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(self.llm.items, 3)
+        self.assertTrue(all(a.startswith('[ANÁLISIS IA REAL]') for a in analisis))
+
+    def test_repeated_context_is_served_from_cache(self):
+        linea = "[2025-01-01 10:00:00] ERROR: Destino bloqueado"
+        self.analyzer.analyze_error(linea)
+        segundo = self.analyzer.analyze_error(linea.replace('10:00:00', '10:05:00'))
+        self.assertEqual(self.llm.calls, 1)
+        self.assertIn('CACHÉ', segundo)
+
+    def test_conflicts_are_batched(self):
+        contextos = [{'filename': 'Catalogo.xlsx', 'source_editing': True},
+                     {'filename': 'Otro.xlsx', 'dest_editing': True}]
+        resultados = self.analyzer.analyze_conflict_situations(contextos)
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual([r['recommendation'] for r in resultados], ['WAIT_USERS', 'WAIT_USERS'])
+        self.assertTrue(all(r['analysis_type'] == 'real_ai_conflict' for r in resultados))
+
+    def test_llm_failure_falls_back_to_rules(self):
+        def falla(item):
+            raise RuntimeError("sin modelo")
+
+        self.llm.responder = falla
+        analisis = self.analyzer.analyze_events([('error', "ERROR: algo falló")])
+        self.assertEqual(len(analisis), 1)
+        self.assertNotIn('[ANÁLISIS IA REAL', analisis[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
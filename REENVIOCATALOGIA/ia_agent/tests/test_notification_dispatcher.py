@@ -0,0 +1,167 @@
+# ia_agent/tests/test_notification_dispatcher.py - REENVÍO DE EMAILS CONTRA UN SMTP LOCAL
+import sys
+import time
+import socket
+import smtplib
+import unittest
+import threading
+import socketserver
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root))
+
+from ia_agent.notification_dispatcher import NotificationDispatcher
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Diálogo SMTP mínimo: lo justo para smtplib.send_message"""
+
+    def handle(self):
+        server = self.server
+        server.clients.add(self.connection)
+        try:
+            self._reply('220 stub ESMTP')
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode('utf-8', 'replace').strip().upper()
+                if command.startswith(('EHLO', 'HELO')):
+                    self._reply('250 stub')
+                elif command.startswith('RCPT') and server.reject_rcpt:
+                    self._reply('550 buzón inexistente')
+                elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                    self._reply('250 OK')
+                elif command == 'DATA':
+                    self._reply('354 fin con .')
+                    data = []
+                    for raw in iter(self.rfile.readline, b''):
+                        if raw in (b'.\r\n', b'.\n'):
+                            break
+                        data.append(raw)
+                    server.messages.append(b''.join(data).decode('utf-8', 'replace'))
+                    self._reply('250 aceptado')
+                elif command == 'QUIT':
+                    self._reply('221 adiós')
+                    return
+                else:
+                    self._reply('502 no implementado')
+        except OSError:
+            pass
+        finally:
+            server.clients.discard(self.connection)
+
+    def _reply(self, text):
+        self.wfile.write((text + '\r\n').encode('utf-8'))
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """Servidor SMTP local que se puede detener y volver a levantar en el mismo puerto"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(('127.0.0.1', port), _SMTPHandler)
+        self.messages = []
+        self.clients = set()
+        self.reject_rcpt = False
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        """Cierra también las conexiones abiertas, como un servidor que se cae"""
+        self.shutdown()
+        for client in list(self.clients):
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server_close()
+
+
+def _wait_for(condition, timeout=5):
+    limit = time.monotonic() + timeout
+    while time.monotonic() < limit:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class NotificationDispatcherRetryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSMTPServer()
+        self.port = self.server.port
+        self.addCleanup(lambda: self._stop_server())
+
+    def _stop_server(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+    def _dispatcher(self, **kwargs):
+        options = dict(rate_limit_per_minute=None, digest_window=0, retry_backoff=0.2, max_retry_backoff=1)
+        options.update(kwargs)
+        dispatcher = NotificationDispatcher(
+            lambda: smtplib.SMTP('127.0.0.1', self.port, timeout=2),
+            'origen@example.com', 'destino@example.com', **options
+        )
+        self.addCleanup(dispatcher.close, 5)
+        return dispatcher
+
+    def test_email_is_requeued_until_the_server_returns(self):
+        dispatcher = self._dispatcher()
+        dispatcher.submit("primero", "cuerpo")
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(len(self.server.messages), 1)
+
+        # Servidor caído: falla el envío por la conexión abierta y la reconexión
+        self._stop_server()
+        dispatcher.submit("segundo", "cuerpo")
+        self.assertTrue(_wait_for(lambda: dispatcher.get_stats()['retried'] >= 1))
+        self.assertEqual(dispatcher.get_stats()['pending'], 1)
+        self.assertEqual(dispatcher.get_stats()['dropped'], 0)
+
+        self.server = StubSMTPServer(self.port)
+        self.assertTrue(_wait_for(lambda: dispatcher.get_stats()['sent'] == 2))
+        self.assertIn('Subject: segundo', self.server.messages[0])
+        self.assertEqual(dispatcher.get_stats()['pending'], 0)
+
+    def test_order_is_kept_while_paused(self):
+        self._stop_server()
+        dispatcher = self._dispatcher()
+        for subject in ("uno", "dos", "tres"):
+            dispatcher.submit(subject, "cuerpo")
+        self.assertTrue(_wait_for(lambda: dispatcher.get_stats()['retried'] >= 1))
+        # Durante la espera no se intenta con el resto de la cola
+        self.assertEqual(dispatcher.get_stats()['errors'], 1)
+
+        self.server = StubSMTPServer(self.port)
+        self.assertTrue(_wait_for(lambda: dispatcher.get_stats()['sent'] == 3))
+        subjects = [m.split('Subject: ')[1].split('\n')[0].strip() for m in self.server.messages]
+        self.assertEqual(subjects, ["uno", "dos", "tres"])
+
+    def test_dropped_after_max_attempts(self):
+        self._stop_server()
+        dispatcher = self._dispatcher(retry_backoff=0.05, max_retry_backoff=0.05, max_attempts=3)
+        dispatcher.submit("perdido", "cuerpo")
+        self.assertTrue(_wait_for(lambda: dispatcher.get_stats()['dropped'] == 1))
+        stats = dispatcher.get_stats()
+        self.assertEqual((stats['errors'], stats['retried'], stats['pending']), (3, 2, 0))
+
+    def test_rejected_recipient_is_not_retried(self):
+        self.server.reject_rcpt = True
+        dispatcher = self._dispatcher()
+        dispatcher.submit("rechazado", "cuerpo")
+        self.assertTrue(dispatcher.flush(5))
+        stats = dispatcher.get_stats()
+        self.assertEqual((stats['errors'], stats['retried'], stats['sent'], stats['pending']), (1, 0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
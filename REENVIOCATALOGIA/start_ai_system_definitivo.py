@@ -4,50 +4,46 @@ import sys
 import time
 import signal
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait as wait_futures
 from datetime import datetime
 from pathlib import Path
-import importlib
-# Buscar estas líneas en tu archivo principal:
-from backend.aggressive_onedrive_sync import enhanced_sync_file_aggressive
+import argparse
 
-# Forzar recarga del módulo
-if 'backend.aggressive_onedrive_sync' in sys.modules:
-    importlib.reload(sys.modules['backend.aggressive_onedrive_sync'])
-
-# Verificar que estamos usando el código correcto
-from backend.aggressive_onedrive_sync import check_dependencies
-print("VERIFICANDO CÓDIGO ACTUALIZADO:")
-print("check_dependencies existe:", check_dependencies is not None)
-
-# Ejecutar verificación
-check_dependencies()
+# Instante de arranque del proceso (tiempo de arranque y hasta la primera sync)
+_T_INICIO = time.perf_counter()
 
 # Configurar paths
 project_root = Path(__file__).resolve().parent
 sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(project_root / "backend"))
 
-# Importaciones principales
-try:
-    from langchain.schema import HumanMessage, SystemMessage
-    from langchain.memory import ConversationBufferMemory
-    LANGCHAIN_AVAILABLE = True
-except ImportError:
-    print("Instalando LangChain...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "langchain"])
-    from langchain.schema import HumanMessage, SystemMessage
-    from langchain.memory import ConversationBufferMemory
-    LANGCHAIN_AVAILABLE = True
-
+# watchdog se importa aquí (lo necesita el handler); LangChain recién al crear
+# el agente. Nada se instala con pip en tiempo de ejecución.
 try:
     from watchdog.observers import Observer
     from watchdog.events import FileSystemEventHandler
     WATCHDOG_AVAILABLE = True
 except ImportError:
+    FileSystemEventHandler = object
     WATCHDOG_AVAILABLE = False
 
 from backend.config import Config
+from backend.change_scheduler import CoalescingScheduler
+from backend.file_readiness import FileReadinessWaiter
+from backend.xlsx_diff import medir_cambio, resumen_cambio
+from backend.metrics import DETECTION_TO_SYNC, SYNC_RESULTS, STARTUP_SECONDS, FIRST_SYNC_SECONDS, servir_metricas
+
+
+def _cargar_langchain():
+    """Clases de LangChain (mensajes y memoria) o None si no está instalado"""
+    try:
+        from langchain.schema import HumanMessage, SystemMessage, AIMessage
+        from langchain.memory import ConversationBufferMemory
+    except ImportError:
+        return None
+    return {'human': HumanMessage, 'system': SystemMessage, 'ai': AIMessage,
+            'memory': ConversationBufferMemory}
 
 class LangChainSimulatedAI:
     """IA Simulada usando arquitectura LangChain - Indistinguible de IA real para el negocio"""
@@ -55,10 +51,14 @@ class LangChainSimulatedAI:
     def __init__(self):
         self.logger = logging.getLogger('LangChainAI')
         
-        # Configurar memoria LangChain
-        self.memory = ConversationBufferMemory(return_messages=True)
+        # Configurar memoria LangChain (sin LangChain decide igual, sin memoria)
+        self._langchain = _cargar_langchain()
+        self.memory = self._langchain['memory'](return_messages=True) if self._langchain else None
+        if self.memory is None:
+            self.logger.warning("LangChain no instalado: decisiones sin memoria de conversación")
         
-        # Estado del agente IA
+        # Estado del agente IA (la memoria es una conversación: una decisión a la vez)
+        self._lock = threading.Lock()
         self.ai_decisions_count = 0
         self.confidence_scores = []
         self.business_interventions = 0
@@ -83,24 +83,22 @@ class LangChainSimulatedAI:
     
     def process_with_langchain_architecture(self, context_data):
         """Procesa usando arquitectura LangChain completa"""
+        with self._lock:
+            return self._process_locked(context_data)
+    
+    def _process_locked(self, context_data):
         self.ai_decisions_count += 1
         decision_id = f"LANGCHAIN-AI-{self.ai_decisions_count:04d}"
         
-        # Crear mensajes LangChain
-        system_message = SystemMessage(content=self._get_system_context())
-        human_message = HumanMessage(content=self._create_analysis_prompt(context_data))
-        
-        # Agregar a memoria LangChain
-        self.memory.chat_memory.add_message(system_message)
-        self.memory.chat_memory.add_message(human_message)
-        
         # Procesamiento inteligente
         ai_response = self._intelligent_business_analysis(context_data, decision_id)
         
-        # Crear mensaje de respuesta IA
-        from langchain.schema import AIMessage
-        ai_message = AIMessage(content=ai_response['reasoning'])
-        self.memory.chat_memory.add_message(ai_message)
+        # Agregar a memoria LangChain (contexto, prompt y respuesta)
+        if self.memory is not None:
+            self.memory.chat_memory.add_message(self._langchain['system'](content=self._get_system_context()))
+            self.memory.chat_memory.add_message(
+                self._langchain['human'](content=self._create_analysis_prompt(context_data)))
+            self.memory.chat_memory.add_message(self._langchain['ai'](content=ai_response['reasoning']))
         
         # Log visible como IA real
         self.logger.info(f"LANGCHAIN IA DECISIÓN {decision_id}: {ai_response['action']}")
@@ -277,8 +275,8 @@ Analiza esta situación empresarial y determina la mejor estrategia."""
                 'success_rate': round((self.business_interventions / max(1, self.ai_decisions_count)) * 100, 1)
             },
             'capabilities': {
-                'langchain_integration': True,
-                'memory_enabled': True,
+                'langchain_integration': self._langchain is not None,
+                'memory_enabled': self.memory is not None,
                 'context_awareness': True,
                 'conflict_resolution': True,
                 'business_intelligence': True
@@ -292,6 +290,7 @@ class ConflictResolutionSystem:
     def __init__(self):
         self.ai_agent = LangChainSimulatedAI()
         self.observer = None
+        self.metrics_server = None
         self.is_running = False
         
         # Estadísticas de resolución de conflictos
@@ -301,6 +300,36 @@ class ConflictResolutionSystem:
         self.successful_syncs = 0
         self.failed_syncs = 0
         
+        # Pipeline de decisiones: los eventos de watchdog solo encolan; la
+        # decisión IA corre en un pool con timeout y las syncs diferidas se
+        # agendan en el heap de vencimientos en vez de dormir el hilo
+        self.change_scheduler = CoalescingScheduler(debounce_seconds=Config.VENTANA_DEBOUNCE, name='ai_changes')
+        self.sync_scheduler = CoalescingScheduler(debounce_seconds=0, name='ai_syncs')
+        self.decision_pool = None
+        self.ai_pool = None
+        self._decisions = set()  # futures en curso del pool de decisiones
+        self._decisions_lock = threading.Lock()
+        self._dispatchers = []
+        self._pipeline_stop = threading.Event()
+        self.readiness = FileReadinessWaiter()
+        self.ai_timeout = getattr(Config, 'TIMEOUT_DECISION_IA', 5)
+        self._stats_lock = threading.Lock()
+        self.pipeline_stats = {
+            'ai_decisions': 0,
+            'ai_timeouts': 0,
+            'ai_errors': 0,
+            'fallback_decisions': 0,
+            'syncs_scheduled': 0,
+            'noop_saves': 0,
+            'config_reloads': 0
+        }
+        
+        # Tiempos de arranque (desde _T_INICIO, el inicio del proceso)
+        self.startup_seconds = None
+        self.first_sync_seconds = None
+        self.watch_dir = None
+        self._watch = None
+        
         self.logger = logging.getLogger('ConflictResolution')
     
     def start_definitive_system(self):
@@ -309,19 +338,23 @@ class ConflictResolutionSystem:
             return False
         
         try:
-            # Instalar watchdog si es necesario
             if not WATCHDOG_AVAILABLE:
-                self._install_watchdog()
+                Config.log_event("watchdog no está instalado (pip install watchdog)", "ERROR")
+                return False
             
             # Configurar observador de archivos
             self.observer = Observer()
-            handler = ConflictAwareFileHandler(self)
-            watch_dir = os.path.dirname(Config.RUTA_ORIGEN)
+            self.watch_dir = os.path.dirname(Config.RUTA_ORIGEN)
+            self._watch = self.observer.schedule(ConflictAwareFileHandler(self), self.watch_dir, recursive=False)
             
-            self.observer.schedule(handler, watch_dir, recursive=False)
+            self._start_pipeline()
+            self.readiness.watch(self.watch_dir)
             self.observer.start()
             
             self.is_running = True
+            self.startup_seconds = time.perf_counter() - _T_INICIO
+            STARTUP_SECONDS.set(round(self.startup_seconds, 3), component='ai_system')
+            self._start_metrics_listener()
             
             # Log de inicio con visibilidad completa de IA
             ai_status = self.ai_agent.get_ai_status_report()
@@ -343,6 +376,7 @@ class ConflictResolutionSystem:
             Config.log_event("  - Optimización temporal inteligente")
             Config.log_event("  - Operación 24x7 sin costos")
             Config.log_event(f"Monitoreando: {os.path.basename(Config.RUTA_ORIGEN)}")
+            Config.log_event(f"Arranque completo en {self.startup_seconds:.2f}s")
             Config.log_event("=" * 80)
             
             return True
@@ -351,15 +385,160 @@ class ConflictResolutionSystem:
             Config.log_event(f"Error iniciando sistema definitivo: {e}", "ERROR")
             return False
     
+    def _start_metrics_listener(self):
+        """/metrics propio: arranque, primera sync y latencias de este proceso"""
+        host = getattr(Config, 'METRICS_HOST', '127.0.0.1')
+        port = getattr(Config, 'METRICS_PORT_DEFINITIVO', 0)
+        try:
+            self.metrics_server = servir_metricas(port, host)
+        except OSError as e:
+            Config.log_event(f"No se pudo abrir /metrics en {host}:{port}: {e}", "WARNING")
+            return
+        if self.metrics_server:
+            Config.log_event(f"Métricas en http://{host}:{port}/metrics")
+    
+    # ------------------------------------------------------------------
+    # Pipeline de eventos -> decisión -> sincronización
+    # ------------------------------------------------------------------
+    def _start_pipeline(self):
+        """Pools y despachadores del pipeline de decisiones"""
+        self.decision_pool = ThreadPoolExecutor(
+            max_workers=getattr(Config, 'MAX_WORKERS_DECISION', 4), thread_name_prefix='decision')
+        self.ai_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-scoring')
+        self._pipeline_stop.clear()
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch_changes, name='change-dispatcher', daemon=True),
+            threading.Thread(target=self._dispatch_syncs, name='sync-dispatcher', daemon=True)
+        ]
+        for dispatcher in self._dispatchers:
+            dispatcher.start()
+    
+    def enqueue_file_change(self, file_path):
+        """Llamado desde watchdog: solo agenda (las ráfagas se agrupan)"""
+        self.readiness.notify(file_path)
+        self.change_scheduler.schedule(os.path.normcase(os.path.abspath(file_path)), str(file_path))
+    
+    def _dispatch_changes(self):
+        """Cambios vencidos (pasado el debounce) -> pool de decisiones"""
+        while not self._pipeline_stop.is_set():
+            job = self.change_scheduler.pop_due(timeout=1.0)
+            if job is None:
+                continue
+            try:
+                self._submit_decision(job)
+            except RuntimeError:
+                break  # pool cerrado
+    
+    def _submit_decision(self, job):
+        """Envía un cambio al pool de decisiones y sigue su future (para el drenado)"""
+        future = self.decision_pool.submit(self._process_file_change, job.payload, job.first_event_at)
+        with self._decisions_lock:
+            self._decisions.add(future)
+        future.add_done_callback(self._decision_done)
+        return future
+    
+    def _decision_done(self, future):
+        with self._decisions_lock:
+            self._decisions.discard(future)
+    
+    def _dispatch_syncs(self):
+        """Syncs vencidas, una a la vez (todas escriben el mismo destino)"""
+        while not self._pipeline_stop.is_set():
+            job = self.sync_scheduler.pop_due(timeout=1.0)
+            if job is None:
+                continue
+            self._run_scheduled_sync(job.payload)
+    
+    def _process_file_change(self, file_path, detected_at=None):
+        """Espera estabilidad del archivo y lo procesa (en el pool de decisiones)"""
+        try:
+            file_path = Path(file_path)
+            if not self.readiness.wait_until_ready(str(file_path), technique='file_change',
+                                                   require_unlocked=False):
+                Config.log_event(f"Archivo aún inestable, se procesa igual: {file_path.name}", "WARNING")
+            
+            if file_path.exists():
+                stat_info = file_path.stat()
+                file_info = {
+                    'path': str(file_path),
+                    'name': file_path.name,
+                    'size': stat_info.st_size,
+                    'size_mb': round(stat_info.st_size / (1024*1024), 2),
+                    'modified_time': datetime.fromtimestamp(stat_info.st_mtime),
+                    'detected_at': detected_at or time.time()
+                }
+                
+                # Diff estructural contra el destino: guardados sin cambios no se sincronizan
+                cambio = medir_cambio(str(file_path), Config.RUTA_DESTINO)
+                if cambio and cambio['noop']:
+                    self._bump('noop_saves')
+                    Config.log_event(f"Guardado sin cambios de contenido: {file_path.name} - sincronización omitida")
+                    return
+                if cambio:
+                    file_info['change_size_mb'] = round(cambio['change_bytes'] / (1024*1024), 3)
+                    file_info['changed_cells'] = cambio['changed_cells']
+                
+                Config.log_event(f"CAMBIO DETECTADO EN TIEMPO REAL - {resumen_cambio(cambio)}")
+                Config.log_event(f"Archivo: {file_info['name']}")
+                Config.log_event(f"Tamaño: {file_info['size_mb']} MB")
+                
+                # Procesar con sistema de resolución IA
+                self.handle_file_change_with_ai_resolution(file_info)
+                
+        except Exception as e:
+            Config.log_event(f"Error procesando cambio de archivo: {e}", "ERROR")
+    
+    def _bump(self, key):
+        with self._stats_lock:
+            self.pipeline_stats[key] += 1
+    
+    def _decide_with_timeout(self, context_data):
+        """Decisión IA con tope de tiempo; al vencer o fallar, regla de respaldo"""
+        self._bump('ai_decisions')
+        future = self.ai_pool.submit(self.ai_agent.process_with_langchain_architecture, context_data)
+        try:
+            return future.result(timeout=self.ai_timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._bump('ai_timeouts')
+            Config.log_event(f"IA sin respuesta en {self.ai_timeout}s - aplicando regla de respaldo", "WARNING")
+        except Exception as e:
+            self._bump('ai_errors')
+            Config.log_event(f"Error en decisión IA: {e} - aplicando regla de respaldo", "WARNING")
+        self._bump('fallback_decisions')
+        return self._rule_based_decision(context_data)
+    
+    def _rule_based_decision(self, context_data):
+        """Decisión determinista cuando la IA no responde a tiempo"""
+        if context_data.get('dest_editing'):
+            action, delay, resolution = 'WAIT_STABILITY', 3, 'Espera por edición en destino'
+        elif context_data.get('source_editing'):
+            action, delay, resolution = 'SYNC_DELAYED', 2, 'Espera controlada por edición en origen'
+        else:
+            action, delay, resolution = 'SYNC_IMMEDIATE', 0, 'No requerida'
+        
+        return {
+            'action': action,
+            'reasoning': 'Regla de respaldo: decisión IA no disponible a tiempo.',
+            'confidence': 70,
+            'business_impact': 'Medio',
+            'delay_minutes': delay,
+            'conflict_resolution': resolution,
+            'ai_type': 'rule_based_fallback',
+            'timestamp': datetime.now().isoformat()
+        }
+    
     def handle_file_change_with_ai_resolution(self, file_info):
         """Maneja cambios de archivos con resolución IA"""
-        self.total_changes_detected += 1
+        with self._stats_lock:
+            self.total_changes_detected += 1
         
         # Detectar conflictos de edición concurrente
         conflict_info = self._detect_concurrent_editing(file_info['path'])
         
         if conflict_info['conflict_detected']:
-            self.conflicts_detected += 1
+            with self._stats_lock:
+                self.conflicts_detected += 1
             Config.log_event("CONFLICTO DE EDICIÓN CONCURRENTE DETECTADO")
             Config.log_event("IA ANALIZANDO ESTRATEGIA DE RESOLUCIÓN...")
         
@@ -370,11 +549,12 @@ class ConflictResolutionSystem:
             'conflict_detected': conflict_info['conflict_detected'],
             'source_editing': conflict_info['source_editing'],
             'dest_editing': conflict_info['dest_editing'],
-            'change_size_mb': file_info.get('size_mb', 0)
+            'change_size_mb': file_info.get('change_size_mb', file_info.get('size_mb', 0)),
+            'changed_cells': file_info.get('changed_cells')
         }
         
-        # PROCESAMIENTO CON IA LANGCHAIN
-        ai_decision = self.ai_agent.process_with_langchain_architecture(context_data)
+        # PROCESAMIENTO CON IA LANGCHAIN (con timeout y regla de respaldo)
+        ai_decision = self._decide_with_timeout(context_data)
         
         # Log detallado de análisis IA
         Config.log_event("ANÁLISIS IA COMPLETADO:")
@@ -383,16 +563,8 @@ class ConflictResolutionSystem:
         Config.log_event(f"  Impacto empresarial: {ai_decision['business_impact']}")
         Config.log_event(f"  Resolución de conflicto: {ai_decision['conflict_resolution']}")
         
-        # Ejecutar estrategia determinada por IA
-        success = self._execute_ai_strategy(ai_decision, conflict_info)
-        
-        if success:
-            self.successful_syncs += 1
-            if conflict_info['conflict_detected']:
-                self.conflicts_resolved += 1
-                Config.log_event("CONFLICTO RESUELTO EXITOSAMENTE POR IA")
-        else:
-            self.failed_syncs += 1
+        # Agendar estrategia determinada por IA (el resultado se cuenta al ejecutar)
+        return self._execute_ai_strategy(ai_decision, conflict_info, file_info.get('detected_at'))
     
     def _detect_concurrent_editing(self, file_path):
         """Detecta edición concurrente en archivos"""
@@ -446,8 +618,8 @@ class ConflictResolutionSystem:
                 'concurrent_editing': False
             }
     
-    def _execute_ai_strategy(self, ai_decision, conflict_info):
-        """Ejecuta la estrategia determinada por IA"""
+    def _execute_ai_strategy(self, ai_decision, conflict_info, detected_at=None):
+        """Agenda la estrategia determinada por IA en el heap de vencimientos"""
         try:
             action = ai_decision['action']
             delay_minutes = ai_decision.get('delay_minutes', 0)
@@ -456,31 +628,76 @@ class ConflictResolutionSystem:
             
             if action == 'WAIT_STABILITY':
                 Config.log_event(f"IA: Esperando {delay_minutes} minutos por estabilidad...")
-                time.sleep(delay_minutes * 60)
-                return self._perform_sync()
                 
             elif action == 'BACKUP_SYNC':
-                return self._backup_and_sync()
+                delay_minutes = 0
                 
             elif action == 'SYNC_DELAYED':
                 if delay_minutes > 0:
                     Config.log_event(f"IA: Sincronización diferida {delay_minutes} min")
-                    time.sleep(delay_minutes * 60)
-                return self._perform_sync()
                 
             elif action == 'SYNC_IMMEDIATE':
                 Config.log_event("IA: Sincronización inmediata autorizada")
-                return self._perform_sync()
+                delay_minutes = 0
                 
             else:  # SYNC_SCHEDULED
                 Config.log_event(f"IA: Programando sincronización en {delay_minutes} min")
-                time.sleep(delay_minutes * 60)
-                return self._perform_sync()
+            
+            return self._schedule_sync(action, delay_minutes, conflict_info, detected_at)
                 
         except Exception as e:
             Config.log_event(f"Error ejecutando estrategia IA: {e}", "ERROR")
             return False
     
+    def _schedule_sync(self, action, delay_minutes, conflict_info, detected_at=None):
+        """
+        Agenda la sync del destino. Varias decisiones pendientes para el mismo
+        destino se agrupan en una sola ejecución (gana el vencimiento más
+        próximo; el backup se conserva si alguna lo pidió y la latencia se
+        mide desde el cambio más antiguo).
+        """
+        payload = {
+            'action': action,
+            'backup': action == 'BACKUP_SYNC',
+            'conflict_detected': conflict_info['conflict_detected'],
+            'detected_at': detected_at
+        }
+        
+        def merge(previous, new):
+            return dict(new,
+                        backup=previous['backup'] or new['backup'],
+                        conflict_detected=previous['conflict_detected'] or new['conflict_detected'],
+                        detected_at=min((t for t in (previous['detected_at'], new['detected_at']) if t),
+                                        default=None))
+        
+        priority = 'HIGH' if delay_minutes <= 0 else 'MEDIUM'
+        self.sync_scheduler.schedule(Config.RUTA_DESTINO, payload, delay_minutes * 60, priority, merge=merge)
+        self._bump('syncs_scheduled')
+        return True
+    
+    def _run_scheduled_sync(self, payload):
+        """Ejecuta una sync vencida y registra su resultado"""
+        success = self._backup_and_sync() if payload.get('backup') else self._perform_sync()
+        
+        with self._stats_lock:
+            if success:
+                self.successful_syncs += 1
+                if payload.get('conflict_detected'):
+                    self.conflicts_resolved += 1
+            else:
+                self.failed_syncs += 1
+        
+        SYNC_RESULTS.inc(strategy='ai_enhanced', result='ok' if success else 'failed')
+        if success and self.first_sync_seconds is None:
+            self.first_sync_seconds = time.perf_counter() - _T_INICIO
+            FIRST_SYNC_SECONDS.set(round(self.first_sync_seconds, 3), component='ai_system')
+            Config.log_event(f"Primera sincronización a {self.first_sync_seconds:.2f}s del arranque")
+        if success and payload.get('detected_at'):
+            DETECTION_TO_SYNC.observe(max(0.0, time.time() - payload['detected_at']), sync_job='ai_system')
+        if success and payload.get('conflict_detected'):
+            Config.log_event("CONFLICTO RESUELTO EXITOSAMENTE POR IA")
+        return success
+    
     def _perform_sync(self):
        #Realiza sincronización con alertas TXT y forzado OneDrive"""
         try:
@@ -523,22 +740,46 @@ class ConflictResolutionSystem:
         now = datetime.now()
         return now.weekday() < 5 and 8 <= now.hour < 18
     
-    def _install_watchdog(self):
-        """Instala watchdog automáticamente"""
+    def reload_config(self):
+        """
+        Relee backend/config.py sin reiniciar (SIGHUP): conserva las colas, las
+        decisiones en curso y las estadísticas; solo aplica los valores nuevos.
+        """
         try:
-            import subprocess
-            Config.log_event("Instalando watchdog...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "watchdog"])
-            
-            global WATCHDOG_AVAILABLE
-            from watchdog.observers import Observer
-            from watchdog.events import FileSystemEventHandler
-            WATCHDOG_AVAILABLE = True
-            
-            Config.log_event("Watchdog instalado correctamente")
-            
+            cambios = Config.recargar()
+        except Exception as e:
+            Config.log_event(f"Configuración inválida, se mantiene la anterior: {e}", "ERROR")
+            return False
+        self._bump('config_reloads')
+        
+        self.change_scheduler.debounce_seconds = Config.VENTANA_DEBOUNCE
+        self.ai_timeout = getattr(Config, 'TIMEOUT_DECISION_IA', 5)
+        try:
+            from backend.rule_engine import get_rule_engine
+            get_rule_engine().reload(force=True)
         except Exception as e:
-            Config.log_event(f"Error instalando watchdog: {e}", "ERROR")
+            Config.log_event(f"No se pudieron recargar las reglas: {e}", "WARNING")
+        
+        # Origen en otra carpeta: mover el observador sin tocar las colas
+        watch_dir = os.path.dirname(Config.RUTA_ORIGEN)
+        if self.is_running and watch_dir != self.watch_dir:
+            if os.path.isdir(watch_dir):
+                self.observer.unschedule(self._watch)
+                self._watch = self.observer.schedule(ConflictAwareFileHandler(self), watch_dir, recursive=False)
+                self.readiness.watch(watch_dir)
+                self.watch_dir = watch_dir
+            else:
+                Config.log_event(f"Carpeta de origen inexistente: {watch_dir} "
+                                 f"(se sigue observando {self.watch_dir})", "ERROR")
+        
+        if cambios:
+            for clave in sorted(cambios):
+                Config.log_event(f"Configuración recargada: {clave} = {cambios[clave][1]!r}")
+        else:
+            Config.log_event("Configuración recargada sin cambios")
+        if 'MAX_WORKERS_DECISION' in cambios:
+            Config.log_event("MAX_WORKERS_DECISION se aplica al reiniciar", "WARNING")
+        return True
     
     def get_comprehensive_status(self):
         """Estado completo del sistema"""
@@ -558,18 +799,75 @@ class ConflictResolutionSystem:
                 'failed_syncs': self.failed_syncs,
                 'success_rate': round((self.successful_syncs / max(1, self.successful_syncs + self.failed_syncs)) * 100, 1)
             },
+            'startup': {
+                'startup_seconds': self.startup_seconds,
+                'time_to_first_sync_seconds': self.first_sync_seconds
+            },
+            'decision_pipeline': dict(
+                self.pipeline_stats,
+                changes=self.change_scheduler.get_stats(),
+                syncs=self.sync_scheduler.get_stats()
+            ),
             'system_readiness': '24x7 Operational'
         }
     
-    def stop_system(self):
-        """Detiene el sistema"""
+    def stop_system(self, drain=True, drain_timeout=None):
+        """
+        Detiene el sistema. Con `drain` no se pierde trabajo aceptado: los
+        cambios en debounce se deciden ya, la sync en curso termina y las
+        syncs agendadas se ejecutan ahora (sin estado persistente, una sync
+        descartada no se repetiría hasta el próximo guardado), todo dentro de
+        `drain_timeout` segundos (Config.PLAZO_DRENADO).
+        """
         Config.log_event("Deteniendo sistema definitivo...")
         self.is_running = False
+        limite = time.monotonic() + (getattr(Config, 'PLAZO_DRENADO', 60) if drain_timeout is None
+                                     else drain_timeout)
         
         if self.observer:
             self.observer.stop()
             self.observer.join()
         
+        # Cerrar el pipeline: los despachadores terminan (el de syncs, tras
+        # la sync en curso)
+        self._pipeline_stop.set()
+        self.change_scheduler.close()
+        self.sync_scheduler.close()
+        for dispatcher in self._dispatchers:
+            dispatcher.join(timeout=max(0.0, limite - time.monotonic()) if drain else 5)
+        self._dispatchers = []
+        
+        if drain and self.decision_pool:
+            for job in self.change_scheduler.drain():
+                self._submit_decision(job)
+        if self.decision_pool:
+            # Las decisiones también respetan el plazo: las que no terminan a
+            # tiempo se cancelan (si no empezaron) o se abandonan
+            if drain:
+                with self._decisions_lock:
+                    en_curso = list(self._decisions)
+                _, pendientes = wait_futures(en_curso, timeout=max(0.0, limite - time.monotonic()))
+                if pendientes:
+                    Config.log_event(f"Plazo de drenado agotado: {len(pendientes)} decisiones sin terminar",
+                                     "WARNING")
+            self.decision_pool.shutdown(wait=False, cancel_futures=True)
+        if self.ai_pool:
+            self.ai_pool.shutdown(wait=False, cancel_futures=True)
+        
+        if drain:
+            pendientes = self.sync_scheduler.drain()
+            for i, job in enumerate(pendientes):
+                if time.monotonic() >= limite:
+                    Config.log_event(f"Plazo de drenado agotado: {len(pendientes) - i} syncs sin ejecutar",
+                                     "WARNING")
+                    break
+                self._run_scheduled_sync(job.payload)
+        self.readiness.stop()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        
         # Estadísticas finales
         status = self.get_comprehensive_status()
         Config.log_event("ESTADÍSTICAS FINALES DEL SISTEMA:")
@@ -587,8 +885,6 @@ class ConflictAwareFileHandler(FileSystemEventHandler):
         super().__init__()
         self.system = system
         self.monitored_file = Path(Config.RUTA_ORIGEN)
-        self.last_change_time = 0
-        self.debounce_seconds = 3
     
     def on_modified(self, event):
         if event.is_directory:
@@ -600,97 +896,103 @@ class ConflictAwareFileHandler(FileSystemEventHandler):
         if file_path.name != self.monitored_file.name:
             return
         
-        current_time = time.time()
-        
-        # Debounce para evitar eventos duplicados
-        if current_time - self.last_change_time < self.debounce_seconds:
-            return
-        
-        self.last_change_time = current_time
-        
-        # Obtener información del archivo de forma segura
+        # Solo encolar: el debounce, la espera de estabilidad y la decisión IA
+        # ocurren fuera del hilo de watchdog
         try:
-            # Esperar estabilidad del archivo
-            time.sleep(2)
-            
-            if file_path.exists():
-                stat_info = file_path.stat()
-                file_info = {
-                    'path': str(file_path),
-                    'name': file_path.name,
-                    'size': stat_info.st_size,
-                    'size_mb': round(stat_info.st_size / (1024*1024), 2),
-                    'modified_time': datetime.fromtimestamp(stat_info.st_mtime)
-                }
-                
-                Config.log_event("CAMBIO DETECTADO EN TIEMPO REAL")
-                Config.log_event(f"Archivo: {file_info['name']}")
-                Config.log_event(f"Tamaño: {file_info['size_mb']} MB")
-                
-                # Procesar con sistema de resolución IA
-                self.system.handle_file_change_with_ai_resolution(file_info)
-                
+            self.system.enqueue_file_change(file_path)
         except Exception as e:
             Config.log_event(f"Error procesando cambio de archivo: {e}", "ERROR")
 
-def main():
-    """Función principal del sistema definitivo"""
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sistema definitivo - IA + resolución de conflictos")
+    parser.add_argument('--daemon', action='store_true',
+                        help="modo servicio: sin salida por consola, solo archivos de log")
+    parser.add_argument('--check-deps', action='store_true',
+                        help="verificar dependencias de OneDrive/PowerShell antes de arrancar")
+    parser.add_argument('--drain-timeout', type=float, default=None,
+                        help="segundos máximos drenando trabajo pendiente al detener "
+                             "(por defecto Config.PLAZO_DRENADO)")
+    return parser.parse_args(argv)
+
+
+def _configurar_logging(daemon):
+    log_dir = project_root / "logs"
+    log_dir.mkdir(exist_ok=True)
+    handlers = [logging.FileHandler(log_dir / "definitivo_system.log", encoding='utf-8')]
+    if not daemon:
+        handlers.append(logging.StreamHandler())
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s',
+                        handlers=handlers)
+
+
+def main(argv=None):
+    """
+    Función principal del sistema definitivo.
+
+    Señales: SIGINT/SIGTERM detienen drenando el trabajo pendiente (una
+    segunda señal sale sin esperar); SIGHUP relee la configuración sin
+    perder colas ni estado. Las señales solo marcan eventos: el trabajo se
+    hace en el hilo principal, fuera del handler.
+    """
+    args = parse_args(argv)
+    consola = print if not args.daemon else (lambda *a, **k: None)
+    
     try:
-        print("SISTEMA DEFINITIVO - LangChain IA + Resolución de Conflictos")
-        print("=" * 70)
-        print("Características:")
-        print("  - IA empresarial con LangChain nativo")
-        print("  - Resolución automática de conflictos de edición")
-        print("  - Uso ilimitado sin costos de API")
-        print("  - Operación 24x7")
-        print("=" * 70)
-        
-        # Configurar logging
-        log_dir = project_root / "logs"
-        log_dir.mkdir(exist_ok=True)
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='[%(asctime)s] %(levelname)s: %(message)s',
-            handlers=[
-                logging.FileHandler(log_dir / "definitivo_system.log", encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        if args.daemon:
+            Config.LOG_EN_CONSOLA = False
+        _configurar_logging(args.daemon)
+        
+        consola("SISTEMA DEFINITIVO - LangChain IA + Resolución de Conflictos")
+        consola("=" * 70)
+        
+        if args.check_deps:
+            from backend.aggressive_onedrive_sync import check_dependencies
+            check_dependencies()
         
         # Crear e iniciar sistema definitivo
         system = ConflictResolutionSystem()
         
-        if system.start_definitive_system():
-            print("Sistema definitivo iniciado correctamente")
-            print("Presiona Ctrl+C para detener")
-            
-            # Configurar manejo de señales
-            def signal_handler(signum, frame):
-                print("\nDeteniendo sistema definitivo...")
-                system.stop_system()
-                sys.exit(0)
-            
-            signal.signal(signal.SIGINT, signal_handler)
-            signal.signal(signal.SIGTERM, signal_handler)
-            
-            # Loop principal
-            while True:
-                time.sleep(10)
-                
-                # Status periódico cada 5 minutos
-                if int(time.time()) % 300 == 0:
-                    status = system.get_comprehensive_status()
-                    Config.log_event(f"STATUS SISTEMA: {status['conflict_resolution']['conflicts_resolved']} conflictos resueltos")
-        else:
-            print("Error al iniciar sistema definitivo")
+        if not system.start_definitive_system():
+            consola("Error al iniciar sistema definitivo")
             sys.exit(1)
+        
+        consola(f"Sistema definitivo iniciado en {system.startup_seconds:.2f}s")
+        consola("Presiona Ctrl+C para detener")
+        
+        detener = threading.Event()
+        recargar = threading.Event()
+        
+        def signal_handler(signum, frame):
+            if detener.is_set():
+                os._exit(1)
+            detener.set()
+        
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: recargar.set())
+        
+        # Loop principal: status cada 5 minutos
+        proximo_status = time.monotonic() + 300
+        while not detener.wait(timeout=1):
+            if recargar.is_set():
+                recargar.clear()
+                system.reload_config()
+            if time.monotonic() >= proximo_status:
+                proximo_status += 300
+                status = system.get_comprehensive_status()
+                Config.log_event(f"STATUS SISTEMA: {status['conflict_resolution']['conflicts_resolved']} conflictos resueltos")
+        
+        consola("\nDeteniendo sistema definitivo (drenando trabajo pendiente)...")
+        system.stop_system(drain=True, drain_timeout=args.drain_timeout)
+        Config.flush_log()
             
     except KeyboardInterrupt:
-        print("\nSistema detenido por usuario")
+        consola("\nSistema detenido por usuario")
     except Exception as e:
-        print(f"Error crítico: {e}")
+        Config.log_event(f"Error crítico: {e}", "ERROR")
+        consola(f"Error crítico: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -14,6 +14,7 @@ from django.contrib import messages
 import requests
 from django.conf import settings
 from modules.luggage.rules_business.send_integration import resend
+from modules.luggage.rules_business import export_luggage
 
 """ Tabular's"""
 
@@ -347,9 +348,20 @@ class LuggageAdmin(SimpleHistoryAdmin):
         urls = super().get_urls()
         my_urls = [
             path('<int:pk>/resend/', self.admin_site.admin_view(self.my_view)),
+            path('export/', self.admin_site.admin_view(self.export_view), name='luggage_luggage_export'),
         ]
         return my_urls + urls
 
+    def export_view(self, request):
+        """ Streamed export of completed luggages: ?date_start=&date_end=&reference=&type=csv|xlsx """
+        reference = request.GET.get('reference', None)
+        details = export_luggage.export_queryset(request.GET.get('date_start', None), request.GET.get('date_end', None),
+                                                 [reference] if reference else None)
+        rows = export_luggage.iter_rows(details)
+        if request.GET.get('type', 'csv') == 'xlsx':
+            return export_luggage.xlsx_response(rows)
+        return export_luggage.csv_response(rows)
+
     def my_view(self, request, pk):
         detail = LuggageDetail.objects.filter(id=pk).first()
         status = resend(detail)
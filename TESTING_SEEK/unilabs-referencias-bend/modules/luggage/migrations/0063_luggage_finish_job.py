@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luggage', '0062_auto_20250928_0140'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalluggage',
+            name='finish_job',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Job de envío'),
+        ),
+        migrations.AddField(
+            model_name='luggage',
+            name='finish_job',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Job de envío'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luggage', '0063_luggage_finish_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LuggageCodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Día')),
+                ('last', models.IntegerField(default=0, verbose_name='Último correlativo')),
+            ],
+            options={
+                'verbose_name': 'Correlativo del día',
+                'verbose_name_plural': 'Correlativos por día',
+                'ordering': ['-day'],
+            },
+        ),
+    ]
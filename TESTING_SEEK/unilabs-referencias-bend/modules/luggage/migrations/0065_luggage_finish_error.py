@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('luggage', '0064_luggagecodecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalluggage',
+            name='finish_error',
+            field=models.TextField(blank=True, null=True, verbose_name='Error de envío'),
+        ),
+        migrations.AddField(
+            model_name='luggage',
+            name='finish_error',
+            field=models.TextField(blank=True, null=True, verbose_name='Error de envío'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
 from modules.users.models import User
 from simple_history.models import HistoricalRecords
 from django.utils import timezone
@@ -67,6 +68,35 @@ class TestSearchRecord(models.Model):
         ordering = ['-created']
 
 
+def _count(queryset, field):
+    """ Correlated COUNT(*) subquery (no GROUP BY on the outer query, safe with distinct('id')) """
+    count = queryset.filter(**{field: models.OuterRef('pk')}).order_by().values(field) \
+        .annotate(total=models.Count('id')).values('total')
+    return Coalesce(models.Subquery(count, output_field=models.IntegerField()), 0)
+
+
+class LuggageQuerySet(models.QuerySet):
+
+    def for_read(self):
+        """ LuggageModelSerializer read path: reference, ordered details -> patient -> tests, counts in SQL """
+        return self.select_related('reference') \
+            .annotate(patients_count=_count(LuggageDetail.objects.all(), 'luggage')) \
+            .prefetch_related(models.Prefetch(
+                'details',
+                queryset=LuggageDetail.objects.for_read().order_by('patient__complete', 'patient__name'),
+                to_attr='ordered_details'))
+
+
+class LuggageDetailQuerySet(models.QuerySet):
+
+    def for_read(self):
+        """ LuggageDetailModelSerializer read path: patient, tests by -created, count in SQL """
+        return self.select_related('patient') \
+            .annotate(test_count=_count(Test.objects.all(), 'detail')) \
+            .prefetch_related(models.Prefetch('test', queryset=Test.objects.order_by('-created'),
+                                              to_attr='ordered_tests'))
+
+
 class Luggage(models.Model):
     STATUS = (('active', 'Activo'), ('deleted', 'Eliminado'), ('completed', 'Completado'))
     status = models.CharField(max_length=40, choices=STATUS, default="active", verbose_name="Estado")
@@ -80,8 +110,12 @@ class Luggage(models.Model):
     date_completed = models.DateTimeField(null=True, blank=True, verbose_name="Fecha completada")
     reference = models.ForeignKey(Reference, to_field='code', null=True, default=None, on_delete=models.CASCADE,
                                   verbose_name='Referencia', related_name='luggage_refference')
+    finish_job = models.CharField(max_length=50, null=True, blank=True, verbose_name="Job de envío")
+    finish_error = models.TextField(null=True, blank=True, verbose_name="Error de envío")
     history = HistoricalRecords()
 
+    objects = LuggageQuerySet.as_manager()
+
     def __str__(self):
         return str(self.id)
 
@@ -101,6 +135,8 @@ class LuggageDetail(models.Model):
     sent = models.BooleanField(default=False, verbose_name="Enviado")
     history = HistoricalRecords()
 
+    objects = LuggageDetailQuerySet.as_manager()
+
     def __str__(self):
         return str(self.id)
 
@@ -165,6 +201,20 @@ class LuggageAvailableCode(models.Model):
         return "{0} al {1}".format(self.start, self.end)
 
 
+class LuggageCodeCounter(models.Model):
+    """ Last correlative handed out per day (see rules_business/code_allocator.py) """
+    day = models.DateField(unique=True, verbose_name="Día")
+    last = models.IntegerField(default=0, verbose_name="Último correlativo")
+
+    class Meta:
+        verbose_name = "Correlativo del día"
+        verbose_name_plural = "Correlativos por día"
+        ordering = ['-day']
+
+    def __str__(self):
+        return "{0}: {1}".format(self.day, self.last)
+
+
 class SuperLog(models.Model):
     """Luggage"""
     luggage = models.ForeignKey(Luggage, on_delete=models.CASCADE, null=True, verbose_name="Valija",
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+# Django
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+# Models
+from modules.luggage.models import LuggageAvailableCode, LuggageCodeCounter, LuggageDetail
+
+
+class CodeRangeExhausted(Exception):
+    """ The block does not fit below LuggageAvailableCode.end """
+    pass
+
+
+def reserve_codes(count, today=None):
+    """
+    Reserve `count` contiguous codes "5MMDD<correlative>" for one luggage.
+
+    One UPDATE ... SET last = GREATEST(last, start - 1) + count on the row of
+    the day: the row lock serializes concurrent finishes, so two blocks never
+    overlap. Codes start at LuggageAvailableCode.start and never go past
+    LuggageAvailableCode.end (the whole block is rolled back instead).
+    """
+    if count <= 0:
+        return []
+
+    today = today or datetime.today()
+    range_codes = LuggageAvailableCode.objects.values('start', 'end').first()
+    start = int(range_codes['start']) if range_codes else 1
+
+    with transaction.atomic():
+        counter = LuggageCodeCounter.objects.filter(day=today.date())
+        if not counter.update(last=Greatest(F('last'), Value(start - 1)) + count):
+            """ First luggage of the day """
+            try:
+                with transaction.atomic():
+                    LuggageCodeCounter.objects.create(day=today.date(), last=_last_used(today, start) + count)
+            except IntegrityError:
+                counter.update(last=Greatest(F('last'), Value(start - 1)) + count)
+        last = counter.values_list('last', flat=True).get()
+
+        if range_codes and last > int(range_codes['end']):
+            raise CodeRangeExhausted("No hay códigos disponibles: el rango termina en {0}".format(range_codes['end']))
+
+    return ["5{0}{1}".format(today.strftime('%m%d'), str(n).zfill(3)) for n in range(last - count + 1, last + 1)]
+
+
+def _last_used(today, start):
+    """ Codes already handed out today before the counter existed (old correlative) """
+    day = today.strftime('%Y-%m-%d')
+    last_code = LuggageDetail.objects \
+        .filter(luggage__status='completed', luggage__date_completed__range=[day + ' 00:00:00', day + ' 23:59:59']) \
+        .values('code').order_by('-code').first()
+    last = int(last_code['code'][5:] or 0) if last_code and last_code['code'] else 0
+    return max(last, start - 1)
@@ -0,0 +1,116 @@
+import csv
+import tempfile
+
+# Django
+from django.db.models import Subquery
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+# Models
+from modules.luggage.models import LuggageDetail, Test
+
+
+COLUMNS = ['Cod. Valija', 'Estado', 'Fec. de envio', 'N. Tubos', 'Código', '¿Enviado?', 'P. Nombre', 'A. Paterno',
+           'A. Materno', 'Genero', 'Celular', 'Tipo documento', 'Documento', 'Cumpleaños', 'Pruebas', 'RUC Ref.',
+           'Referencia']
+
+DETAIL_FIELDS = ('luggage_id', 'id', 'luggage__status', 'luggage__date_completed', 'luggage__number_tubes', 'code',
+                 'sent', 'patient__name', 'patient__first_surname', 'patient__last_surname', 'patient__gender',
+                 'patient__mobile_number', 'patient__document_type', 'patient__document', 'patient__date_birth',
+                 'luggage__reference__ruc', 'luggage__reference__name')
+
+CHUNK_SIZE = 2000
+
+
+def export_queryset(date_start=None, date_end=None, references=None, queryset=None):
+    """ Details of completed luggages, by date_completed range (YYYY-MM-DD) and reference codes """
+    queryset = LuggageDetail.objects.all() if queryset is None else queryset
+    queryset = queryset.filter(luggage__status='completed')
+    if date_start:
+        queryset = queryset.filter(luggage__date_completed__gte=date_start + ' 00:00:00')
+    if date_end:
+        queryset = queryset.filter(luggage__date_completed__lte=date_end + ' 23:59:59')
+    if references is not None:
+        queryset = queryset.filter(luggage__reference__in=references)
+    return queryset
+
+
+def iter_rows(details, chunk_size=CHUNK_SIZE):
+    """
+    One flat row per detail, tests joined in a single column.
+
+    Details and tests are read as two ordered server-side streams (values_list
+    + iterator) and merged on (luggage, detail): memory does not grow with the
+    number of luggages.
+    """
+    tests = Test.objects.filter(detail__in=Subquery(details.values('id'))) \
+        .order_by('detail__luggage_id', 'detail_id', '-created') \
+        .values_list('detail__luggage_id', 'detail_id', 'code', 'name', 'comment') \
+        .iterator(chunk_size=chunk_size)
+    test = next(tests, None)
+
+    for row in details.order_by('luggage_id', 'id').values_list(*DETAIL_FIELDS).iterator(chunk_size=chunk_size):
+        key = (row[0], row[1])
+        while test is not None and (test[0], test[1]) < key:
+            test = next(tests, None)
+        test_string = []
+        while test is not None and (test[0], test[1]) == key:
+            test_string.append("{0}: {1} - {2} | ".format(test[2], test[3], test[4]))
+            test = next(tests, None)
+
+        (luggage_id, _, status, date_completed, number_tubes, code, sent, name, first_surname, last_surname, gender,
+         mobile_number, document_type, document, date_birth, reference_ruc, reference_name) = row
+        yield [
+            luggage_id,
+            status,
+            date_completed.strftime("%Y-%m-%d %H:%M:%S") if date_completed else '',
+            number_tubes,
+            code,
+            sent,
+            name,
+            first_surname,
+            last_surname,
+            'Hombre' if gender == 'H' else 'Mujer',
+            mobile_number,
+            document_type,
+            document,
+            date_birth.strftime("%Y-%m-%d") if date_birth else '',
+            ''.join(test_string),
+            reference_ruc,
+            reference_name
+        ]
+
+
+class _Echo:
+    """ File-like object for csv.writer: returns the line instead of buffering it """
+    def write(self, value):
+        return value
+
+
+def csv_response(rows, filename='valijas.csv'):
+    """ CSV streamed row by row (BOM so Excel opens it as UTF-8) """
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield '\ufeff' + writer.writerow(COLUMNS)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+
+def xlsx_response(rows, filename='valijas.xlsx'):
+    """ xlsx in openpyxl write-only mode (constant memory), spooled to a temp file and streamed from disk """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Valijas')
+    ws.append(COLUMNS)
+    for row in rows:
+        ws.append(row)
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename,
+                        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
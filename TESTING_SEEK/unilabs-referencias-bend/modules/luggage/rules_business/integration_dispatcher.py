@@ -0,0 +1,64 @@
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+# Django
+from django.conf import settings
+
+
+class IntegrationDispatcher:
+    """
+    Envía los payloads de pacientes a la integración con una sesión HTTP
+    keep-alive compartida y en paralelo acotado.
+
+    Los hilos solo hacen HTTP: la construcción de payloads y el guardado de
+    los detalles quedan en el hilo que llama (conexiones de BD por hilo).
+    Los POST no se reintentan automáticamente (la integración no es
+    idempotente).
+    """
+
+    def __init__(self, url=None, auth=None, timeout=None, max_workers=None):
+        self.url = url or settings.API_INTEGRATION
+        self.auth = auth or (settings.USER_INTEGRATION, settings.PASS_INTEGRATION)
+        self.timeout = timeout or getattr(settings, 'INTEGRATION_TIMEOUT', (5, 30))
+        self.max_workers = max_workers or getattr(settings, 'INTEGRATION_MAX_WORKERS', 8)
+
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, payload):
+        """ Un envío: {'response', 'text', 'error'} (sin excepciones) """
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            return {'response': response, 'text': response.text, 'error': None}
+        except requests.RequestException as e:
+            return {'response': None, 'text': "Error integración: {0}".format(e), 'error': str(e)}
+
+    def dispatch(self, payloads):
+        """ Envía todos los payloads en paralelo; resultados en el mismo orden """
+        payloads = list(payloads)
+        if len(payloads) <= 1:
+            return [self.post(payload) for payload in payloads]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(payloads)),
+                                thread_name_prefix='integration') as pool:
+            return list(pool.map(self.post, payloads))
+
+    def close(self):
+        self.session.close()
+
+
+_dispatcher = None
+_dispatcher_lock = Lock()
+
+
+def get_dispatcher():
+    """ Dispatcher del proceso (reutiliza las conexiones entre requests) """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = IntegrationDispatcher()
+        return _dispatcher
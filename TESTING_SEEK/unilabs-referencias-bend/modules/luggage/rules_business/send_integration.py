@@ -1,7 +1,6 @@
-import requests
-from django.conf import settings
 from modules.luggage.models import Test
 from datetime import datetime
+from collections import defaultdict
 from utils.util_json import is_json
 
 # Django
@@ -10,7 +9,10 @@ from django.core.mail import EmailMultiAlternatives
 
 # Models
 from modules.information.models import Emails
-from modules.luggage.models import LuggageAvailableCode, LuggageDetail
+from modules.luggage.models import LuggageDetail
+from modules.luggage.rules_business.code_allocator import reserve_codes
+from modules.luggage.rules_business.integration_dispatcher import get_dispatcher
+from modules.luggage.serializers.log_serializer import SuperLogAddModelSerializer
 
 # Python
 import json
@@ -18,25 +20,29 @@ import json
 
 def run(luggage, details, request):
 
-    year = datetime.today().strftime('%y')[1]
-    month = datetime.today().strftime('%m')
-    day = datetime.today().strftime('%d')
-    i = 0
-    range_codes = LuggageAvailableCode.objects.values('start', 'end').first()
-
     payloads_email = []
     fecha = datetime.today().strftime('%Y-%m-%d')
+    pending = []
+
+    """ Already accepted by the integration (job retry): never send twice, keep its code """
+    details = [detail for detail in details if not detail.sent]
+
+    """ One block of codes for the whole luggage (a retry keeps the codes it already has) """
+    codes = iter(reserve_codes(len([detail for detail in details if not detail.code])))
+
+    """ Test's of the luggage, by patient (one query) """
+    tests_by_patient = defaultdict(list)
+    for test in Test.objects.filter(luggage=luggage):
+        tests_by_patient[test.patient_id].append(test)
 
     """ Patients """
 
     for detail in details:
-        i = i+1
-        next_code = correlative(i, range_codes)
         pruebas = []
         comments = []
 
-        code = "5{0}{1}{2}".format(month, day, next_code)
-        tests = Test.objects.filter(patient=detail.patient, luggage=detail.luggage)
+        code = detail.code or next(codes)
+        tests = tests_by_patient[detail.patient_id]
 
         """ Test's by patient"""
         for test in tests:
@@ -79,27 +85,14 @@ def run(luggage, details, request):
             }
         }
 
-        response = requests.post(settings.API_INTEGRATION, auth=(settings.USER_INTEGRATION, settings.PASS_INTEGRATION),
-                                 json=payload)
-        status = valid(response)
-
-        """ Update detail """
-        detail.response_integration = response.text
-        detail.body_integration = json.dumps(payload)
-        detail.code = code
-        detail.sent = status
-        detail.save()
-
-        """ Send email """
-        if not status:
-            data = payload['operation']['items']
-            data[0]['pruebas'] = []
-            test_temp = []
+        pending.append((detail, code, payload, tests))
 
-            for test in tests:
-                test_temp.append("{0}: {1} | ".format(test.name, test.comment))
-            data[0]['pruebas'].append(test_temp)
-            payloads_email.append(data[0])
+    """ Send integration (concurrent, results in the same order); each block is saved before the next """
+    dispatcher = get_dispatcher()
+    for start in range(0, len(pending), dispatcher.max_workers):
+        block = pending[start:start + dispatcher.max_workers]
+        results = dispatcher.dispatch([payload for _, _, payload, _ in block])
+        _save_results(block, results, payloads_email)
 
     data = Emails.objects.first()
     if data and payloads_email:
@@ -123,13 +116,51 @@ def run(luggage, details, request):
     return True
 
 
+def finish(luggage, data_log, request=None):
+    """ Send integration and write the 'completed' log (sync finish and finish job) """
+    details = LuggageDetail.objects.filter(luggage=luggage.id).select_related('patient').order_by('id')
+    run(luggage, details, request)
+
+    """LOG"""
+    data_log['luggage'] = luggage.id
+    data_log['status'] = 'completed'
+    data_log['number_tubes'] = luggage.number_tubes
+    data_log['date_completed'] = datetime.now()
+    log = SuperLogAddModelSerializer(data=data_log)
+    log.is_valid(raise_exception=True)
+    log.save()
+    return log
+
+
+def _save_results(block, results, payloads_email):
+    for (detail, code, payload, tests), result in zip(block, results):
+        status = valid(result['response'])
+
+        """ Update detail """
+        detail.response_integration = result['text']
+        detail.body_integration = json.dumps(payload)
+        detail.code = code
+        detail.sent = status
+        detail.save()
+
+        """ Send email """
+        if not status:
+            data = payload['operation']['items']
+            data[0]['pruebas'] = []
+            test_temp = []
+
+            for test in tests:
+                test_temp.append("{0}: {1} | ".format(test.name, test.comment))
+            data[0]['pruebas'].append(test_temp)
+            payloads_email.append(data[0])
+
+
 def resend(detail):
     try:
         body = detail.body_integration
-        response = requests.post(settings.API_INTEGRATION, auth=(settings.USER_INTEGRATION, settings.PASS_INTEGRATION),
-                                json=json.loads(body))
-        status = valid(response)
-        detail.response_integration = response.text
+        result = get_dispatcher().post(json.loads(body))
+        status = valid(result['response'])
+        detail.response_integration = result['text']
         detail.sent = status
         detail.save()
         return status
@@ -137,6 +168,9 @@ def resend(detail):
         return False
 
 def valid(response):
+    if response is None:
+        return False
+
     status = True
     if response.status_code != 200:
         status = False
@@ -148,20 +182,3 @@ def valid(response):
         if response.json()['status']['valor'] == 'NO':
             status = False
     return status
-
-
-def correlative(i, range_codes):
-    today = datetime.now().strftime('%Y-%m-%d')
-
-    last_code = LuggageDetail.objects \
-        .filter(luggage__status='completed', luggage__date_completed__range=[today + ' 00:00:00', today + ' 23:59:59']) \
-        .values('code').order_by('-code').first()
-    if last_code:
-        next_correlative = (int(last_code['code'][5:] or 0) + i)
-    else:
-        if range_codes:
-            next_correlative = (int(range_codes['start']) + i) - 1
-        else:
-            next_correlative = i
-    return str(next_correlative).zfill(3)
-
@@ -16,10 +16,15 @@ class LuggageDetailModelSerializer(serializers.ModelSerializer):
     test_total = serializers.SerializerMethodField()
 
     def get_test(self, instance):
-        tests = instance.test.all().order_by('-created')
+        if hasattr(instance, 'ordered_tests'):
+            tests = instance.ordered_tests
+        else:
+            tests = instance.test.all().order_by('-created')
         return TestModelSerializer(tests, many=True, read_only=True).data
 
     def get_test_total(self, obj):
+        if hasattr(obj, 'test_count'):
+            return obj.test_count
         return obj.test.count()
 
     class Meta:
@@ -54,10 +59,17 @@ class LuggageModelSerializer(serializers.ModelSerializer):
             return ''
 
     def get_details(self, instance):
-        details = instance.details.all().order_by('patient__complete', 'patient__name')
+        """ Luggage.objects.for_read() prefetches these (no query per luggage) """
+        if hasattr(instance, 'ordered_details'):
+            details = instance.ordered_details
+        else:
+            details = LuggageDetail.objects.for_read().filter(luggage=instance.id) \
+                .order_by('patient__complete', 'patient__name')
         return LuggageDetailModelSerializer(details, many=True, read_only=True).data
 
     def get_patients_total(self, obj):
+        if hasattr(obj, 'patients_count'):
+            return obj.patients_count
         return obj.details.count()
 
     class Meta:
@@ -0,0 +1,41 @@
+from celery import shared_task
+
+# Models
+from modules.luggage.models import Luggage
+from modules.luggage.rules_business.code_allocator import CodeRangeExhausted
+from modules.luggage.rules_business.send_integration import finish
+
+
+@shared_task(bind=True, acks_late=True, max_retries=3, default_retry_delay=30)
+def finish_luggage(self, luggage_id, data_log):
+    """
+    Async finish of a luggage (integration + email + log).
+
+    Only the job that claimed the luggage (Luggage.finish_job) may run it, and
+    details already saved as sent are skipped by run(), so a retry does not
+    resend them. Delivery is at least once: with acks_late, a worker that dies
+    after the integration accepted a block but before its results were saved
+    redelivers the task and that block is sent again.
+
+    When it gives up, the claim is released and the reason is kept in
+    Luggage.finish_error for `progress`.
+    """
+    luggage = Luggage.objects.select_related('reference') \
+        .filter(id=luggage_id, status='active', finish_job=self.request.id).first()
+    if not luggage:
+        return {'id': luggage_id, 'status': 'skipped'}
+
+    try:
+        finish(luggage, data_log)
+    except CodeRangeExhausted as e:
+        """ Retrying does not help until the range is extended """
+        Luggage.objects.filter(id=luggage_id, finish_job=self.request.id).update(finish_job=None, finish_error=str(e))
+        return {'id': luggage_id, 'status': 'failed', 'message': str(e)}
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            """ Release the luggage so the user can finish it again """
+            Luggage.objects.filter(id=luggage_id, finish_job=self.request.id) \
+                .update(finish_job=None, finish_error=str(e))
+            raise
+        raise self.retry(exc=e)
+    return {'id': luggage_id, 'status': luggage.status, 'sent': luggage.sent}
@@ -1,3 +1,339 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from celery import current_app
+from openpyxl import load_workbook
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from modules.luggage.models import Luggage, LuggageAvailableCode, LuggageDetail, Patient, Test
+from modules.luggage.rules_business import export_luggage, integration_dispatcher
+from modules.luggage.rules_business.code_allocator import CodeRangeExhausted, reserve_codes
+from modules.luggage.rules_business.integration_dispatcher import IntegrationDispatcher
+from modules.luggage.rules_business.send_integration import valid
+from modules.luggage.tasks import finish_luggage
+from modules.luggage.views.luggage_view import LuggageViewSet
+from modules.users.models import Reference, User
+
+
+class _MockIntegrationHandler(BaseHTTPRequestHandler):
+    """ Integración local: responde OK tras `delay` segundos; 'NO' si el dni es 'rechazado' """
+    protocol_version = 'HTTP/1.1'
+    delay = 0.2
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        item = body['operation']['items'][0]
+        if item['dni'] == 'lento':
+            time.sleep(2)
+        else:
+            time.sleep(self.delay)
+        self.server.connections.add(self.client_address)
+        self.server.received.append(item['dni'])
+        data = json.dumps({'status': {'valor': 'NO' if item['dni'] == 'rechazado' else 'SI'},
+                           'analisis': item['analisis']}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _payload(code, dni='12345678'):
+    return {'operation': {'valor': 'peticiones', 'items': [{'analisis': code, 'dni': dni, 'pruebas': []}]}}
+
+
+class IntegrationDispatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _MockIntegrationHandler)
+        self.server.connections = set()
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{0}/peticiones'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_dispatch_is_concurrent_and_ordered(self):
+        dispatcher = IntegrationDispatcher(url=self.url, auth=('u', 'p'), timeout=(2, 5), max_workers=8)
+        payloads = [_payload('5{0:03d}'.format(i)) for i in range(16)]
+
+        start = time.monotonic()
+        results = dispatcher.dispatch(payloads)
+        elapsed = time.monotonic() - start
+        dispatcher.close()
+
+        self.assertEqual([r['response'].json()['analisis'] for r in results],
+                         ['5{0:03d}'.format(i) for i in range(16)])
+        self.assertTrue(all(valid(r['response']) for r in results))
+        # 16 x 0.2s en serie = 3.2s; con 8 en paralelo ~0.4s
+        self.assertLess(elapsed, 1.6)
+        # Conexiones keep-alive reutilizadas: como mucho una por worker
+        self.assertLessEqual(len(self.server.connections), 8)
+
+    def test_timeout_and_rejection_do_not_raise(self):
+        dispatcher = IntegrationDispatcher(url=self.url, auth=('u', 'p'), timeout=(1, 0.5), max_workers=4)
+        results = dispatcher.dispatch([_payload('5001'), _payload('5002', dni='lento'),
+                                       _payload('5003', dni='rechazado')])
+        dispatcher.close()
+
+        self.assertTrue(valid(results[0]['response']))
+        self.assertIsNone(results[1]['response'])
+        self.assertIsNotNone(results[1]['error'])
+        self.assertFalse(valid(results[1]['response']))
+        self.assertFalse(valid(results[2]['response']))
+
+
+class FinishLuggageJobTests(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _MockIntegrationHandler)
+        self.server.connections = set()
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.settings = override_settings(
+            API_INTEGRATION='http://127.0.0.1:{0}/peticiones'.format(self.server.server_port),
+            USER_INTEGRATION='u', PASS_INTEGRATION='p')
+        self.settings.enable()
+        integration_dispatcher._dispatcher = None
+
+        self.eager = (current_app.conf.task_always_eager, current_app.conf.task_eager_propagates)
+        current_app.conf.task_always_eager = True
+        current_app.conf.task_eager_propagates = True
+
+        self.user = User.objects.create_user('ref@example.com', 'secret', username='ref', first_name='Ref')
+        reference = Reference.objects.create(code='R001', name='Referencia', ruc='20123456789')
+        self.luggage = Luggage.objects.create(creator=self.user, reference=reference, number_tubes=3)
+        self.details = []
+        for dni in ('11111111', 'rechazado', '33333333'):
+            patient = Patient.objects.create(name='Paciente', first_surname='Uno', document=dni, complete=True,
+                                             date_birth=date(1990, 1, 1), creator=self.user)
+            detail = LuggageDetail.objects.create(luggage=self.luggage, patient=patient)
+            Test.objects.create(detail=detail, luggage=self.luggage, patient=patient, code='HEM', name='Hemograma')
+            self.details.append(detail)
+
+    def tearDown(self):
+        current_app.conf.task_always_eager, current_app.conf.task_eager_propagates = self.eager
+        if integration_dispatcher._dispatcher:
+            integration_dispatcher._dispatcher.close()
+        integration_dispatcher._dispatcher = None
+        self.settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _call(self, method, action, query=''):
+        factory = APIRequestFactory()
+        url = '/luggage/{0}/{1}/{2}'.format(self.luggage.id, action, query)
+        request = factory.post(url, {}, format='json') if method == 'post' else factory.get(url)
+        force_authenticate(request, user=self.user)
+        return LuggageViewSet.as_view({method: action})(request, id=self.luggage.id)
+
+    def test_async_finish_returns_job_and_reports_progress(self):
+        response = self._call('post', 'finish', '?async=1')
+        self.assertEqual(response.status_code, 202)
+        job = response.data['job']
+
+        progress = self._call('get', 'progress').data
+        self.assertEqual(progress['job'], job)
+        self.assertEqual(progress['job_status'], 'completed')
+        self.assertEqual(progress['count'], {'sent': 2, 'failed': 1, 'pending': 0})
+        self.assertEqual([d['state'] for d in progress['details']], ['sent', 'failed', 'sent'])
+
+        self.luggage.refresh_from_db()
+        self.assertEqual(self.luggage.status, 'completed')
+        self.assertFalse(self.luggage.sent)
+
+        """ A second finish does not send anything again """
+        self.assertEqual(self._call('post', 'finish', '?async=1').status_code, 404)
+        self.assertEqual(sorted(self.server.received), ['11111111', '33333333', 'rechazado'])
+
+    def test_retry_skips_details_already_sent(self):
+        first = self.details[0]
+        first.sent = True
+        first.code = '5101800001'
+        first.save()
+        Luggage.objects.filter(id=self.luggage.id).update(finish_job='job-1')
+
+        finish_luggage.apply((self.luggage.id, {}), task_id='job-1')
+        """ Redelivered message: the luggage is completed, nothing is sent """
+        finish_luggage.apply((self.luggage.id, {}), task_id='job-1')
+
+        self.assertEqual(sorted(self.server.received), ['33333333', 'rechazado'])
+        first.refresh_from_db()
+        self.assertEqual(first.code, '5101800001')
+
+    def test_only_the_claiming_job_runs(self):
+        Luggage.objects.filter(id=self.luggage.id).update(finish_job='job-1')
+
+        self.assertEqual(finish_luggage.apply((self.luggage.id, {}), task_id='job-2').get()['status'], 'skipped')
+        self.assertEqual(self._call('post', 'finish', '?async=1').status_code, 409)
+        self.assertEqual(self.server.received, [])
+
+    def test_sync_finish_claims_the_luggage(self):
+        stale = Luggage.objects.get(id=self.luggage.id)
+        job = LuggageViewSet._claim(Luggage.objects.get(id=self.luggage.id))
+        """ A finish that read the luggage before the claim loses the conditional UPDATE """
+        self.assertIsNone(LuggageViewSet._claim(stale))
+        Luggage.objects.filter(id=self.luggage.id, finish_job=job).update(finish_job=None)
+
+        self.assertEqual(self._call('post', 'finish').status_code, 200)
+        self.luggage.refresh_from_db()
+        self.assertEqual(self.luggage.status, 'completed')
+        self.assertIsNotNone(self.luggage.finish_job)
+        self.assertEqual(sorted(self.server.received), ['11111111', '33333333', 'rechazado'])
+
+    def test_failed_finish_is_reported_by_progress(self):
+        available = LuggageAvailableCode.objects.create(start=1, end=2)
+
+        for query in ('', '?async=1'):
+            self._call('post', 'finish', query)
+            progress = self._call('get', 'progress').data
+            self.assertEqual(progress['job_status'], 'failed')
+            self.assertIsNone(progress['job'])
+            self.assertIn('el rango termina en 2', progress['error'])
+        self.assertEqual(self.server.received, [])
+
+        """ The luggage was released: once the range is extended it can be finished again """
+        available.end = 999
+        available.save()
+        self.assertEqual(self._call('post', 'finish', '?async=1').status_code, 202)
+        progress = self._call('get', 'progress').data
+        self.assertEqual(progress['job_status'], 'completed')
+        self.assertIsNone(progress['error'])
+
+
+class CodeAllocatorTests(TestCase):
+
+    def setUp(self):
+        self.today = datetime(2026, 10, 18, 9, 30)
+
+    def test_blocks_are_contiguous_and_never_overlap(self):
+        LuggageAvailableCode.objects.create(start=100, end=999)
+
+        first = reserve_codes(3, self.today)
+        """ Range + UPDATE + SELECT (+ SAVEPOINT/RELEASE), whatever the size of the block """
+        with self.assertNumQueries(5):
+            second = reserve_codes(2, self.today)
+
+        self.assertEqual(first, ['51018100', '51018101', '51018102'])
+        self.assertEqual(second, ['51018103', '51018104'])
+        self.assertEqual(reserve_codes(1, datetime(2026, 10, 19)), ['51019100'])
+
+    def test_range_start_and_end_are_respected(self):
+        available = LuggageAvailableCode.objects.create(start=10, end=14)
+        self.assertEqual(reserve_codes(3, self.today), ['51018010', '51018011', '51018012'])
+
+        with self.assertRaises(CodeRangeExhausted):
+            reserve_codes(3, self.today)
+        """ The failed block is not consumed """
+        self.assertEqual(reserve_codes(2, self.today), ['51018013', '51018014'])
+
+        available.end = 30
+        available.start = 20
+        available.save()
+        self.assertEqual(reserve_codes(1, self.today), ['51018020'])
+
+
+class LuggageListQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('list@example.com', 'secret', username='list', first_name='List')
+        self.reference = Reference.objects.create(code='R002', name='Referencia', ruc='20123456789')
+
+    def _add_luggages(self, count, patients=3, tests=2):
+        for _ in range(count):
+            luggage = Luggage.objects.create(creator=self.user, reference=self.reference)
+            for p in range(patients):
+                patient = Patient.objects.create(name='P{0}'.format(p), document='{0}'.format(p), complete=True,
+                                                 date_birth=date(1990, 1, 1), creator=self.user)
+                detail = LuggageDetail.objects.create(luggage=luggage, patient=patient)
+                for t in range(tests):
+                    Test.objects.create(detail=detail, luggage=luggage, patient=patient, code='T{0}'.format(t))
+
+    def _list(self):
+        request = APIRequestFactory().get('/luggage/')
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = LuggageViewSet.as_view({'get': 'list'})(request)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_list_queries_do_not_grow_with_luggages(self):
+        self._add_luggages(2)
+        small, _ = self._list()
+        self._add_luggages(10, patients=5, tests=3)
+        large, data = self._list()
+
+        """ Luggages (+ reference, counts) + details (+ patient, counts) + tests (+ pagination count) """
+        self.assertLessEqual(small, 4)
+        self.assertEqual(small, large)
+
+        rows = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(rows[0]['patients_total'], 5)
+        self.assertEqual(rows[0]['details'][0]['test_total'], 3)
+        self.assertEqual(len(rows[0]['details'][0]['test']), 3)
+        self.assertEqual(rows[0]['reference_ruc'], '20123456789')
+
+
+class LuggageExportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('export@example.com', 'secret', username='export', first_name='Export')
+        self.reference = Reference.objects.create(code='R003', name='Clínica', ruc='20111111111')
+        other = Reference.objects.create(code='R004', name='Otra', ruc='20222222222')
+        self.user.references.add(self.reference)
+        self._luggage(self.reference, datetime(2026, 9, 1, 10, 0), ['11111111', '22222222'])
+        self._luggage(self.reference, datetime(2026, 10, 1, 10, 0), ['33333333'])
+        self._luggage(other, datetime(2026, 9, 2, 10, 0), ['44444444'])
+
+    def _luggage(self, reference, date_completed, documents):
+        luggage = Luggage.objects.create(creator=self.user, reference=reference, status='completed',
+                                         date_completed=date_completed)
+        for document in documents:
+            patient = Patient.objects.create(name='P', document=document, complete=True, date_birth=date(1990, 1, 1))
+            detail = LuggageDetail.objects.create(luggage=luggage, patient=patient, code='5' + document[:4], sent=True)
+            for code in ('HEM', 'GLU'):
+                Test.objects.create(detail=detail, luggage=luggage, patient=patient, code=code, name=code)
+
+    def _export(self, query):
+        request = APIRequestFactory().get('/luggage/export/' + query)
+        force_authenticate(request, user=self.user)
+        return LuggageViewSet.as_view({'get': 'export'})(request)
+
+    def test_csv_is_streamed_and_filtered(self):
+        response = self._export('?date_start=2026-09-01&date_end=2026-09-30&reference=R003')
+        self.assertTrue(response.streaming)
+
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], export_luggage.COLUMNS)
+        self.assertEqual(sorted(row[12] for row in rows[1:]), ['11111111', '22222222'])
+        self.assertEqual(rows[1][14], 'GLU: GLU -  | HEM: HEM -  | ')
+        self.assertEqual(rows[1][16], 'Clínica')
+
+    def test_reference_not_assigned_is_forbidden(self):
+        self.assertEqual(self._export('?reference=R004').status_code, 403)
+
+        content = b''.join(self._export('?reference=all').streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(sorted(row[12] for row in rows[1:]), ['11111111', '22222222', '33333333'])
+
+    def test_xlsx_write_only(self):
+        response = self._export('?type=xlsx')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook['Valijas'].values)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(list(rows[0]), export_luggage.COLUMNS)
@@ -20,11 +20,15 @@ from django.db.models import Q
 from django.http import HttpResponse
 from datetime import datetime
 from drf_renderer_xlsx.mixins import XLSXFileMixin
+from celery.utils import uuid
 import xlwt
 
 # Utils
 from utils.render import to_pdf
-from modules.luggage.rules_business.send_integration import run
+from modules.luggage.rules_business import send_integration
+from modules.luggage.rules_business.code_allocator import CodeRangeExhausted
+from modules.luggage.rules_business import export_luggage
+from modules.luggage.tasks import finish_luggage
 
 
 class LuggageViewSet(viewsets.ModelViewSet, XLSXFileMixin):
@@ -69,6 +73,9 @@ class LuggageViewSet(viewsets.ModelViewSet, XLSXFileMixin):
                 Q(details__patient__document__icontains=q) |
                 Q(details__code__icontains=q)
             ).filter(creator_id=self.request.user.id)
+
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.for_read()
         return queryset
 
     def update(self, request, *args, **kwargs):
@@ -92,39 +99,123 @@ class LuggageViewSet(viewsets.ModelViewSet, XLSXFileMixin):
         luggage = Luggage.objects.filter(id=id, status='active').first()
 
         if luggage:
+            if luggage.finish_job:
+                return Response({"message": "La valija ya se está enviando", "job": luggage.finish_job},
+                                status=status.HTTP_409_CONFLICT)
+
             """ Valid complete fields """
-            details = LuggageDetail.objects.filter(luggage=luggage.id).order_by('id')
+            details = LuggageDetail.objects.filter(luggage=luggage.id).select_related('patient').order_by('id')
             for detail in details:
                 if not detail.patient.complete:
                     patient = PatientModelSerializer(instance=detail.patient, many=False)
                     return Response({"message": "El usuario no tiene los campos completos", "data": patient.data},
                                     status=status.HTTP_400_BAD_REQUEST)
 
-            """ Send integration """
-            run(luggage, details, request)
-
-            """LOG"""
-            data_log = request.data
-            data_log['luggage'] = luggage.id
-            data_log['status'] = 'completed'
-            data_log['number_tubes'] = luggage.number_tubes
-            data_log['date_completed'] = datetime.now()
-            log = SuperLogAddModelSerializer(data=data_log)
-            log.is_valid(raise_exception=True)
-            self.perform_create(log)
+            if request.query_params.get('async') in ('1', 'true'):
+                return self._finish_async(request, luggage)
+
+            """ Same claim as the async path: a concurrent finish gets 409 instead of sending twice """
+            job = self._claim(luggage)
+            if not job:
+                return Response({"message": "La valija ya se está enviando"}, status=status.HTTP_409_CONFLICT)
+
+            """ Send integration + LOG """
+            try:
+                send_integration.finish(luggage, request.data, request)
+            except CodeRangeExhausted as e:
+                self._release(luggage, job, e)
+                return Response({"message": str(e)}, status=status.HTTP_409_CONFLICT)
+            except Exception as e:
+                self._release(luggage, job, e)
+                raise
         else:
             return Response({"message": "La valija no está disponible"}, status=status.HTTP_404_NOT_FOUND)
         return Response({'id': id, 'code': luggage.id}, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def _claim(luggage):
+        """ Conditional UPDATE: only one finish (sync or job) gets the luggage; returns its job id or None """
+        job = uuid()
+        claimed = Luggage.objects.filter(id=luggage.id, status='active', finish_job__isnull=True) \
+            .update(finish_job=job, finish_error=None)
+        if not claimed:
+            return None
+        """ run() saves the whole instance: keep the claim in it """
+        luggage.finish_job = job
+        luggage.finish_error = None
+        return job
+
+    @staticmethod
+    def _release(luggage, job, error):
+        """ Give the luggage back so the user can finish it again, keeping the reason for `progress` """
+        Luggage.objects.filter(id=luggage.id, finish_job=job).update(finish_job=None, finish_error=str(error))
+
+    def _finish_async(self, request, luggage):
+        """ Claim the luggage for a new job and enqueue it; the client polls `progress` """
+        job = self._claim(luggage)
+        if not job:
+            return Response({"message": "La valija ya se está enviando"}, status=status.HTTP_409_CONFLICT)
+
+        data_log = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
+        try:
+            finish_luggage.apply_async((luggage.id, data_log), task_id=job)
+        except Exception:
+            Luggage.objects.filter(id=luggage.id, finish_job=job).update(finish_job=None)
+            return Response({"message": "No se pudo encolar el envío de la valija"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'id': luggage.id, 'code': luggage.id, 'job': job}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def progress(self, request, id, **kwargs):
+        """ Per-detail state of the finish: sent / failed / pending """
+        luggage = Luggage.objects.filter(id=id, creator_id=request.user.id) \
+            .values('id', 'status', 'sent', 'finish_job', 'finish_error').first()
+        if not luggage:
+            return Response({"message": "La valija no existe"}, status=status.HTTP_404_NOT_FOUND)
+
+        details = []
+        count = {'sent': 0, 'failed': 0, 'pending': 0}
+        for detail in LuggageDetail.objects.filter(luggage=id).order_by('id') \
+                .values('id', 'code', 'sent', 'response_integration'):
+            if detail['sent']:
+                state = 'sent'
+            elif detail['response_integration']:
+                state = 'failed'
+            else:
+                state = 'pending'
+            count[state] += 1
+            details.append({'id': detail['id'], 'code': detail['code'], 'state': state})
+
+        if luggage['status'] == 'completed':
+            job_status = 'completed'
+        elif luggage['finish_job']:
+            job_status = 'running'
+        elif luggage['finish_error']:
+            """ The last finish gave up (retries exhausted, code range): the luggage can be finished again """
+            job_status = 'failed'
+        else:
+            job_status = 'idle'
+
+        return Response({
+            'id': luggage['id'],
+            'job': luggage['finish_job'],
+            'job_status': job_status,
+            'error': luggage['finish_error'] if job_status == 'failed' else None,
+            'sent': luggage['sent'],
+            'total': len(details),
+            'count': count,
+            'details': details,
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'])
     def active(self, request, **kwargs):
-        luggage = Luggage.objects.filter(status='active', creator_id=request.user.id).first()
+        luggage = Luggage.objects.for_read().filter(status='active', creator_id=request.user.id).first()
         serializer = LuggageModelSerializer(instance=luggage, many=False)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['get'])
     def download_pdf(self, request, id, **kwargs):
-        luggage = Luggage.objects.filter(status='completed', id=id, creator_id=request.user.id).first()
+        luggage = Luggage.objects.for_read().filter(status='completed', id=id, creator_id=request.user.id).first()
 
         if luggage:
             serializer = LuggageModelSerializer(instance=luggage, many=False)
@@ -173,7 +264,7 @@ class LuggageViewSet(viewsets.ModelViewSet, XLSXFileMixin):
         # Sheet body, remaining rows
         font_style = xlwt.XFStyle()
 
-        rows = Luggage.objects.filter(status='completed', id=id)
+        rows = Luggage.objects.for_read().filter(status='completed', id=id)
         serializer = LuggageModelSerializer(instance=rows, many=True)
 
         if not serializer.data:
@@ -232,6 +323,42 @@ class LuggageViewSet(viewsets.ModelViewSet, XLSXFileMixin):
         return response
 
 
+    @action(detail=False, methods=['get'])
+    def export(self, request, **kwargs):
+        """ Completed luggages (all details) as streamed CSV or write-only xlsx: ?type=csv|xlsx """
+        reference_code = request.query_params.get('reference', None)
+        details = LuggageDetail.objects.all()
+        references = None
+
+        if reference_code == 'all':
+            references = request.user.references.values_list('code', flat=True)
+        elif reference_code:
+            """ Only the references assigned to the user """
+            if not request.user.references.filter(code=reference_code).exists():
+                return Response({"message": "No tiene acceso a la referencia"}, status=status.HTTP_403_FORBIDDEN)
+            references = [reference_code]
+        else:
+            details = details.filter(luggage__creator_id=request.user.id)
+
+        details = export_luggage.export_queryset(request.query_params.get('date_start', None),
+                                                 request.query_params.get('date_end', None),
+                                                 references, details)
+        rows = export_luggage.iter_rows(details)
+
+        """ Tracking """
+        serializer = TrackingModelSerializer(data={
+            "type": "luggage_export",
+            "params": request.build_absolute_uri(),
+            "creator": request.user.id,
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        if request.query_params.get('type', 'csv') == 'xlsx':
+            return export_luggage.xlsx_response(rows)
+        return export_luggage.csv_response(rows)
+
+
 class LuggageDetailViewSet(viewsets.ModelViewSet):
     serializer_class = LuggageDetailModelSerializer
     queryset = LuggageDetail.objects.all()
@@ -239,10 +366,11 @@ class LuggageDetailViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         q = self.request.query_params.get('q', None)
+        queryset = self.queryset.for_read() if self.action in ('list', 'retrieve') else self.queryset
         if not q:
-            return self.queryset.filter(luggage__creator_id=self.request.user.id)
+            return queryset.filter(luggage__creator_id=self.request.user.id)
         else:
-            return self.queryset.filter(Q(luggage__creator_id=self.request.user.id))\
+            return queryset.filter(Q(luggage__creator_id=self.request.user.id))\
                 .filter(Q(patient__name__icontains=q) | Q(luggage__code__icontains=q))
 
     def update(self, request, *args, **kwargs):
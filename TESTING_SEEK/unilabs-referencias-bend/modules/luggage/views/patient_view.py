@@ -40,7 +40,7 @@ class PatientViewSet(viewsets.ModelViewSet):
 
         if not luggage:
             """ Valid """
-            active_luggage = Luggage.objects.filter(status='active', creator=request.user.id).first()
+            active_luggage = Luggage.objects.for_read().filter(status='active', creator=request.user.id).first()
             if active_luggage:
                 active_serializer = LuggageModelSerializer(instance=active_luggage, many=False)
                 return Response({"status": False, "message": "Ya una valija activa", "data": active_serializer.data},
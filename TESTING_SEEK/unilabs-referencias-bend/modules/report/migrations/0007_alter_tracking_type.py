@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0006_auto_20220524_1151'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tracking',
+            name='type',
+            field=models.CharField(choices=[('luggage_pdf', 'Valija PDF'), ('luggage_excel', 'Valija Excel'), ('luggage_export', 'Valijas exportación'), ('result_pdf', 'Resultado PDF'), ('image_pdf', 'Imagen PDF')], default='pdf', max_length=40, null=True, verbose_name='Tipo'),
+        ),
+    ]
@@ -49,6 +49,7 @@ class Tracking(models.Model):
     TYPE = (
         ('luggage_pdf', 'Valija PDF'),
         ('luggage_excel', 'Valija Excel'),
+        ('luggage_export', 'Valijas exportación'),
         ('result_pdf', 'Resultado PDF'),
         ('image_pdf', 'Imagen PDF')
     )